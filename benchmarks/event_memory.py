@@ -0,0 +1,75 @@
+"""Bytes per event held in memory: Events as ExecutionFramework emits them
+for Mesos status updates, versus CompactEvents keeping, packing,
+summarising or stripping the raw status update.
+
+Every event is for a task of its own, and all the tasks share one config
+the way copies of a task do, so the task configs aren't counted.
+
+Run from the repository root with `python -m benchmarks.event_memory`
+"""
+import gc
+import json
+import tracemalloc
+
+import addict
+
+from benchmarks.harness import report
+from task_processing.interfaces.event import compact_event
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.translator import mesos_update_to_event
+
+NUM_EVENTS = 20000
+
+
+def make_status(task_id):
+    return addict.Dict(json.loads(json.dumps({
+        'task_id': {'value': task_id},
+        'state': 'TASK_RUNNING',
+        'source': 'SOURCE_EXECUTOR',
+        'agent_id': {'value': 'agent-1'},
+        'executor_id': {'value': task_id},
+        'timestamp': 1234567890.0,
+        'uuid': 'dXVpZA==',
+        'container_status': {
+            'network_infos': [{'ip_addresses': [{'ip_address': '10.0.0.1'}]}],
+        },
+    })))
+
+
+def measure(make_events):
+    gc.collect()
+    tracemalloc.start()
+    events = make_events()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size / NUM_EVENTS
+
+
+def main():
+    task_config = MesosTaskConfig(name='benchmark', image='benchmark', cmd='/bin/true')
+    task_configs = [task_config.set(uuid=f'task{i}') for i in range(NUM_EVENTS)]
+
+    def events(raw=None):
+        def make():
+            made = []
+            for config in task_configs:
+                event = mesos_update_to_event(make_status(config.task_id), config)
+                if raw is not None:
+                    event = compact_event(event, raw=raw)
+                made.append(event)
+            return made
+        return make
+
+    for name, make_events in (
+        ('Event', events()),
+        ('CompactEvent, keep raw', events('keep')),
+        ('CompactEvent, lazy raw', events('lazy')),
+        ('CompactEvent, summary', events('summary')),
+        ('CompactEvent, strip raw', events('strip')),
+    ):
+        report(name, measure(make_events), 'bytes/event', width=24, value_format='8,.0f')
+
+
+if __name__ == '__main__':
+    main()
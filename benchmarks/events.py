@@ -0,0 +1,96 @@
+"""Events/sec through the executor stack: status updates handled by
+ExecutionFramework.statusUpdate and translated by mesos_update_to_event,
+then passed through RetryingExecutor the way its retry loop does.
+
+Events are built either fully validated (task_event and Event.set) or with
+the trusted constructors the executors use.
+
+Every task goes through TASK_STARTING -> TASK_RUNNING -> TASK_FINISHED.
+
+Run from the repository root with `python -m benchmarks.events`
+"""
+from unittest import mock
+
+from benchmarks.harness import report
+from benchmarks.harness import StubExecutor
+from benchmarks.harness import timed
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos import retrying_executor
+from task_processing.plugins.mesos import translator
+from task_processing.plugins.mesos.execution_framework import ExecutionFramework
+from task_processing.plugins.mesos.mesos_executor import MesosExecutorCallbacks
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+NUM_TASKS = 10000
+STATES = ('TASK_STARTING', 'TASK_RUNNING', 'TASK_FINISHED')
+
+
+class Driver:
+    def acknowledgeStatusUpdate(self, update):
+        pass
+
+
+class Downstream(StubExecutor):
+    def __init__(self, execution_framework):
+        super().__init__()
+        self.execution_framework = execution_framework
+
+    def run(self, task_config):
+        self.execution_framework.enqueue_task(task_config)
+
+
+def run_stack():
+    execution_framework = ExecutionFramework(
+        'benchmark',
+        'taskproc',
+        MesosExecutorCallbacks(
+            get_tasks_for_offer,
+            translator.mesos_update_to_event,
+            translator.make_mesos_task_info,
+        ),
+        240,
+        use_addict=False,
+    )
+    retrying = RetryingExecutor(Downstream(execution_framework))
+    task_config = MesosTaskConfig(name='benchmark', image='benchmark', cmd='/bin/true')
+    for i in range(NUM_TASKS):
+        retrying.run(task_config.set(uuid=f'task{i}'))
+    task_ids = list(execution_framework.task_metadata.keys())
+    driver = Driver()
+
+    def handle_updates():
+        for state in STATES:
+            for task_id in task_ids:
+                execution_framework.statusUpdate(
+                    driver, {'task_id': {'value': task_id}, 'state': state},
+                )
+        while not execution_framework.event_queue.empty():
+            event = execution_framework.event_queue.get()
+            original_task_id = '-'.join(event.task_id.split('-')[:-1])
+            event = retrying._restore_task_id(event, original_task_id)
+            event = retrying.event_with_retries(event)
+
+    _, elapsed = timed(handle_updates)
+
+    execution_framework.stop()
+    retrying.stopping = True
+    return len(STATES) * NUM_TASKS / elapsed
+
+
+def main():
+    with mock.patch.object(
+        translator, 'trusted_task_event', task_event,
+    ), mock.patch.object(
+        retrying_executor, 'trusted_set', lambda event, **kwargs: event.set(**kwargs),
+    ):
+        validated = run_stack()
+    trusted = run_stack()
+
+    report('validated', validated, 'events/s', width=10)
+    report('trusted', trusted, 'events/s', width=10)
+
+
+if __name__ == '__main__':
+    main()
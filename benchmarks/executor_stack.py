@@ -0,0 +1,55 @@
+"""Latency of a terminal event through a RetryingExecutor ->
+TimeoutExecutor -> MesosLoggingExecutor stack: from the bottom executor
+putting it on its queue to the runner getting it from the top one.
+
+Events are sent one at a time, each once the previous one has come out of
+the stack, the way the status updates of a single task arrive.
+
+Run from the repository root with `python -m benchmarks.executor_stack`
+"""
+import time
+
+from benchmarks.harness import report
+from benchmarks.harness import StubExecutor
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.logging_executor import MesosLoggingExecutor
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+NUM_EVENTS = 1000
+
+
+def main():
+    downstream = StubExecutor()
+    stack = RetryingExecutor(TimeoutExecutor(MesosLoggingExecutor(downstream)))
+    task_config = MesosTaskConfig(name='benchmark', image='benchmark', cmd='/bin/true')
+    events = [
+        task_event(
+            task_id=config.task_id,
+            task_config=config,
+            terminal=True,
+            success=True,
+            platform_type='finished',
+        )
+        for config in (
+            task_config.set(uuid=f'task{i}-retry0') for i in range(NUM_EVENTS)
+        )
+    ]
+
+    latencies = []
+    top_queue = stack.get_event_queue()
+    for event in events:
+        start = time.perf_counter()
+        downstream.event_queue.put(event)
+        top_queue.get()
+        latencies.append(time.perf_counter() - start)
+    stack.stop()
+
+    latencies.sort()
+    report('median', latencies[len(latencies) // 2] * 1e6, 'us/event', width=6)
+    report('max', latencies[-1] * 1e6, 'us/event', width=6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Helpers shared by the benchmarks in this directory
+
+Every benchmark is a module run from the repository root with
+`python -m benchmarks.<name>`, and prints one line per variant it compares.
+"""
+import time
+from queue import Queue
+from typing import Any
+from typing import Callable
+from typing import Tuple
+from typing import TypeVar
+
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+T = TypeVar('T')
+
+
+def timed(fn: Callable[[], T]) -> Tuple[T, float]:
+    """ Call fn once
+
+    :returns: a pair of (what fn returned, the seconds it took)
+    """
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def per_second(count: float, fn: Callable[[], Any]) -> float:
+    """ Call fn once
+
+    :param count: how many operations fn does
+    :returns: the operations per second
+    """
+    _, elapsed = timed(fn)
+    return count / elapsed
+
+
+def report(
+    name: str,
+    value: float,
+    unit: str,
+    width: int = 12,
+    value_format: str = '10,.0f',
+) -> None:
+    """ Print one result, with the names right-aligned in `width` """
+    print(f'{name:>{width}}: {value:{value_format}} {unit}')
+
+
+class StubExecutor:
+    """ A downstream executor that doesn't run anything: the benchmark puts
+    the events it needs on its queue itself
+    """
+    TASK_CONFIG_INTERFACE = MesosTaskConfig
+
+    def __init__(self) -> None:
+        self.event_queue: Queue = Queue()
+
+    def run(self, task_config) -> None:
+        pass
+
+    def kill(self, task_id) -> bool:
+        return True
+
+    def stop(self) -> None:
+        pass
+
+    def get_event_queue(self) -> Queue:
+        return self.event_queue
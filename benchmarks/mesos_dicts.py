@@ -0,0 +1,135 @@
+"""Operations/sec of the Mesos plugin's message handling with the driver
+run with use_addict=True (addict.Dict messages) versus use_addict=False
+(plain dicts):
+
+- offer parsing: wrapping the decoded offer like the driver does, then
+  reading its resources and attributes as ExecutionFramework.resourceOffers
+  does
+- TaskInfo building: from scratch and from the cached template
+- status translation: wrapping the decoded status update, then turning it
+  into an Event
+
+Run from the repository root with `python -m benchmarks.mesos_dicts`
+"""
+import json
+
+import addict
+from pyrsistent import m
+from pyrsistent import v
+
+from benchmarks.harness import per_second
+from benchmarks.harness import report
+from task_processing.plugins.mesos.resource_helpers import get_offer_resources
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.translator import _make_mesos_task_info
+from task_processing.plugins.mesos.translator import make_mesos_task_info
+from task_processing.plugins.mesos.translator import mesos_update_to_event
+
+ITERATIONS = 5000
+
+
+def make_offer():
+    resources = [
+        {
+            'name': rname,
+            'type': 'SCALAR',
+            'role': role,
+            'scalar': {'value': value},
+        }
+        for role in ('taskproc', '*')
+        for rname, value in (('cpus', 32), ('mem', 65536), ('disk', 100000), ('gpus', 0))
+    ] + [
+        {
+            'name': 'ports',
+            'type': 'RANGES',
+            'role': role,
+            'ranges': {'range': [{'begin': 31000, 'end': 31500}, {'begin': 32000, 'end': 32500}]},
+        }
+        for role in ('taskproc', '*')
+    ]
+    return json.loads(json.dumps({
+        'id': {'value': 'offer-1'},
+        'framework_id': {'value': 'framework-1'},
+        'agent_id': {'value': 'agent-1'},
+        'hostname': 'agent-1.example.com',
+        'resources': resources,
+        'attributes': [
+            {'name': name, 'type': 'TEXT', 'text': {'value': f'{name}-value'}}
+            for name in ('pool', 'region', 'habitat', 'ecosystem')
+        ],
+    }))
+
+
+def make_status():
+    return json.loads(json.dumps({
+        'task_id': {'value': 'benchmark.task1'},
+        'state': 'TASK_RUNNING',
+        'source': 'SOURCE_EXECUTOR',
+        'agent_id': {'value': 'agent-1'},
+        'timestamp': 1234567890.0,
+        'uuid': 'dXVpZA==',
+        'container_status': {
+            'network_infos': [{'ip_addresses': [{'ip_address': '10.0.0.1'}]}],
+        },
+    }))
+
+
+def make_task():
+    return MesosTaskConfig(
+        name='benchmark',
+        image='docker-registry.example.com/services/benchmark:latest',
+        cmd='/bin/run --port 8888',
+        cpus=0.5,
+        mem=512,
+        disk=100,
+        volumes=[
+            {'container_path': f'/data/{i}', 'host_path': f'/srv/{i}', 'mode': 'RO'}
+            for i in range(5)
+        ],
+        environment={f'VARIABLE_{i}': f'value{i}' for i in range(20)},
+        uuid='task1',
+        ports=v(m(begin=31000, end=31000)),
+    )
+
+
+def parse_offer(offer, dict_cls):
+    offer = dict_cls(offer)
+    get_offer_resources(offer, 'taskproc')
+    return {
+        attribute['name']: attribute['text']['value']
+        for attribute in offer['attributes']
+    }
+
+
+def time_ops(fn):
+    def repeat():
+        for _ in range(ITERATIONS):
+            fn()
+    return per_second(ITERATIONS, repeat)
+
+
+def main():
+    offer = make_offer()
+    status = make_status()
+    task_config = make_task()
+
+    for name, dict_cls in (('addict', addict.Dict), ('plain dicts', dict)):
+        print(f'{name}:')
+        results = {
+            'offer parsing': time_ops(lambda: parse_offer(offer, dict_cls)),
+            'TaskInfo from scratch': time_ops(
+                lambda: _make_mesos_task_info(task_config, 'agent-1', 'taskproc', dict_cls),
+            ),
+            'TaskInfo from template': time_ops(
+                lambda: make_mesos_task_info(task_config, 'agent-1', 'taskproc', dict_cls),
+            ),
+            'status translation': time_ops(
+                lambda: mesos_update_to_event(dict_cls(status), task_config),
+            ),
+        }
+        for operation, ops in results.items():
+            report(operation, ops, 'ops/s', width=24)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Compare the packing strategies MesosTaskExecutor can be created with.
+
+Each mix is a queue of tasks and a round of offers, generated from a fixed
+seed so that every run sees the same input. Offers are matched one at a
+time against whatever is left in the queue, the way the ExecutionFramework
+does, and for each strategy we report the share of the offered cpus and
+memory that was used, how many tasks are left queued, and how long the
+whole round took.
+
+Run from the repository root with `python -m benchmarks.packing`
+"""
+import random
+
+from pyrsistent import m
+from pyrsistent import v
+
+from benchmarks.harness import timed
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.packing import PACKING_STRATEGIES
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+NUM_TASKS = 2000
+NUM_OFFERS = 100
+
+# name -> [(weight, cpus, mem)] of the tasks in the queue
+MIXES = {
+    'small tasks': [(1, 0.5, 256), (1, 1, 512), (1, 2, 1024)],
+    'bimodal': [(8, 1, 512), (2, 12, 16384)],
+    'memory heavy': [(2, 1, 8192), (1, 4, 2048), (1, 0.5, 24576)],
+}
+# (cpus, mem) of the agents offers come from
+AGENTS = [(16, 32768), (32, 65536), (8, 16384)]
+
+
+def make_mix(name, task_shapes, seed):
+    rand = random.Random(seed)
+    weights, shapes = zip(*((weight, (cpus, mem)) for weight, cpus, mem in task_shapes))
+    task_configs = [
+        MesosTaskConfig(
+            name=f'{name.replace(" ", "_")}{i % 20}',
+            image='busybox',
+            cmd='/bin/true',
+            cpus=cpus,
+            mem=mem,
+            disk=10,
+        )
+        for i, (cpus, mem) in enumerate(rand.choices(shapes, weights, k=NUM_TASKS))
+    ]
+    offers = []
+    for _ in range(NUM_OFFERS):
+        cpus, mem = rand.choice(AGENTS)
+        # agents are partly used already
+        used = rand.random() * 0.75
+        offers.append(ResourceSet(
+            cpus=round(cpus * (1 - used), 1),
+            mem=round(mem * (1 - used)),
+            disk=10000,
+            ports=v(m(begin=31000, end=31999)),
+        ))
+    return task_configs, offers
+
+
+def run(get_tasks, task_configs, offers):
+    queue = list(task_configs)
+    cpus_used = mem_used = 0.0
+    for offer_resources in offers:
+        tasks_to_launch = get_tasks(queue, offer_resources, {}, 'role')
+        launched = {task.task_id for task in tasks_to_launch}
+        queue = [task for task in queue if task.task_id not in launched]
+        cpus_used += sum(task.cpus for task in tasks_to_launch)
+        mem_used += sum(task.mem for task in tasks_to_launch)
+    return cpus_used, mem_used, len(queue)
+
+
+def main():
+    strategies = {'first_fit': get_tasks_for_offer, **PACKING_STRATEGIES}
+    for seed, (mix_name, task_shapes) in enumerate(MIXES.items()):
+        task_configs, offers = make_mix(mix_name, task_shapes, seed)
+        cpus_offered = sum(offer.cpus for offer in offers)
+        mem_offered = sum(offer.mem for offer in offers)
+
+        print(f'{mix_name}:')
+        print(f'{"strategy":>28} {"cpus used":>10} {"mem used":>10} {"queued":>8} {"time":>8}')
+        for strategy_name, get_tasks in strategies.items():
+            (cpus_used, mem_used, queued), elapsed = timed(
+                lambda: run(get_tasks, task_configs, offers),
+            )
+            print(
+                f'{strategy_name:>28} {cpus_used / cpus_offered:>10.1%} '
+                f'{mem_used / mem_offered:>10.1%} {queued:>8} {elapsed:>7.2f}s'
+            )
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Cost of one task allocation (task_fits + allocate_task_resources) with
+the slotted ResourceSet versus the PRecord it replaced.
+
+Every round carves as many small tasks as fit out of one large offer.
+
+Run from the repository root with `python -m benchmarks.resource_set`
+"""
+from pyrsistent import field
+from pyrsistent import m
+from pyrsistent import PRecord
+from pyrsistent import PVector
+from pyrsistent import pvector
+from pyrsistent import v
+
+from benchmarks.harness import report
+from benchmarks.harness import timed
+from task_processing.plugins.mesos.resource_helpers import allocate_ports
+from task_processing.plugins.mesos.resource_helpers import allocate_task_resources
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.resource_helpers import task_fits
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+ROUNDS = 200
+NUMERIC_RESOURCES = ('cpus', 'mem', 'disk', 'gpus')
+NUMERIC_RESOURCE = field(
+    type=float,
+    initial=0.0,
+    factory=float,
+    invariant=lambda x: (x >= 0, 'resource < 0'),
+)
+
+
+class PersistentResourceSet(PRecord):
+    cpus = NUMERIC_RESOURCE
+    mem = NUMERIC_RESOURCE
+    disk = NUMERIC_RESOURCE
+    gpus = NUMERIC_RESOURCE
+    ports = field(type=PVector, initial=v(), factory=pvector)
+
+
+def persistent_task_fits(task, offer_resources):
+    for rname, value in offer_resources.items():
+        if rname in NUMERIC_RESOURCES and task[rname] > value:
+            return False
+        elif rname == 'ports' and len(value) == 0:
+            return False
+    return True
+
+
+def persistent_allocate_task_resources(task_config, offer_resources):
+    for res, val in offer_resources.items():
+        if res not in NUMERIC_RESOURCES:
+            continue
+        offer_resources = offer_resources.set(res, val - task_config[res])
+
+    task_ports, avail_ports = allocate_ports(offer_resources.ports, task_config.num_ports)
+    offer_resources = offer_resources.set('ports', avail_ports)
+    task_config = task_config.set('ports', task_ports)
+    return task_config, offer_resources
+
+
+def run(offer_resources, task_config, fits, allocate):
+    allocations = 0
+    for _ in range(ROUNDS):
+        remaining = offer_resources
+        while fits(task_config, remaining):
+            _, remaining = allocate(task_config, remaining)
+            allocations += 1
+    return allocations
+
+
+def main():
+    task_config = MesosTaskConfig(
+        image='busybox',
+        cmd='/bin/true',
+        cpus=0.1,
+        mem=64,
+        disk=10,
+    )
+    resources = dict(
+        cpus=100,
+        mem=64 * 1024,
+        disk=10000,
+        ports=v(m(begin=31000, end=31999)),
+    )
+
+    for name, offer_resources, fits, allocate in (
+        (
+            'PRecord',
+            PersistentResourceSet(**resources),
+            persistent_task_fits,
+            persistent_allocate_task_resources,
+        ),
+        (
+            'ResourceSet',
+            ResourceSet(**resources),
+            task_fits,
+            allocate_task_resources,
+        ),
+    ):
+        allocations, elapsed = timed(
+            lambda: run(offer_resources, task_config, fits, allocate),
+        )
+        report(name, elapsed / allocations * 1e6, 'us/allocation', value_format='8.2f')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""TaskInfos/sec built for a launch, as in
+ExecutionFramework.launch_tasks_for_offer: building every TaskInfo from
+scratch versus filling in the cached template of the task's config.
+
+Every task in a batch comes from the same config and differs only in its
+task_id and port, like copies of a task launched together.
+
+Run from the repository root with `python -m benchmarks.task_info`
+"""
+from pyrsistent import m
+from pyrsistent import v
+
+from benchmarks.harness import per_second
+from benchmarks.harness import report
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.translator import _make_mesos_task_info
+from task_processing.plugins.mesos.translator import make_mesos_task_info
+
+BATCHES = 200
+TASKS_PER_BATCH = 50
+
+
+def make_tasks():
+    task_config = MesosTaskConfig(
+        name='benchmark',
+        image='docker-registry.example.com/services/benchmark:latest',
+        cmd='/bin/run --port 8888',
+        cpus=0.5,
+        mem=512,
+        disk=100,
+        volumes=[
+            {'container_path': f'/data/{i}', 'host_path': f'/srv/{i}', 'mode': 'RO'}
+            for i in range(5)
+        ],
+        docker_parameters=[{'key': 'label', 'value': f'label{i}'} for i in range(5)],
+        environment={f'VARIABLE_{i}': f'value{i}' for i in range(20)},
+        uris=['http://example.com/config.tgz'],
+    )
+    return [
+        task_config.set(uuid=f'task{i}', ports=v(m(begin=31000 + i, end=31000 + i)))
+        for i in range(TASKS_PER_BATCH)
+    ]
+
+
+def main():
+    tasks = make_tasks()
+
+    def build_batches(make_task_info):
+        for _ in range(BATCHES):
+            [
+                make_task_info(task_config, 'agent', 'role')
+                for task_config in tasks
+            ]
+
+    for name, make_task_info in (
+        ('from scratch', _make_mesos_task_info),
+        ('template', make_mesos_task_info),
+    ):
+        report(
+            name,
+            per_second(BATCHES * TASKS_PER_BATCH, lambda: build_batches(make_task_info)),
+            'TaskInfos/s',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Transitions/sec of ExecutionFramework task metadata: the persistent
+PRecord-in-a-PMap approach versus TaskMetadataStore.
+
+Every task goes through TASK_INITED -> TASK_STAGING -> TASK_RUNNING and is
+then removed, the way the scheduler sees a task that finishes normally.
+
+Run from the repository root with `python -m benchmarks.task_metadata`
+"""
+import time
+
+from pyrsistent import field
+from pyrsistent import m
+from pyrsistent import PMap
+from pyrsistent import pmap
+from pyrsistent import PRecord
+
+from benchmarks.harness import per_second
+from benchmarks.harness import report
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.task_metadata import TaskMetadata
+from task_processing.plugins.mesos.task_metadata import TaskMetadataStore
+
+NUM_TASKS = 100000
+STATES = ('TASK_STAGING', 'TASK_RUNNING')
+
+
+class PersistentTaskMetadata(PRecord):
+    agent_id = field(type=str, initial='')
+    task_config = field(type=PRecord, mandatory=True)
+    task_state = field(type=str, mandatory=True)
+    task_state_history = field(type=PMap, factory=pmap, mandatory=True)
+
+
+def run_pmap(task_ids, task_config):
+    task_metadata = m()
+    for task_id in task_ids:
+        task_metadata = task_metadata.set(task_id, PersistentTaskMetadata(
+            task_config=task_config,
+            task_state='TASK_INITED',
+            task_state_history=m(TASK_INITED=time.time()),
+        ))
+    for state in STATES:
+        for task_id in task_ids:
+            md = task_metadata[task_id]
+            task_metadata = task_metadata.set(task_id, md.set(
+                task_state=state,
+                task_state_history=md.task_state_history.set(state, time.time()),
+            ))
+    for task_id in task_ids:
+        task_metadata = task_metadata.discard(task_id)
+
+
+def run_store(task_ids, task_config):
+    task_metadata = TaskMetadataStore()
+    for task_id in task_ids:
+        task_metadata[task_id] = TaskMetadata(
+            task_config=task_config,
+            task_state='TASK_INITED',
+            task_state_history={'TASK_INITED': time.time()},
+        )
+    for state in STATES:
+        for task_id in task_ids:
+            task_metadata.transition(task_id, state, time.time())
+    for task_id in task_ids:
+        task_metadata.pop(task_id)
+
+
+def main():
+    task_config = MesosTaskConfig(image='busybox', cmd='/bin/true')
+    task_ids = [f'benchmark.{i}' for i in range(NUM_TASKS)]
+    # insert + two transitions + removal
+    transitions = NUM_TASKS * (len(STATES) + 2)
+
+    for name, run in (('PMap', run_pmap), ('TaskMetadataStore', run_store)):
+        report(
+            name,
+            per_second(transitions, lambda: run(task_ids, task_config)),
+            'transitions/s',
+            width=18,
+            value_format='12,.0f',
+        )
+
+
+if __name__ == '__main__':
+    main()
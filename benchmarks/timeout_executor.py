@@ -0,0 +1,57 @@
+"""Events/sec handled by TimeoutExecutor with many tasks running: every
+task gets a TASK_RUNNING update, then a terminal one, then another batch of
+tasks is started. The timers are checked after every event, as the timeout
+loop does.
+
+Run from the repository root with `python -m benchmarks.timeout_executor`
+"""
+import time
+from unittest import mock
+
+from benchmarks.harness import per_second
+from benchmarks.harness import report
+from benchmarks.harness import StubExecutor
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+RUNNING_TASKS = (1000, 10000, 50000)
+
+
+def events_per_second(num_tasks):
+    with mock.patch('task_processing.plugins.mesos.timeout_executor.Thread'):
+        executor = TimeoutExecutor(StubExecutor())
+    task_config = MesosTaskConfig(
+        name='benchmark', image='benchmark', cmd='/bin/true', timeout=3600,
+    )
+    task_configs = [task_config.set(uuid=f'task{i}') for i in range(num_tasks)]
+    for config in task_configs:
+        executor.run(config)
+    events = [
+        task_event(
+            task_id=config.task_id,
+            task_config=config,
+            terminal=terminal,
+            platform_type='finished' if terminal else 'running',
+        )
+        for terminal in (False, True)
+        for config in task_configs
+    ]
+
+    def handle_events():
+        for event in events:
+            executor.handle_event(event)
+            executor._kill_timed_out_tasks(time.time())
+
+    rate = per_second(len(events), handle_events)
+    assert not executor.running_tasks
+    return rate
+
+
+def main():
+    for num_tasks in RUNNING_TASKS:
+        report(f'{num_tasks:,} tasks', events_per_second(num_tasks), 'events/s')
+
+
+if __name__ == '__main__':
+    main()
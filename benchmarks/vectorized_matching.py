@@ -0,0 +1,68 @@
+"""Offers/sec that get_tasks_for_offer and VectorizedOfferMatcher
+can match against a large queue of pending tasks.
+
+Most of the queue is too big for the offers, which is when matching is the
+most expensive: every task has to be looked at for every offer.
+
+Run from the repository root with `python -m benchmarks.vectorized_matching`
+(needs numpy)
+"""
+import random
+
+from pyrsistent import m
+from pyrsistent import v
+
+from benchmarks.harness import per_second
+from benchmarks.harness import report
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.vectorized import VectorizedOfferMatcher
+
+NUM_TASKS = 20000
+NUM_OFFERS = 20
+
+
+def make_tasks():
+    rand = random.Random(0)
+    return [
+        MesosTaskConfig(
+            name=f'benchmark{i}',
+            image='busybox',
+            cmd='/bin/true',
+            cpus=rand.choice([1, 2, 4, 32, 64]),
+            mem=rand.choice([128, 1024, 65536]),
+            disk=10,
+        )
+        for i in range(NUM_TASKS)
+    ]
+
+
+def main():
+    task_configs = make_tasks()
+    offer_resources = ResourceSet(
+        cpus=8,
+        mem=8192,
+        disk=1000,
+        ports=v(m(begin=31000, end=31100)),
+    )
+
+    def match_offers(get_tasks):
+        for _ in range(NUM_OFFERS):
+            get_tasks(task_configs, offer_resources, {}, 'role')
+
+    for name, get_tasks in (
+        ('get_tasks_for_offer', get_tasks_for_offer),
+        ('vectorized', VectorizedOfferMatcher()),
+    ):
+        report(
+            name,
+            per_second(NUM_OFFERS, lambda: match_offers(get_tasks)),
+            'offers/s',
+            width=20,
+            value_format='8,.1f',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -30,8 +30,11 @@ setup(
         "task_processing": ["py.typed"]
     },
     install_requires=[
-        # used for immutable data structures
-        'pyrsistent',
+        # used for immutable data structures. Trusted events are built with
+        # PRecord internals: releases that change them still work, but the
+        # trusted constructors fall back to validating events, and
+        # tests/unit/interfaces/event_test.py fails so we notice.
+        'pyrsistent>=0.14',
         # until we can drop py36, used for things like TypedDicts
         'typing-extensions',
     ],
@@ -40,6 +43,8 @@ setup(
         'mesos_executor': ['addict', 'pymesos>=0.2.14', 'requests'],
         'metrics': ['yelp-meteorite'],
         'persistence': ['boto3'],
-        'k8s': ['kubernetes']
+        'k8s': ['kubernetes'],
+        # faster offer matching for large task queues
+        'vectorized': ['numpy'],
     }
 )
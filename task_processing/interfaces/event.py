@@ -1,6 +1,13 @@
 import json
+import logging
+import pickle
+import sys
 import uuid
+from collections.abc import Mapping
 from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Union
 
 from pyrsistent import field
 from pyrsistent import freeze
@@ -9,6 +16,8 @@ from pyrsistent import PMap
 from pyrsistent import pmap
 from pyrsistent import PRecord
 
+log = logging.getLogger(__name__)
+
 EVENT_KINDS = {'task', 'control'}
 EVENT_TASK_ATTRS = {'task_id', 'task_config'}
 
@@ -67,6 +76,221 @@ def control_event(**kwargs):
     return Event(**kwargs)
 
 
+# Every field's initial value, which Event(...) would fill in
+_EVENT_DEFAULTS = pmap({
+    name: initial() if callable(initial) else initial
+    for name, initial in Event._precord_initial_values.items()
+})
+
+
+def _unvalidated_event(base: PMap, fields: dict) -> Event:
+    # PMap's own evolver, not the validating one of PRecord
+    evolver = PMap.evolver(base)
+    for name, value in fields.items():
+        evolver.set(name, value)
+    pm = evolver.persistent()
+    # the same shortcut PRecord uses once its evolver has validated a
+    # record. It's not public API, so it's checked below before it is used.
+    return Event(_precord_size=pm._size, _precord_buckets=pm._buckets)
+
+
+def _check_unvalidated_events() -> bool:
+    """ Whether the installed pyrsistent builds the same Events through
+    `_unvalidated_event` as through the public, validating constructor
+    """
+    fields = dict(kind='task', task_id='check', task_config=pmap({'a': 'b'}))
+    try:
+        event = _unvalidated_event(_EVENT_DEFAULTS, fields)
+        validated = Event(**fields)
+        return (
+            type(event) is Event and
+            event == validated and
+            hash(event) == hash(validated) and
+            event.set(task_id='other').task_id == 'other'
+        )
+    except Exception:
+        return False
+
+
+# False if a pyrsistent release changed the PRecord internals the trusted
+# constructors rely on; they then validate events like any other
+_UNVALIDATED_EVENTS_SUPPORTED = _check_unvalidated_events()
+if not _UNVALIDATED_EVENTS_SUPPORTED:
+    log.warning(
+        'This version of pyrsistent can\'t build events without validating '
+        'them; trusted events will be validated')
+
+
+def _trusted_event(base: PMap, fields: dict) -> Event:
+    if _UNVALIDATED_EVENTS_SUPPORTED:
+        return _unvalidated_event(base, fields)
+    return Event.create(dict(base, **fields))
+
+
+def trusted_task_event(**kwargs) -> Event:
+    """ Build a task event like `task_event`, but without running the
+    factories, type checks and invariants of `Event` on its fields
+
+    Only for events the executors build themselves, from fields that are
+    known to be valid: task_id a str, task_config a PMap (e.g. the task's
+    config), timestamp a float, and so on. Anything else must go through
+    `task_event`.
+    """
+    kwargs.setdefault('kind', 'task')
+    return _trusted_event(_EVENT_DEFAULTS, kwargs)
+
+
+def trusted_set(event: Event, **kwargs) -> Event:
+    """ `event.set(**kwargs)` without validating the new values, which must
+    be valid already (see `trusted_task_event`)
+    """
+    return _trusted_event(event, kwargs)
+
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def summarize_raw(raw: Any) -> Any:
+    """ The default summary of an event's raw payload: the scalar top-level
+    fields of a mapping, e.g. the state, reason and message of a Mesos
+    status update, or the payload itself if it is a scalar already
+    """
+    if isinstance(raw, _SCALAR_TYPES):
+        return raw
+    if isinstance(raw, Mapping):
+        return {
+            key: value
+            for key, value in raw.items()
+            if isinstance(value, _SCALAR_TYPES)
+        }
+    return None
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+
+class CompactEvent:
+    """ A read-only copy of an Event that takes a fraction of its memory,
+    for holding on to many events, e.g. in a queue that isn't drained
+    quickly
+
+    It has the same fields as an Event, read as attributes, in one slotted
+    object instead of a PMap. kind and platform_type are interned, so the
+    copies share them. The raw payload is optional: it can be kept, packed
+    until it is first read, summarised or stripped (see `compact_event`).
+    `to_event` turns it back into an Event.
+    """
+    __slots__ = (
+        'kind', 'timestamp', '_raw', '_packed_raw', 'extensions', 'terminal',
+        'task_id', 'task_config', 'success', 'platform_type', 'message',
+    )
+    _FIELDS = (
+        'kind', 'timestamp', 'raw', 'extensions', 'terminal', 'task_id',
+        'task_config', 'success', 'platform_type', 'message',
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        timestamp: float = 0.0,
+        raw: Any = None,
+        extensions: PMap = m(),
+        terminal: bool = False,
+        task_id: Optional[str] = None,
+        task_config: PMap = m(),
+        success: Optional[bool] = None,
+        platform_type: Optional[str] = None,
+        message: Optional[str] = None,
+        packed_raw: Optional[bytes] = None,
+    ) -> None:
+        """
+        :param packed_raw: the raw payload pickled, to be unpickled the first
+            time `raw` is read; raw must be None then
+        """
+        self.kind = sys.intern(kind)
+        self.timestamp = timestamp
+        self._raw = raw
+        self._packed_raw = packed_raw
+        self.extensions = extensions
+        self.terminal = terminal
+        self.task_id = task_id
+        self.task_config = task_config
+        self.success = success
+        self.platform_type = _intern(platform_type)
+        self.message = message
+
+    @property
+    def raw(self) -> Any:
+        if self._packed_raw is not None:
+            self._raw = pickle.loads(self._packed_raw)
+            self._packed_raw = None
+        return self._raw
+
+    def to_event(self) -> Event:
+        return _trusted_event(_EVENT_DEFAULTS, {
+            name: getattr(self, name) for name in self._FIELDS
+        })
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactEvent):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self._FIELDS
+        )
+
+    def __repr__(self):
+        return 'CompactEvent({})'.format(', '.join(
+            f'{name}={getattr(self, name)!r}' for name in self._FIELDS
+        ))
+
+
+RawPolicy = Union[str, Callable[[Any], Any]]
+
+
+def compact_event(event: Event, raw: RawPolicy = 'keep') -> CompactEvent:
+    """ Make a CompactEvent out of an Event
+
+    :param raw: what to do with the raw payload: 'keep' it, keep it
+        pickled until it is first read ('lazy'), 'strip' it, keep only a
+        'summary' of it (see `summarize_raw`), or a function that returns
+        what to keep of it. A 'lazy' payload that can't be pickled is kept
+        as is.
+    :raises ValueError: if raw is none of these
+    """
+    packed_raw = None
+    if raw == 'keep':
+        compact_raw = event.raw
+    elif raw == 'lazy':
+        try:
+            packed_raw = pickle.dumps(event.raw, pickle.HIGHEST_PROTOCOL)
+            compact_raw = None
+        except Exception:
+            compact_raw = event.raw
+    elif raw == 'strip':
+        compact_raw = None
+    elif raw == 'summary':
+        compact_raw = summarize_raw(event.raw)
+    elif callable(raw):
+        compact_raw = raw(event.raw)
+    else:
+        raise ValueError(f'Unknown raw policy {raw}')
+
+    return CompactEvent(
+        kind=event.kind,
+        timestamp=event.timestamp,
+        raw=compact_raw,
+        extensions=event.extensions,
+        terminal=event.terminal,
+        task_id=event.task_id,
+        task_config=event.task_config,
+        success=event.success,
+        platform_type=event.platform_type,
+        message=event.message,
+        packed_raw=packed_raw,
+    )
+
+
 def json_serializer(o):
     if isinstance(o, uuid.UUID):
         return o.hex
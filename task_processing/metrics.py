@@ -42,6 +42,16 @@ def create_timer(name, dimensions={}):
         _registered_metrics[name] = timer
 
 
+def create_gauge(name, dimensions={}):
+    if not METRICS_ENABLED:
+        return
+
+    if name not in _registered_metrics:
+        gauge = yelp_meteorite.create_gauge(
+            name, default_dimensions=dimensions)
+        _registered_metrics[name] = gauge
+
+
 def get_metric(name):
     if METRICS_ENABLED:
         return _registered_metrics.get(name)
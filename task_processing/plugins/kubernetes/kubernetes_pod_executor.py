@@ -18,7 +18,7 @@ from pyrsistent.typing import PMap
 
 from task_processing.interfaces import TaskExecutor
 from task_processing.interfaces.event import Event
-from task_processing.interfaces.event import task_event
+from task_processing.interfaces.event import trusted_task_event
 from task_processing.plugins.kubernetes.kube_client import KubeClient
 from task_processing.plugins.kubernetes.task_config import KubernetesTaskConfig
 from task_processing.plugins.kubernetes.types import KubernetesTaskMetadata
@@ -128,7 +128,7 @@ class KubernetesPodExecutor(TaskExecutor):
 
         self.task_metadata = self.task_metadata.discard(pod_name)
         self.event_queue.put(
-            task_event(
+            trusted_task_event(
                 task_id=pod_name,
                 terminal=True,
                 success=False,
@@ -160,7 +160,7 @@ class KubernetesPodExecutor(TaskExecutor):
             )
             self.task_metadata = self.task_metadata.discard(pod_name)
             self.event_queue.put(
-                task_event(
+                trusted_task_event(
                     task_id=pod_name,
                     terminal=True,
                     success=True,
@@ -179,7 +179,7 @@ class KubernetesPodExecutor(TaskExecutor):
             logger.info(f"Removing {pod_name} from state and emitting 'failed' event.")
             self.task_metadata = self.task_metadata.discard(pod_name)
             self.event_queue.put(
-                task_event(
+                trusted_task_event(
                     task_id=pod_name,
                     terminal=True,
                     success=False,
@@ -207,7 +207,7 @@ class KubernetesPodExecutor(TaskExecutor):
                 )
             )
             self.event_queue.put(
-                task_event(
+                trusted_task_event(
                     task_id=pod_name,
                     terminal=False,
                     timestamp=time.time(),
@@ -240,7 +240,7 @@ class KubernetesPodExecutor(TaskExecutor):
                 )
             )
             self.event_queue.put(
-                task_event(
+                trusted_task_event(
                     task_id=pod_name,
                     terminal=False,
                     timestamp=time.time(),
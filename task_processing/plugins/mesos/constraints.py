@@ -1,8 +1,22 @@
+import functools
 import re
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Sequence
 
 from pyrsistent import field
 from pyrsistent import PRecord
 
+# a constraint, or a set of constraints, compiled into a check of an offer's
+# attributes
+AttributesPredicate = Callable[[dict], bool]
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_regex(re_pattern):
+    return re.compile(re_pattern)
+
 
 def equals_op(expected_value, actual_value):
     return expected_value == actual_value
@@ -13,7 +27,7 @@ def notequals_op(expected_value, actual_value):
 
 
 def like_op(re_pattern, actual_value):
-    return re.fullmatch(re_pattern, actual_value)
+    return _compile_regex(re_pattern).fullmatch(actual_value)
 
 
 def unlike_op(re_pattern, actual_value):
@@ -30,25 +44,84 @@ OPERATORS = {
 }
 
 
-def _attributes_match_constraint(attributes, constraint):
-    actual_value = attributes.get(constraint.attribute)
-    # If the dictionary doesn't contain an attribute from the constraint then
-    # the constraint is satisfied.
-    if actual_value is None:
+def attributes_match_constraints(attributes, constraints):
+    # If constraints aren't specified then they are satisfied.
+    if not constraints:
         return True
 
-    # The operator names have already been validated by the validator in
-    # `MesosTaskConfig`, so it's guaranteed that it's in `OPERATORS`.
-    return OPERATORS[constraint.operator](constraint.value, actual_value)
+    return compile_constraints(constraints)(attributes)
 
 
-def attributes_match_constraints(attributes, constraints):
-    # If constraints aren't specified then they are satisfied.
-    if constraints is None:
-        return True
+def _compile_constraint(constraint) -> AttributesPredicate:
+    attribute = constraint.attribute
+    expected_value = constraint.value
+    if constraint.operator in ('LIKE', 'UNLIKE'):
+        fullmatch = _compile_regex(expected_value).fullmatch
+        negate = constraint.operator == 'UNLIKE'
+
+        def value_matches(actual_value):
+            return (fullmatch(actual_value) is None) == negate
+    else:
+        # The operator names have already been validated by the validator in
+        # `MesosTaskConfig`, so it's guaranteed that it's in `OPERATORS`.
+        op = OPERATORS[constraint.operator]
+
+        def value_matches(actual_value):
+            return op(expected_value, actual_value)
+
+    def matches(attributes):
+        actual_value = attributes.get(attribute)
+        # If the dictionary doesn't contain an attribute from the constraint
+        # then the constraint is satisfied.
+        return actual_value is None or value_matches(actual_value)
+
+    return matches
+
+
+def _constraints_signature(constraints) -> Hashable:
+    # task configs hold their constraints in a PVector of Constraints, which
+    # is hashable and compares by value
+    return constraints if isinstance(constraints, Hashable) else tuple(constraints)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_constraints(signature) -> AttributesPredicate:
+    predicates = [_compile_constraint(constraint) for constraint in signature]
+    return lambda attributes: all(matches(attributes) for matches in predicates)
+
+
+def compile_constraints(constraints: Sequence['Constraint']) -> AttributesPredicate:
+    """ Compile a set of constraints into a single check of an offer's
+    attributes
+
+    Regexes are compiled once, and equal sets of constraints share the same
+    compiled check.
+    """
+    return _compile_constraints(_constraints_signature(constraints))
+
+
+def constraints_checker(attributes: dict) -> Callable[[Sequence['Constraint']], bool]:
+    """ Check many sets of constraints against one offer's attributes
+
+    Tasks often share their constraints, so the result for each distinct
+    set of constraints is remembered: the offer's attributes are evaluated
+    once per set rather than once per task.
+
+    :returns: a function of constraints -> whether `attributes` match them,
+        like `attributes_match_constraints`
+    """
+    results: Dict[Hashable, bool] = {}
+
+    def check(constraints):
+        if not constraints:
+            return True
+        signature = _constraints_signature(constraints)
+        result = results.get(signature)
+        if result is None:
+            result = results[signature] = _compile_constraints(signature)(attributes)
+        return result
 
-    return all(_attributes_match_constraint(attributes, c)
-               for c in constraints)
+    return check
 
 
 def valid_constraint_operator_name(name):
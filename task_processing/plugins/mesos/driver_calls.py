@@ -0,0 +1,84 @@
+import threading
+from typing import Any
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+OnError = Optional[Callable[[], None]]
+
+
+class DriverCallSender:
+    """ Driver calls waiting to be sent by a thread of their own
+
+    Scheduler callbacks queue their driver calls here and return right away
+    instead of waiting on the master. The sender drains everything that has
+    been queued in one go, in the order the calls were queued, as the
+    callbacks would have made them. Declines queued one right after the
+    other with the same filters are sent as a single declineOffer call.
+
+    :param call_driver: sends one call, returning `driver_error` if it failed
+    :param driver_error: the sentinel `call_driver` returns on failure
+    """
+
+    def __init__(
+        self,
+        call_driver: Callable[..., Any],
+        driver_error: object,
+    ) -> None:
+        self._call_driver = call_driver
+        self._driver_error = driver_error
+        # (method, args, on_error); the args of a declineOffer are
+        # ([offer ids], filters), and further offer ids are added to the
+        # list while it's the last call queued
+        self._calls: List[Tuple[str, tuple, OnError]] = []
+        self._cond = threading.Condition()
+        self._stopping = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._calls)
+
+    def put(self, method: str, *args, on_error: OnError = None) -> None:
+        """ Queue a driver call
+
+        :param on_error: called from the sender thread if the call failed
+        """
+        with self._cond:
+            self._calls.append((method, args, on_error))
+            self._cond.notify()
+
+    def decline(self, offer_ids: list, filters: Any) -> None:
+        with self._cond:
+            if self._calls:
+                method, args, _ = self._calls[-1]
+                if method == 'declineOffer' and args[1] is filters:
+                    args[0].extend(offer_ids)
+                    return
+            self._calls.append(('declineOffer', (list(offer_ids), filters), None))
+            self._cond.notify()
+
+    def flush(self) -> None:
+        """ Send every call queued so far """
+        with self._cond:
+            calls, self._calls = self._calls, []
+
+        for method, args, on_error in calls:
+            if self._call_driver(method, *args) is self._driver_error and on_error:
+                on_error()
+
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                while not (self._calls or self._stopping):
+                    self._cond.wait()
+                stopping = self._stopping
+            # whatever was queued before stop() is still sent
+            self.flush()
+            if stopping:
+                return
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
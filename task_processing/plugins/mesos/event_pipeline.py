@@ -0,0 +1,70 @@
+import time
+from queue import Empty
+from queue import Queue
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+# Put on a layer's source queue to make pump_events look at its timers and
+# its stopping flag again; never passed to the layer
+_WAKE = object()
+
+
+def pump_events(
+    src_queue: Queue,
+    handle_event: Callable[[Any], None],
+    is_stopping: Callable[[], bool],
+    next_deadline: Optional[Callable[[], Optional[float]]] = None,
+    on_deadline: Optional[Callable[[float], None]] = None,
+) -> None:
+    """ Pass the events of the executor a layer wraps to the layer as they
+    arrive
+
+    The event loop of an executor layer (RetryingExecutor, TimeoutExecutor,
+    MesosLoggingExecutor, ...): it blocks on the source queue instead of
+    polling it, so a stack of layers hands a terminal event up to the runner
+    right away. A layer with timers gives the time its next timer is due
+    at, and is woken up then even if no event arrives. Returns once the
+    layer is stopping and every event queued so far has been handled.
+
+    :param src_queue: the event queue of the downstream executor
+    :param handle_event: called with every event, in order
+    :param is_stopping: whether the layer is being stopped
+    :param next_deadline: the time.time() the layer's next timer is due at,
+        or None if there is none
+    :param on_deadline: called with the current time after every event and
+        whenever the next timer may be due
+    """
+    while True:
+        if is_stopping() and src_queue.empty():
+            return
+
+        timeout = None
+        deadline = next_deadline() if next_deadline is not None else None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.time())
+
+        try:
+            event = src_queue.get(timeout=timeout)
+        except Empty:
+            pass
+        else:
+            if event is _WAKE:
+                # it was never the layer's to mark done
+                src_queue.task_done()
+            else:
+                handle_event(event)
+
+        if on_deadline is not None:
+            on_deadline(time.time())
+
+
+def wake_pump(src_queue: Queue) -> None:
+    """ Make pump_events reading from src_queue check the layer's timers and
+    stopping flag again, e.g. after adding a timer earlier than all the
+    others or before joining the layer's thread
+
+    This puts a sentinel on the downstream executor's queue, so layers only
+    call it when the pump would otherwise wait too long, not on every call.
+    """
+    src_queue.put(_WAKE)
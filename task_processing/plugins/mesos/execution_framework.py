@@ -1,29 +1,35 @@
+import heapq
+import itertools
 import logging
+import random
 import socket
 import threading
 import time
 from collections import defaultdict
+from collections import OrderedDict
 from queue import Queue
+from typing import List
 from typing import Optional  # noqa, flake8 issue
+from typing import Set
+from typing import Tuple
 from typing import TYPE_CHECKING
 
 from addict import Dict
 from pymesos.interface import Scheduler
-from pyrsistent import field
-from pyrsistent import m
-from pyrsistent import PMap
-from pyrsistent import pmap
-from pyrsistent import PRecord
-from pyrsistent import PVector
-from pyrsistent import v
 
 from task_processing.interfaces.event import control_event
-from task_processing.interfaces.event import task_event
+from task_processing.interfaces.event import trusted_task_event
 from task_processing.metrics import create_counter
+from task_processing.metrics import create_gauge
 from task_processing.metrics import create_timer
 from task_processing.metrics import get_metric
 from task_processing.plugins.mesos import metrics
+from task_processing.plugins.mesos.driver_calls import DriverCallSender
+from task_processing.plugins.mesos.pending_tasks import PendingTaskQueue
 from task_processing.plugins.mesos.resource_helpers import get_offer_resources
+from task_processing.plugins.mesos.resource_helpers import largest_resources
+from task_processing.plugins.mesos.task_metadata import TaskMetadata
+from task_processing.plugins.mesos.task_metadata import TaskMetadataStore
 
 
 if TYPE_CHECKING:
@@ -31,13 +37,30 @@ if TYPE_CHECKING:
 
 
 log = logging.getLogger(__name__)
+# offer matching callbacks already warned about returning the deprecated
+# (tasks_to_launch, tasks_to_defer) pair
+_warned_pair_callbacks: Set[str] = set()
 
 
-class TaskMetadata(PRecord):
-    agent_id = field(type=str, initial='')
-    task_config = field(type=PRecord, mandatory=True)
-    task_state = field(type=str, mandatory=True)
-    task_state_history = field(type=PMap, factory=pmap, mandatory=True)
+def _tasks_to_launch(callback_name, result):
+    """ What an offer matching callback returned, without the tasks to
+    defer that callbacks used to return as well
+
+    `get_tasks_for_offer` and `get_tasks_for_offers` used to return a pair
+    of (tasks to launch, tasks to defer). The pair is still accepted, with a
+    warning, and the tasks to defer are ignored: whatever isn't launched
+    stays pending anyway.
+    """
+    if not isinstance(result, tuple):
+        return result
+
+    if callback_name not in _warned_pair_callbacks:
+        _warned_pair_callbacks.add(callback_name)
+        log.warning(
+            f'{callback_name} returned (tasks_to_launch, tasks_to_defer), '
+            'which is deprecated: return only the tasks to launch')
+    tasks_to_launch, _ = result
+    return tasks_to_launch
 
 
 class ExecutionFramework(Scheduler):
@@ -55,8 +78,19 @@ class ExecutionFramework(Scheduler):
         suppress_delay=10,
         initial_decline_delay=1,
         task_reconciliation_delay=300,
+        reconciliation_batch_size=100,
+        reconciliation_batch_interval_s=1,
+        reconciliation_jitter=0.5,
         framework_id=None,
         failover_timeout=604800,  # 1 week
+        global_offer_matching=False,
+        offer_hold_s=0,
+        max_held_offers=10,
+        async_driver_calls=False,
+        use_unreserved_resources=False,
+        task_queue: Optional[PendingTaskQueue] = None,
+        gang_hold_s=30,
+        use_addict=True,
     ) -> None:
         self.name = name
         # wait this long for a task to launch.
@@ -66,6 +100,29 @@ class ExecutionFramework(Scheduler):
         self.callbacks = callbacks
         self.slave_blacklist_timeout_s = slave_blacklist_timeout_s
         self.offer_backoff = offer_backoff
+        # Match each batch of offers against the pending tasks as a whole
+        # instead of one offer at a time
+        self.global_offer_matching = global_offer_matching
+        if global_offer_matching and callbacks.get_tasks_for_offers is None:
+            raise ValueError(
+                'global_offer_matching requires a get_tasks_for_offers callback')
+        # Keep up to max_held_offers unused offers for offer_hold_s seconds,
+        # so that tasks enqueued in the meantime can launch without waiting
+        # for a new round of offers. 0 declines unused offers right away.
+        self.offer_hold_s = offer_hold_s
+        self.max_held_offers = max_held_offers
+        # While a gang of tasks is waiting for enough resources to launch
+        # all of its members, hold unused offers for up to gang_hold_s
+        # seconds so that they can be combined with later offers
+        self.gang_hold_s = gang_hold_s
+        # Use the unreserved resources in offers as well as the ones
+        # reserved for our role
+        self.use_unreserved_resources = use_unreserved_resources
+        # The type of the messages the driver passes us, and of the ones we
+        # build for it: addict.Dict, or dict if the driver was created with
+        # use_addict=False. Messages from the driver are only ever read with
+        # subscripts, so that either works.
+        self._dict_cls = Dict if use_addict else dict
 
         # TODO: why does this need to be root, can it be "mesos plz figure out"
         self.framework_info = Dict(
@@ -78,20 +135,53 @@ class ExecutionFramework(Scheduler):
         if framework_id:
             self.framework_info['id'] = {'value': framework_id}
 
-        self.task_queue: Queue = Queue()
+        # FIFO unless another queue, e.g. a FairTaskQueue, is passed in
+        self.task_queue = PendingTaskQueue() if task_queue is None else task_queue
+        # gang_id -> the tasks of a gang waiting to launch, oldest first
+        self._gangs: OrderedDict = OrderedDict()
+        # task_id -> gang_id of every task in self._gangs
+        self._task_gangs: dict = {}
         self.event_queue: Queue = Queue()
         self._driver: Optional[Scheduler] = None
         self.are_offers_suppressed = False
         self.suppress_after = int(time.time()) + suppress_delay
         self.decline_after = time.time() + initial_decline_delay
+        # Reconcile tasks we haven't heard about for this long, at most
+        # reconciliation_batch_size of them every
+        # reconciliation_batch_interval_s, stretched by up to
+        # reconciliation_jitter so that frameworks don't line up.
         self._task_reconciliation_delay = task_reconciliation_delay
-        self._reconcile_tasks_at = time.time() + \
-            self._task_reconciliation_delay
+        self.reconciliation_batch_size = reconciliation_batch_size
+        self.reconciliation_batch_interval_s = reconciliation_batch_interval_s
+        self.reconciliation_jitter = reconciliation_jitter
 
         self.offer_decline_filter = Dict(refuse_seconds=self.offer_backoff)
         self._lock = threading.RLock()
-        self.blacklisted_slaves: PVector = v()
-        self.task_metadata: PMap = m()
+        # agent_id -> time the blacklist expires at
+        self.blacklisted_slaves: dict = {}
+        # heap of (expires_at, agent_id)
+        self._blacklist_expiries: List[Tuple[float, str]] = []
+        # offer_id -> ((offer, resources, attributes), held until), oldest
+        # first
+        self._held_offers: OrderedDict = OrderedDict()
+        # Set when tasks were enqueued while offers were held; the
+        # background thread then matches them, so that enqueueing never
+        # waits on a launch
+        self._match_held_offers = False
+        self.task_metadata = TaskMetadataStore()
+        # heap of (deadline, seq, task_id, task_state, in task_state since)
+        self._deadlines: List[Tuple[float, int, str, str, float]] = []
+        self._deadline_seq = itertools.count()
+        self._deadlines_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # task_id -> last time Mesos told us about the task
+        self._last_heard: dict = {}
+        # heap of (time the task is silent from, task_id), one per task
+        self._silence_deadlines: List[Tuple[float, str]] = []
+        # silent tasks waiting for their reconciliation batch, oldest first
+        self._tasks_to_reconcile: OrderedDict = OrderedDict()
+        self._next_reconcile_batch_at = 0.0
+        self._reconcile_lock = threading.Lock()
 
         self._initialize_metrics()
         self._last_offer_time: Optional[float] = None
@@ -112,6 +202,18 @@ class ExecutionFramework(Scheduler):
         task_kill_thread.daemon = True
         task_kill_thread.start()
 
+        # Send every driver call from a thread of its own, so that the driver
+        # callbacks never wait on the master. The calls are sent in the order
+        # they were made; the ones whose outcome matters are assumed to work,
+        # and their effects are undone if the sender finds out they didn't.
+        self._driver_calls: Optional[DriverCallSender] = None
+        if async_driver_calls:
+            self._driver_calls = DriverCallSender(self.call_driver, self.driver_error)
+            driver_call_thread = threading.Thread(
+                target=self._driver_calls.run, args=())
+            driver_call_thread.daemon = True
+            driver_call_thread.start()
+
     def call_driver(self, method, *args, **kwargs):
         if not self._driver:
             log.error(f'{method} failed: No driver')
@@ -123,49 +225,156 @@ class ExecutionFramework(Scheduler):
             log.warning(f'{method} failed: {str(e)}')
             return self.driver_error
 
-    def _background_check_task(self, time_now, tasks_to_reconcile, task_id, md):
-        if md.task_state != 'TASK_INITED':
-            tasks_to_reconcile.append(task_id)
+    def _decline_offer_ids(self, offer_ids):
+        if self._driver_calls is not None:
+            self._driver_calls.decline(offer_ids, self.offer_decline_filter)
+        else:
+            self.call_driver('declineOffer', offer_ids, self.offer_decline_filter)
+
+    def _send_driver_call(self, method, *args, on_error=None):
+        """ Make a driver call, or queue it for the sender thread when driver
+        calls are asynchronous
+
+        :param on_error: called from the sender thread if a queued call
+            failed, to undo what was done assuming that it worked
+        :returns: whether the call worked, which is assumed for a queued call
+        """
+        if self._driver_calls is not None:
+            self._driver_calls.put(method, *args, on_error=on_error)
+            return True
+        return self.call_driver(method, *args) is not self.driver_error
+
+    def _acknowledge(self, update):
+        self._send_driver_call('acknowledgeStatusUpdate', update)
+
+    def _task_deadline(self, task_config, task_state, since, time_now):
+        """ When the background check next has to look at a task, if ever """
+        if task_state == 'TASK_INITED':
+            # give up if the task hasn't launched after offer_timeout
+            return since + task_config.offer_timeout
+        elif task_state in ('UNKNOWN', 'TASK_STAGING'):
+            return since + self.task_staging_timeout_s
+        elif task_state == 'TASK_STUCK':
+            # re-send the kill every time the task has been stuck for
+            # another hour
+            hours_stuck = max(time_now - since, 0) // 3600
+            return max(
+                since + 3600 * (hours_stuck + 1),
+                since + self.task_staging_timeout_s,
+            )
+        return None
+
+    def _schedule_deadline(self, task_id, task_config, task_state, since, time_now):
+        """ Deadlines are never removed from the heap; an entry is ignored
+        when it pops if the task has left the state it was scheduled for in
+        the meantime.
+        """
+        deadline = self._task_deadline(task_config, task_state, since, time_now)
+        if deadline is None:
+            return
 
-        if md.task_state == 'TASK_INITED':
-            # give up if the task hasn't launched after
-            # offer_timeout
-            inited_at = md.task_state_history['TASK_INITED']
-            offer_timeout = md.task_config.offer_timeout
-            expires_at = inited_at + offer_timeout
-            if time_now >= expires_at:
-                log.warning(
-                    f'Task {task_id} has been waiting for offers '
-                    'for longer than configured timeout '
-                    f'{offer_timeout}. Giving up and removing the '
-                    'task from the task queue.'
-                )
-                # killing the task will also remove them from the queue
-                self.kill_task(task_id)
-                # we are not expecting mesos to send terminal update
-                # for this task, so cleaning it up manually
-                self.task_metadata = self.task_metadata.discard(
-                    task_id
-                )
-                self.event_queue.put(
-                    task_event(
-                        task_id=task_id,
-                        terminal=True,
-                        timestamp=time_now,
-                        success=False,
-                        message='stop',
-                        task_config=md.task_config,
-                        raw='Failed due to offer timeout',
-                    )
-                )
-                get_metric(metrics.TASK_OFFER_TIMEOUT).count(1)
+        with self._deadlines_lock:
+            if not self._deadlines or deadline < self._deadlines[0][0]:
+                self._wakeup.set()
+            heapq.heappush(self._deadlines, (
+                deadline,
+                next(self._deadline_seq),
+                task_id,
+                task_state,
+                since,
+            ))
 
-        # Task is not eligible for killing or reenqueuing
-        in_current_state_since = md.task_state_history[md.task_state]
-        if time_now < in_current_state_since + self.task_staging_timeout_s:
-            return
+    def _update_task_metadata(self, task_id, md):
+        """ Store a task's metadata and schedule its next deadline """
+        self.task_metadata[task_id] = md
+        since = md.task_state_history[md.task_state]
+        self._schedule_deadline(task_id, md.task_config, md.task_state, since, since)
+
+    def _transition_task(
+        self,
+        task_id,
+        task_state,
+        at=None,
+        expected_state=None,
+        agent_id=None,
+    ):
+        """ Move a task to a new state and schedule its next deadline
+
+        :returns: the task's metadata, or None if the task is unknown or was
+            not in `expected_state`
+        """
+        at = time.time() if at is None else at
+        md = self.task_metadata.transition(
+            task_id,
+            task_state,
+            at,
+            expected_state=expected_state,
+            agent_id=agent_id,
+        )
+        if md is not None:
+            self._schedule_deadline(task_id, md.task_config, task_state, at, at)
+        return md
+
+    def _pop_expired_deadlines(self, time_now):
+        expired = []
+        with self._deadlines_lock:
+            while self._deadlines and self._deadlines[0][0] <= time_now:
+                _, _, task_id, task_state, since = heapq.heappop(self._deadlines)
+                md = self.task_metadata.get(task_id)
+                if (
+                    md is not None and
+                    md.task_state == task_state and
+                    md.task_state_history[task_state] == since
+                ):
+                    expired.append((task_id, md))
+        return expired
+
+    def _expire_waiting_task(self, time_now, tasks_to_expire, task_id, md):
+        offer_timeout = md.task_config.offer_timeout
+        log.warning(
+            f'Task {task_id} has been waiting for offers '
+            'for longer than configured timeout '
+            f'{offer_timeout}. Giving up and removing the '
+            'task from the task queue.'
+        )
+        # killing the task will also remove them from the queue,
+        # expired tasks are killed in bulk once the check is done
+        tasks_to_expire.append(task_id)
+        # we are not expecting mesos to send terminal update
+        # for this task, so cleaning it up manually
+        self.task_metadata.pop(task_id)
+        self.event_queue.put(
+            trusted_task_event(
+                task_id=task_id,
+                terminal=True,
+                timestamp=time_now,
+                success=False,
+                message='stop',
+                task_config=md.task_config,
+                raw='Failed due to offer timeout',
+            )
+        )
+        get_metric(metrics.TASK_OFFER_TIMEOUT).count(1)
 
-        if md.task_state == 'UNKNOWN':
+    def _background_check_task(self, time_now, tasks_to_expire, task_id, md):
+        if md.task_state == 'TASK_INITED':
+            if task_id not in self.task_metadata:
+                # already expired along with the rest of its gang
+                return
+            self._expire_waiting_task(time_now, tasks_to_expire, task_id, md)
+            gang_id = self._task_gangs.get(task_id)
+            if gang_id is not None:
+                log.warning(f'Giving up on gang {gang_id}')
+                for task_config in self._gangs[gang_id]:
+                    member_md = self.task_metadata.get(task_config.task_id)
+                    if member_md is not None:
+                        self._expire_waiting_task(
+                            time_now,
+                            tasks_to_expire,
+                            task_config.task_id,
+                            member_md,
+                        )
+        elif md.task_state == 'UNKNOWN':
             log.warning(
                 f'Re-enqueuing task {task_id} in unknown state for '
                 f'longer than {self.task_staging_timeout_s}'
@@ -175,186 +384,425 @@ class ExecutionFramework(Scheduler):
             get_metric(
                 metrics.TASK_FAILED_TO_LAUNCH_COUNT).count(1)
         elif md.task_state == 'TASK_STAGING':
+            # a status update may have moved the task on since its deadline
+            # was checked
+            if self._transition_task(
+                task_id,
+                'TASK_STUCK',
+                time_now,
+                expected_state='TASK_STAGING',
+            ) is None:
+                return
             log.warning(f'Killing stuck task {task_id}')
             self.kill_task(task_id)
-            self.task_metadata = self.task_metadata.set(
-                task_id,
-                md.set(
-                    task_state='TASK_STUCK',
-                    task_state_history=md.task_state_history.set(
-                        'TASK_STUCK', time_now),
-                )
-            )
             self.blacklist_slave(
-                agent_id=self.task_metadata[task_id].agent_id,
+                agent_id=md.agent_id,
                 timeout=self.slave_blacklist_timeout_s,
             )
             get_metric(metrics.TASK_STUCK_COUNT).count(1)
         elif md.task_state == 'TASK_STUCK':
-            t = time.time()
-            # 10s since last iteration + time we spent in current one
-            time_delta = 10 + t - time_now
-            # seconds since task was put in TASK_STUCK state
-            time_stuck = t - md.task_state_history['TASK_STUCK']
-            # seconds since `time_stuck` crossed another hour
-            # boundary
-            hour_rolled = time_stuck % 3600
-
-            # if `time_stuck` crossed hour boundary since last
-            # background check - lets re-send kill request
-            if hour_rolled < time_delta:
-                hours_stuck = time_stuck // 3600
-                log.warning(
-                    f'Task {task_id} is stuck, waiting for terminal '
-                    f'state for {hours_stuck}h, sending another kill'
-                )
-                self.kill_task(task_id)
-
-    def _background_check(self):
-        while True:
-            if self.stopping:
-                return
-
-            time_now = time.time()
-            tasks_to_reconcile = []
-            with self._lock:
-                for task_id, md in self.task_metadata.items():
-                    self._background_check_task(
-                        time_now,
-                        tasks_to_reconcile,
-                        task_id,
-                        md,
-                    )
-
-            self._reconcile_tasks(
-                [Dict({'task_id': Dict({'value': task_id})}) for
-                    task_id in tasks_to_reconcile]
+            hours_stuck = (time_now - md.task_state_history['TASK_STUCK']) // 3600
+            log.warning(
+                f'Task {task_id} is stuck, waiting for terminal '
+                f'state for {hours_stuck}h, sending another kill'
+            )
+            self.kill_task(task_id)
+            # schedule the kill for the next hour
+            self._schedule_deadline(
+                task_id,
+                md.task_config,
+                'TASK_STUCK',
+                md.task_state_history['TASK_STUCK'],
+                time_now,
             )
-            elapsed = time.time() - time_now
-            log.info(f'background check done in {elapsed}s')
-            get_metric(metrics.BGCHECK_TIME_TIMER).record(elapsed)
-            time.sleep(10)
 
-    def reconcile_task(self, task_config):
-        task_id = task_config.task_id
+    def _run_background_check(self):
+        """ Handle every task whose deadline has passed, and reconcile tasks
+        if it is time to
+
+        :returns: the time at which the check has to run next
+        """
+        time_now = time.time()
+        tasks_to_expire = []
         with self._lock:
-            if task_id in self.task_metadata:
-                md = self.task_metadata[task_id]
-                self.task_metadata = self.task_metadata.set(
+            for task_id, md in self._pop_expired_deadlines(time_now):
+                self._background_check_task(
+                    time_now,
+                    tasks_to_expire,
                     task_id,
-                    md.set(
-                        task_state='TASK_RECONCILING',
-                        task_state_history=md.task_state_history.set(
-                            'TASK_RECONCILING', time.time()),
-                    )
+                    md,
                 )
+            if tasks_to_expire:
+                self.kill_tasks(tasks_to_expire)
+            self._reap_blacklisted_slaves(time_now)
+            self._release_held_offers(time_now)
+            if self._match_held_offers:
+                self._match_held_offers = False
+                self._launch_tasks_on_held_offers()
+                self._revive_offers_if_pending()
+
+        next_reconcile_at = self._reconcile_silent_tasks(time_now)
+
+        elapsed = time.time() - time_now
+        log.debug(f'background check done in {elapsed}s')
+        get_metric(metrics.BGCHECK_TIME_TIMER).record(elapsed)
+
+        with self._lock, self._deadlines_lock:
+            return min(
+                next_reconcile_at,
+                self._deadlines[0][0] if self._deadlines else float('inf'),
+                self._blacklist_expiries[0][0] if self._blacklist_expiries else float('inf'),
+                min(
+                    (held_until for _, held_until in self._held_offers.values()),
+                    default=float('inf'),
+                ),
+            )
+
+    def _background_check(self):
+        while not self.stopping:
+            self._wakeup.clear()
+            next_check_at = self._run_background_check()
+            # Woken up early by a new deadline that is earlier than the one
+            # we are waiting for, or by stop()
+            if next_check_at == float('inf'):
+                self._wakeup.wait()
             else:
-                log.info(f'Adding {task_id} to metadata for reconciliation')
-                self.task_metadata = self.task_metadata.set(
-                    task_id,
-                    TaskMetadata(
-                        task_config=task_config,
-                        task_state='TASK_RECONCILING',
-                        task_state_history=m(TASK_RECONCILING=time.time()),
-                    ),
-                )
-        self._reconcile_tasks([
-            Dict({'task_id': Dict({'value': task_id})})
+                self._wakeup.wait(max(next_check_at - time.time(), 0))
+
+    def reconcile_task(self, task_config):
+        task_id = task_config.task_id
+        if self._transition_task(task_id, 'TASK_RECONCILING') is None:
+            log.info(f'Adding {task_id} to metadata for reconciliation')
+            self._update_task_metadata(
+                task_id,
+                TaskMetadata(
+                    task_config=task_config,
+                    task_state='TASK_RECONCILING',
+                    task_state_history={'TASK_RECONCILING': time.time()},
+                ),
+            )
+        # Explicit requests skip the batching, and the task is then watched
+        # like any other in case Mesos stays silent about it.
+        self._heard_from(task_id, time.time())
+        self._reconcile_tasks([task_id])
+
+    def _reconcile_tasks(self, task_ids):
+        log.info(f'Reconciling following tasks {task_ids}')
+        self._send_driver_call('reconcileTasks', [
+            self._dict_cls(task_id=self._dict_cls(value=task_id))
+            for task_id in task_ids
         ])
 
-    def _reconcile_tasks(self, tasks_to_reconcile):
-        if time.time() < self._reconcile_tasks_at:
-            return
+    def _heard_from(self, task_id, at):
+        """ Record that Mesos told us about a task, and start watching it for
+        silence if we weren't already
+        """
+        with self._reconcile_lock:
+            watched = task_id in self._last_heard
+            self._last_heard[task_id] = at
+            self._tasks_to_reconcile.pop(task_id, None)
+            if watched:
+                # the task's entry in the heap is pushed back lazily
+                return
+
+            silent_from = at + self._task_reconciliation_delay
+            if (
+                not self._silence_deadlines or
+                silent_from < self._silence_deadlines[0][0]
+            ):
+                self._wakeup.set()
+            heapq.heappush(self._silence_deadlines, (silent_from, task_id))
+
+    def _forget_heard_from(self, task_id):
+        """ Stop watching a task for silence; its entry in the heap is
+        dropped lazily
+        """
+        with self._reconcile_lock:
+            self._last_heard.pop(task_id, None)
+            self._tasks_to_reconcile.pop(task_id, None)
+
+    def _reconcile_silent_tasks(self, time_now):
+        """ Queue the tasks that have been silent for too long, and send
+        the next batch of them to Mesos if it is due
+
+        :returns: the time at which this has to run next
+        """
+        with self._reconcile_lock:
+            while (
+                self._silence_deadlines and
+                self._silence_deadlines[0][0] <= time_now
+            ):
+                _, task_id = heapq.heappop(self._silence_deadlines)
+                md = self.task_metadata.get(task_id)
+                if md is None or md.task_state == 'TASK_INITED':
+                    # the task is done, or waiting for an offer again
+                    self._last_heard.pop(task_id, None)
+                    self._tasks_to_reconcile.pop(task_id, None)
+                    continue
+                if task_id not in self._last_heard:
+                    # no longer watched
+                    continue
 
-        log.info(f'Reconciling following tasks {tasks_to_reconcile}')
+                silent_from = self._last_heard[task_id] + self._task_reconciliation_delay
+                if silent_from > time_now:
+                    # heard from since the entry was pushed
+                    heapq.heappush(self._silence_deadlines, (silent_from, task_id))
+                    continue
 
-        if len(tasks_to_reconcile) > 0:
-            self.call_driver('reconcileTasks', tasks_to_reconcile)
+                self._tasks_to_reconcile[task_id] = None
+                # reconcile again if the task is still silent after that
+                heapq.heappush(self._silence_deadlines, (
+                    time_now + self._task_reconciliation_delay,
+                    task_id,
+                ))
+
+            batch = []
+            if self._tasks_to_reconcile and time_now >= self._next_reconcile_batch_at:
+                while self._tasks_to_reconcile and len(batch) < self.reconciliation_batch_size:
+                    batch.append(self._tasks_to_reconcile.popitem(last=False)[0])
+                self._next_reconcile_batch_at = time_now + (
+                    self.reconciliation_batch_interval_s *
+                    (1 + random.uniform(0, self.reconciliation_jitter))
+                )
+
+            next_run_at = min(
+                self._next_reconcile_batch_at if self._tasks_to_reconcile else float('inf'),
+                self._silence_deadlines[0][0] if self._silence_deadlines else float('inf'),
+            )
 
-        self._reconcile_tasks_at += self._task_reconciliation_delay
+        if batch:
+            self._reconcile_tasks(batch)
+        return next_run_at
 
     def offer_matches_pool(self, offer):
         if self.pool is None:
             # If pool is not specified, then we can accept offer from any agent
             return True, None
 
-        for attribute in offer.attributes:
-            if attribute.name == "pool":
-                return attribute.text.value == self.pool, attribute.text.value
+        for attribute in offer.get('attributes', ()):
+            if attribute['name'] == "pool":
+                return attribute['text']['value'] == self.pool, attribute['text']['value']
 
         return False, None
 
     def kill_task(self, task_id):
-        tmp_list = []
-        flag = False
+        return self.kill_tasks([task_id])[task_id]
+
+    def kill_tasks(self, task_ids):
+        """ Kill many tasks at once
+
+        Tasks still waiting for an offer are removed from the task queue in a
+        single pass under the lock; a kill request is sent to Mesos for each
+        of the others. Killing a task of a gang that hasn't launched yet
+        removes the whole gang, and a terminal event is emitted for each of
+        the other tasks of the gang that weren't killed too.
+
+        :param task_ids: the ids of the tasks to kill
+        :returns: a mapping of task_id -> whether the kill succeeded, which
+            also includes the other tasks of any gang that was removed
+        """
+        results = {}
+        killed = set(task_ids)
         with self._lock:
-            while not self.task_queue.empty():
-                t = self.task_queue.get()
-                if task_id == t.task_id:
-                    flag = True
-                    self.task_metadata = self.task_metadata.discard(task_id)
-                else:
-                    tmp_list.append(t)
-
-            for t in tmp_list:
-                self.task_queue.put(t)
-
-        if flag is False:
-            if self.call_driver('killTask', Dict(value=task_id)) is self.driver_error:
-                return False
-
-        return True
+            for task_id in task_ids:
+                gang_id = self._task_gangs.get(task_id)
+                if gang_id is not None:
+                    # gangs launch all or nothing, so the rest of the gang
+                    # can't launch without this task either
+                    log.info(f'Giving up on gang {gang_id}: {task_id} was killed')
+                    for member in self._remove_gang(gang_id):
+                        self.task_metadata.pop(member.task_id)
+                        results[member.task_id] = True
+                        if member.task_id not in killed:
+                            self.event_queue.put(trusted_task_event(
+                                task_id=member.task_id,
+                                terminal=True,
+                                timestamp=time.time(),
+                                success=False,
+                                message='stop',
+                                task_config=member,
+                                raw=f'Failed because {task_id} of gang '
+                                    f'{gang_id} was killed',
+                            ))
+                elif self.task_queue.remove(task_id) is not None:
+                    self.task_metadata.pop(task_id)
+                    results[task_id] = True
+
+        # With asynchronous driver calls the kills are only queued, behind
+        # the calls made before them, and reported as successful
+        for task_id in task_ids:
+            if task_id not in results:
+                results[task_id] = self._send_driver_call(
+                    'killTask', self._dict_cls(value=task_id))
+
+        return results
 
     def blacklist_slave(self, agent_id, timeout):
+        expires_at = time.time() + timeout
         with self._lock:
-            # A new entry is appended even if the agent is being blacklisted.
-            # This is equivalent to restarting the blacklist timer.
-            log.info(f'Blacklisting slave: {agent_id} for {timeout} seconds.')
-            self.blacklisted_slaves = self.blacklisted_slaves.append(agent_id)
-            get_metric(metrics.BLACKLISTED_AGENTS_COUNT).count(1)
-
-        unblacklist_thread = threading.Thread(
-            target=self.unblacklist_slave,
-            kwargs={'timeout': timeout, 'agent_id': agent_id},
-        )
-        unblacklist_thread.daemon = True
-        unblacklist_thread.start()
+            current_expiry = self.blacklisted_slaves.get(agent_id)
+            # Blacklisting an agent again restarts its timer, but never
+            # shortens an existing blacklist.
+            if current_expiry is not None and current_expiry >= expires_at:
+                return
 
-    def unblacklist_slave(self, agent_id, timeout):
-        time.sleep(timeout)
+            if current_expiry is None:
+                log.info(f'Blacklisting slave: {agent_id} for {timeout} seconds.')
+                get_metric(metrics.BLACKLISTED_AGENTS_COUNT).count(1)
+            self.blacklisted_slaves[agent_id] = expires_at
+
+            if not self._blacklist_expiries or expires_at < self._blacklist_expiries[0][0]:
+                self._wakeup.set()
+            heapq.heappush(self._blacklist_expiries, (expires_at, agent_id))
+
+    def unblacklist_slave(self, agent_id):
         log.info(
             f'Unblacklisting slave: {agent_id}'
         )
         with self._lock:
-            self.blacklisted_slaves = self.blacklisted_slaves.remove(agent_id)
+            self.blacklisted_slaves.pop(agent_id, None)
+
+    def is_slave_blacklisted(self, agent_id):
+        expires_at = self.blacklisted_slaves.get(agent_id)
+        return expires_at is not None and expires_at > time.time()
+
+    def get_blacklisted_slaves(self):
+        """ Get the currently blacklisted agents
+
+        :returns: a mapping of agent_id -> time the blacklist expires at
+        """
+        time_now = time.time()
+        with self._lock:
+            return {
+                agent_id: expires_at
+                for agent_id, expires_at in self.blacklisted_slaves.items()
+                if expires_at > time_now
+            }
+
+    def _reap_blacklisted_slaves(self, time_now):
+        while self._blacklist_expiries and self._blacklist_expiries[0][0] <= time_now:
+            expires_at, agent_id = heapq.heappop(self._blacklist_expiries)
+            # The entry is stale if the agent has been blacklisted again
+            if self.blacklisted_slaves.get(agent_id) == expires_at:
+                self.unblacklist_slave(agent_id)
 
     def enqueue_task(self, task_config):
         with self._lock:
             # task_state and task_state_history get reset every time
             # a task is enqueued.
-            self.task_metadata = self.task_metadata.set(
+            self._update_task_metadata(
                 task_config.task_id,
                 TaskMetadata(
                     task_config=task_config,
                     task_state='TASK_INITED',
-                    task_state_history=m(TASK_INITED=time.time()),
+                    task_state_history={'TASK_INITED': time.time()},
                 )
             )
             # Need to lock on task_queue to prevent enqueues when getting
             # tasks to launch
             self.task_queue.put(task_config)
 
-            if self.are_offers_suppressed:
-                if self.call_driver('reviveOffers') is not self.driver_error:
-                    self.are_offers_suppressed = False
-                    log.info('Reviving offers because we have tasks to run.')
+            if not self._match_held_offers_soon():
+                self._revive_offers_if_pending()
 
         get_metric(metrics.TASK_ENQUEUED_COUNT).count(1)
 
+    def enqueue_gang(self, task_configs):
+        """ Enqueue tasks that have to run together
+
+        None of the tasks is launched until the offers at hand can fit all
+        of them, and then they are all launched at once. In the meantime,
+        offers that aren't used are held for up to `gang_hold_s` so that
+        they can add up with the offers that come after them; gangs larger
+        than `max_held_offers` offers may need that raised.
+
+        The gang gives up as a whole: when a task of the gang is killed or
+        runs out of offer_timeout, the others go with it. Once launched,
+        the tasks are independent; a task that fails to launch is retried
+        on its own.
+
+        :raises ValueError: if a task is given twice, or is already waiting
+            to launch
+        """
+        task_configs = list(task_configs)
+        if not task_configs:
+            return
+
+        task_ids = [task_config.task_id for task_config in task_configs]
+        with self._lock:
+            if len(set(task_ids)) != len(task_ids) or any(
+                task_id in self.task_queue or task_id in self._task_gangs
+                for task_id in task_ids
+            ):
+                raise ValueError(f'tasks are already pending: {task_ids}')
+
+            enqueue_time = time.time()
+            for task_config in task_configs:
+                self._update_task_metadata(
+                    task_config.task_id,
+                    TaskMetadata(
+                        task_config=task_config,
+                        task_state='TASK_INITED',
+                        task_state_history={'TASK_INITED': enqueue_time},
+                    )
+                )
+            gang_id = task_ids[0]
+            self._gangs[gang_id] = task_configs
+            for task_id in task_ids:
+                self._task_gangs[task_id] = gang_id
+
+            if not self._match_held_offers_soon():
+                self._revive_offers_if_pending()
+
+        get_metric(metrics.TASK_ENQUEUED_COUNT).count(len(task_configs))
+
+    def _remove_gang(self, gang_id):
+        """ Must be called with `self._lock` held
+
+        :returns: the tasks of the gang
+        """
+        task_configs = self._gangs.pop(gang_id)
+        for task_config in task_configs:
+            del self._task_gangs[task_config.task_id]
+        return task_configs
+
+    def _nothing_pending(self):
+        return self.task_queue.empty() and not self._gangs
+
+    def _revive_offers_if_pending(self):
+        """ Must be called with `self._lock` held """
+        if self.are_offers_suppressed and not self._nothing_pending():
+            if self._send_driver_call('reviveOffers', on_error=self._revive_failed):
+                self.are_offers_suppressed = False
+                log.info('Reviving offers because we have tasks to run.')
+
+    def _revive_failed(self):
+        # revive again the next time tasks are pending
+        with self._lock:
+            self.are_offers_suppressed = True
+
+    def _suppress_failed(self):
+        with self._lock:
+            self.are_offers_suppressed = False
+
+    def _match_held_offers_soon(self):
+        """ Have the background thread match the held offers to the
+        pending tasks, and revive offers if some are still pending then.
+
+        Must be called with `self._lock` held.
+
+        :returns: whether there were held offers to match
+        """
+        if not self._held_offers:
+            return False
+        self._match_held_offers = True
+        self._wakeup.set()
+        return True
+
     def launch_tasks_for_offer(self, offer, tasks_to_launch) -> bool:
         mesos_protobuf_tasks = [
             self.callbacks.make_mesos_protobuf(
-                task_config, offer.agent_id.value, self.role)
+                task_config, offer['agent_id']['value'], self.role)
             for task_config in tasks_to_launch
             if task_config.task_id in self.task_metadata
         ]
@@ -363,11 +811,19 @@ class ExecutionFramework(Scheduler):
 
         launched = True
         launch_time = time.time()
-        if self.call_driver('launchTasks', offer.id, mesos_protobuf_tasks) is self.driver_error:
-            tasks = ', '.join(task.task_id for task in tasks_to_launch)
-            log.warning(
-                f'Failed to launch: {tasks}, moving them to UNKNOWN state')
-            get_metric(metrics.TASK_LAUNCH_FAILED_COUNT).count(1)
+        if self._driver_calls is not None:
+            # assume the launch works, and move the tasks to UNKNOWN if the
+            # sender finds out that it didn't
+            self._driver_calls.put(
+                'launchTasks',
+                offer['id'],
+                mesos_protobuf_tasks,
+                on_error=lambda: self._launch_failed(tasks_to_launch, 'TASK_STAGING'),
+            )
+        elif self.call_driver(
+            'launchTasks', offer['id'], mesos_protobuf_tasks,
+        ) is self.driver_error:
+            self._launch_failed(tasks_to_launch)
             launched = False
 
         # 'UNKNOWN' state is for internal tracking. It will not be
@@ -375,22 +831,20 @@ class ExecutionFramework(Scheduler):
         current_task_state = 'TASK_STAGING' if launched else 'UNKNOWN'
 
         for task in tasks_to_launch:
-            md = self.task_metadata.get(task.task_id)
+            md = self._transition_task(
+                task.task_id,
+                current_task_state,
+                launch_time,
+                agent_id=str(offer['agent_id']['value']),
+            )
+            if md and launched:
+                self._heard_from(task.task_id, launch_time)
             if not md:
                 log.warning(
                     f'trying to launch task {task.task_id}, but it is not in task metadata.'
                     f'current keys in task_metadata: {self.task_metadata.keys()}'
                 )
                 continue
-            self.task_metadata = self.task_metadata.set(
-                task.task_id,
-                md.set(
-                    task_state=current_task_state,
-                    task_state_history=md.task_state_history.set(
-                        current_task_state, launch_time),
-                    agent_id=str(offer.agent_id.value),
-                )
-            )
 
             get_metric(metrics.TASK_QUEUED_TIME_TIMER).record(
                 launch_time - md.task_state_history['TASK_INITED']
@@ -400,7 +854,7 @@ class ExecutionFramework(Scheduler):
             if launched:
                 self.event_queue.put(
                     self.callbacks.handle_status_update(
-                        Dict(state='TASK_STAGING', offer=offer),
+                        self._dict_cls(state='TASK_STAGING', offer=offer),
                         md.task_config,
                     )
                 )
@@ -408,8 +862,373 @@ class ExecutionFramework(Scheduler):
 
         return launched
 
+    def _launch_failed(self, tasks, expected_state=None):
+        task_ids = ', '.join(task.task_id for task in tasks)
+        log.warning(
+            f'Failed to launch: {task_ids}, moving them to UNKNOWN state')
+        get_metric(metrics.TASK_LAUNCH_FAILED_COUNT).count(1)
+        if expected_state is not None:
+            for task in tasks:
+                md = self._transition_task(
+                    task.task_id,
+                    'UNKNOWN',
+                    expected_state=expected_state,
+                )
+                if md is None:
+                    continue
+                # The staging event has already gone out, so take it back:
+                # Mesos never heard of the task, which is re-enqueued once
+                # it has been UNKNOWN for task_staging_timeout_s
+                self._forget_heard_from(task.task_id)
+                self.event_queue.put(
+                    self.callbacks.handle_status_update(
+                        self._dict_cls(
+                            state='TASK_UNKNOWN',
+                            message='Failed to send the launch to Mesos',
+                        ),
+                        md.task_config,
+                    )
+                )
+
+    def _match_offers_greedily(self, eligible_offers):
+        """ Match one offer at a time: each offer takes whatever pending
+        tasks fit it, as decided by the `get_tasks_for_offer` callback.
+
+        Must be called with `self._lock` held.
+
+        :returns: the tasks to launch for each offer, or None for the offers
+            there were no pending tasks left for
+        """
+        tasks_per_offer = []
+        for offer, offer_resources, offer_attributes in eligible_offers:
+            if self.task_queue.empty():
+                tasks_per_offer.append(None)
+                continue
+
+            log.info(
+                f'Received offer {offer["id"]["value"]} for role {self.role}: {offer_resources}')
+            # Only tasks whose shape fits the offer are handed to the
+            # callback; everything else stays where it is in the queue.
+            tasks_to_launch = _tasks_to_launch(
+                'get_tasks_for_offer',
+                self.callbacks.get_tasks_for_offer(
+                    self.task_queue.candidates(offer_resources),
+                    offer_resources,
+                    offer_attributes,
+                    self.role,
+                ),
+            )
+
+            for task in tasks_to_launch:
+                self.task_queue.remove(task.task_id)
+            get_metric(metrics.TASK_INSUFFICIENT_OFFER_COUNT).count(len(self.task_queue))
+            tasks_per_offer.append(tasks_to_launch)
+        return tasks_per_offer
+
+    def _match_offers_globally(self, eligible_offers):
+        """ Match the whole batch of offers against the pending tasks at
+        once, with the `get_tasks_for_offers` callback.
+
+        Must be called with `self._lock` held.
+
+        :returns: the tasks to launch for each offer, or None for every offer
+            if there were no pending tasks
+        """
+        if self.task_queue.empty() or not eligible_offers:
+            return [None] * len(eligible_offers)
+
+        for offer, offer_resources, _ in eligible_offers:
+            log.info(
+                f'Received offer {offer["id"]["value"]} for role {self.role}: {offer_resources}')
+
+        tasks_per_offer = _tasks_to_launch(
+            'get_tasks_for_offers',
+            self.callbacks.get_tasks_for_offers(
+                self.task_queue.candidates(largest_resources(
+                    offer_resources for _, offer_resources, _ in eligible_offers
+                )),
+                [
+                    (offer_resources, offer_attributes)
+                    for _, offer_resources, offer_attributes in eligible_offers
+                ],
+                self.role,
+            ),
+        )
+
+        for tasks_to_launch in tasks_per_offer:
+            for task in tasks_to_launch:
+                self.task_queue.remove(task.task_id)
+        get_metric(metrics.TASK_INSUFFICIENT_OFFER_COUNT).count(len(self.task_queue))
+        return tasks_per_offer
+
+    def _launch_tasks_on_offer(
+        self,
+        offer,
+        tasks_to_launch,
+        declined,
+        declined_offer_ids,
+        accepted,
+    ):
+        """ :returns: the tasks that were launched """
+        ignored_tasks = ','.join(
+            task_config.task_id
+            for task_config in tasks_to_launch
+            if task_config.task_id not in self.task_metadata
+        )
+        if ignored_tasks:
+            log.warning(
+                f'ignoring tasks not in metadata: {ignored_tasks}')
+
+        tasks_to_launch = [
+            task_config
+            for task_config in tasks_to_launch
+            if task_config.task_id in self.task_metadata
+        ]
+
+        if len(tasks_to_launch) == 0:
+            declined['nothing to launch'].append(offer['id']['value'])
+            declined_offer_ids.append(offer['id'])
+        elif not self.launch_tasks_for_offer(offer, tasks_to_launch):
+            declined['launch failed'].append(offer['id']['value'])
+            declined_offer_ids.append(offer['id'])
+        else:
+            accepted.append(
+                f'offer: {offer["id"]["value"]} '
+                f'agent: {offer["agent_id"]["value"]} '
+                f'tasks: {len(tasks_to_launch)}'
+            )
+            return tasks_to_launch
+        return []
+
+    def _record_offer_cycle_metrics(self, eligible_offers, launched_tasks):
+        if not eligible_offers:
+            return
+
+        get_metric(metrics.OFFER_CYCLE_TASKS_LAUNCHED).set(len(launched_tasks))
+        for resource, metric in (
+            ('cpus', metrics.OFFER_CYCLE_CPUS_UTILIZATION),
+            ('mem', metrics.OFFER_CYCLE_MEM_UTILIZATION),
+        ):
+            offered = sum(
+                getattr(offer_resources, resource)
+                for _, offer_resources, _ in eligible_offers
+            )
+            if offered > 0:
+                used = sum(getattr(task, resource) for task in launched_tasks)
+                get_metric(metric).set(used / offered)
+
+    def _place_gang(self, task_configs, eligible_offers):
+        """ Find offers for every task of a gang, with the same callbacks as
+        single tasks
+
+        Must be called with `self._lock` held.
+
+        :returns: the tasks to launch for each offer, or None if the gang
+            doesn't fit
+        """
+        if self.global_offer_matching:
+            tasks_per_offer = _tasks_to_launch(
+                'get_tasks_for_offers',
+                self.callbacks.get_tasks_for_offers(
+                    task_configs,
+                    [
+                        (offer_resources, offer_attributes)
+                        for _, offer_resources, offer_attributes in eligible_offers
+                    ],
+                    self.role,
+                ),
+            )
+            num_placed = sum(len(tasks) for tasks in tasks_per_offer)
+            return tasks_per_offer if num_placed == len(task_configs) else None
+
+        tasks_per_offer = []
+        tasks_left = task_configs
+        for _, offer_resources, offer_attributes in eligible_offers:
+            if not tasks_left:
+                tasks_per_offer.append([])
+                continue
+            tasks_to_launch = _tasks_to_launch(
+                'get_tasks_for_offer',
+                self.callbacks.get_tasks_for_offer(
+                    tasks_left,
+                    offer_resources,
+                    offer_attributes,
+                    self.role,
+                ),
+            )
+            launched = {task_config.task_id for task_config in tasks_to_launch}
+            tasks_left = [
+                task_config
+                for task_config in tasks_left
+                if task_config.task_id not in launched
+            ]
+            tasks_per_offer.append(tasks_to_launch)
+        return None if tasks_left else tasks_per_offer
+
+    def _match_gangs(self, eligible_offers, declined, declined_offer_ids, accepted):
+        """ Launch the pending gangs that fit the offers, oldest first.
+
+        Must be called with `self._lock` held.
+
+        :returns: the tasks that were launched, and the offers that weren't
+            used
+        """
+        launched_tasks = []
+        for gang_id, task_configs in list(self._gangs.items()):
+            if not eligible_offers:
+                break
+            tasks_per_offer = self._place_gang(task_configs, eligible_offers)
+            if tasks_per_offer is None:
+                continue
+
+            log.info(f'Launching gang {gang_id} of {len(task_configs)} tasks')
+            self._remove_gang(gang_id)
+            unused_offers = []
+            for eligible_offer, tasks_to_launch in zip(eligible_offers, tasks_per_offer):
+                if tasks_to_launch:
+                    launched_tasks.extend(self._launch_tasks_on_offer(
+                        eligible_offer[0],
+                        tasks_to_launch,
+                        declined,
+                        declined_offer_ids,
+                        accepted,
+                    ))
+                else:
+                    unused_offers.append(eligible_offer)
+            eligible_offers = unused_offers
+        return launched_tasks, eligible_offers
+
+    def _match_and_launch(self, eligible_offers, declined, declined_offer_ids, accepted):
+        """ Match pending gangs, then pending tasks, to offers and launch them.
+
+        Must be called with `self._lock` held.
+
+        :returns: the tasks that were launched, and a (reason, offer) pair for
+            every offer that no task was matched to
+        """
+        launched_tasks, eligible_offers = self._match_gangs(
+            eligible_offers,
+            declined,
+            declined_offer_ids,
+            accepted,
+        )
+        if self.global_offer_matching:
+            tasks_per_offer = self._match_offers_globally(eligible_offers)
+        else:
+            tasks_per_offer = self._match_offers_greedily(eligible_offers)
+
+        unused_offers = []
+        for eligible_offer, tasks_to_launch in zip(eligible_offers, tasks_per_offer):
+            if tasks_to_launch is None:
+                unused_offers.append(('no tasks', eligible_offer))
+            elif len(tasks_to_launch) == 0:
+                unused_offers.append(('bad resources', eligible_offer))
+            else:
+                launched_tasks.extend(self._launch_tasks_on_offer(
+                    eligible_offer[0],
+                    tasks_to_launch,
+                    declined,
+                    declined_offer_ids,
+                    accepted,
+                ))
+        return launched_tasks, unused_offers
+
+    def _hold_offer(self, eligible_offer, held_until):
+        """ Keep an unused offer around for tasks that are enqueued later.
+
+        Must be called with `self._lock` held.
+
+        :returns: whether the offer is held, if not it has to be declined
+        """
+        if (
+            held_until <= time.time() or
+            len(self._held_offers) >= self.max_held_offers
+        ):
+            return False
+
+        if not self._held_offers:
+            # this is now the earliest expiry
+            self._wakeup.set()
+        offer = eligible_offer[0]
+        self._held_offers[offer['id']['value']] = (eligible_offer, held_until)
+        return True
+
+    def _take_held_offers(self, declined, declined_offer_ids):
+        """ Empty the held offer pool, dropping the offers of agents that
+        have been blacklisted since.
+
+        Must be called with `self._lock` held.
+
+        :returns: the held offers, and offer_id -> how long it was held for
+        """
+        held_offers = list(self._held_offers.values())
+        self._held_offers.clear()
+        held_until = {}
+        eligible_offers = []
+        for eligible_offer, offer_held_until in held_offers:
+            offer = eligible_offer[0]
+            if self.is_slave_blacklisted(offer['agent_id']['value']):
+                declined['blacklisted'].append(
+                    f'offer {offer["id"]["value"]} agent {offer["agent_id"]["value"]}'
+                )
+                declined_offer_ids.append(offer['id'])
+                continue
+            held_until[offer['id']['value']] = offer_held_until
+            eligible_offers.append(eligible_offer)
+        return eligible_offers, held_until
+
+    def _launch_tasks_on_held_offers(self):
+        """ Must be called with `self._lock` held """
+        if not self._held_offers or self._nothing_pending():
+            return
+
+        declined: dict = defaultdict(list)
+        declined_offer_ids = []
+        accepted: List[str] = []
+
+        eligible_offers, held_until = self._take_held_offers(declined, declined_offer_ids)
+        _, unused_offers = self._match_and_launch(
+            eligible_offers,
+            declined,
+            declined_offer_ids,
+            accepted,
+        )
+        for reason, eligible_offer in unused_offers:
+            offer = eligible_offer[0]
+            if not self._hold_offer(eligible_offer, held_until[offer['id']['value']]):
+                declined[reason].append(offer['id']['value'])
+                declined_offer_ids.append(offer['id'])
+
+        self._decline_offers(declined, declined_offer_ids, accepted)
+
+    def _release_held_offers(self, time_now):
+        """ Decline every held offer whose hold has expired.
+
+        Must be called with `self._lock` held.
+        """
+        declined: dict = defaultdict(list)
+        declined_offer_ids = []
+        for offer_id, (eligible_offer, held_until) in list(self._held_offers.items()):
+            if held_until <= time_now:
+                del self._held_offers[offer_id]
+                declined['held for too long'].append(offer_id)
+                declined_offer_ids.append(eligible_offer[0]['id'])
+
+        self._decline_offers(declined, declined_offer_ids, [])
+
+    def _decline_offers(self, declined, declined_offer_ids, accepted):
+        if len(declined_offer_ids) > 0:
+            self._decline_offer_ids(declined_offer_ids)
+        for reason, items in declined.items():
+            log.info(f"Offers declined because {reason}: {', '.join(items)}")
+        if accepted:
+            log.info(f"Offers accepted: {', '.join(accepted)}")
+
     def stop(self):
         self.stopping = True
+        self._wakeup.set()
+        if self._driver_calls is not None:
+            self._driver_calls.stop()
 
     # TODO: add mesos cluster dimension when available
     def _initialize_metrics(self):
@@ -438,12 +1257,26 @@ class ExecutionFramework(Scheduler):
         for tmr in timers:
             create_timer(tmr, default_dimensions)
 
+        gauges = [
+            metrics.OFFER_CYCLE_TASKS_LAUNCHED,
+            metrics.OFFER_CYCLE_CPUS_UTILIZATION,
+            metrics.OFFER_CYCLE_MEM_UTILIZATION,
+        ]
+        for gauge in gauges:
+            create_gauge(gauge, default_dimensions)
+
     ####################################################################
     #                   Mesos driver hooks go here                     #
     ####################################################################
     def offerRescinded(self, driver, offerId):
-        # TODO(sagarp): Executor should be able to deal with this.
-        log.warning(f'Offer {offerId} rescinded')
+        # Forget the offer if we are holding it, so no task is launched on it
+        # and lost with REASON_INVALID_OFFERS.
+        with self._lock:
+            held_offer = self._held_offers.pop(offerId['value'], None)
+        if held_offer is not None:
+            log.info(f'Held offer {offerId["value"]} rescinded')
+        else:
+            log.warning(f'Offer {offerId} rescinded')
 
     def error(self, driver, message):
         event = control_event(raw=message)
@@ -470,7 +1303,7 @@ class ExecutionFramework(Scheduler):
         )
         self.event_queue.put(event)
         log.info(
-            f"Registered with framework ID {frameworkId.value} and role {self.role}"
+            f"Registered with framework ID {frameworkId['value']} and role {self.role}"
         )
 
     def reregistered(self, driver, masterInfo):
@@ -487,161 +1320,134 @@ class ExecutionFramework(Scheduler):
             )
         self._last_offer_time = current_offer_time
 
-        # Give user some time to enqueue tasks
-        if self.task_queue.empty() and current_offer_time < self.decline_after:
-            time.sleep(self.decline_after - current_offer_time)
-
         declined: dict = defaultdict(list)
         declined_offer_ids = []
-        accepted = []
+        accepted: List[str] = []
 
+        hold_until = current_offer_time + self.offer_hold_s
         with self._lock:
-            if self.task_queue.empty():
-                # Always suppress offers when there is nothing to run
-                if self.call_driver('suppressOffers') is not self.driver_error:
+            if self._nothing_pending():
+                if current_offer_time < self.decline_after:
+                    # Give user some time to enqueue tasks, by holding on to
+                    # the offers until then rather than declining them
+                    hold_until = max(hold_until, self.decline_after)
+                elif self._send_driver_call(
+                    'suppressOffers', on_error=self._suppress_failed,
+                ):
+                    # Always suppress offers when there is nothing to run
                     self.are_offers_suppressed = True
                     log.info("Suppressing offers, no more tasks to run.")
 
+            # When holding offers, the offers we have now are kept for the
+            # tasks to come instead of being declined
+            if self._nothing_pending() and hold_until <= current_offer_time:
                 for offer in offers:
-                    declined['no tasks'].append(offer.id.value)
-                    declined_offer_ids.append(offer.id)
+                    declined['no tasks'].append(offer['id']['value'])
+                    declined_offer_ids.append(offer['id'])
 
-                self.call_driver(
-                    'declineOffer', declined_offer_ids, self.offer_decline_filter)
+                self._decline_offer_ids(declined_offer_ids)
                 log.info(
                     f"Offers declined because of no tasks: {','.join(declined['no tasks'])}")
                 return
 
         with_maintenance_window = [
-            offer for offer in offers if offer.unavailability
+            offer for offer in offers if offer.get('unavailability')
         ]
 
         for offer in with_maintenance_window:
-            start_time = offer.unavailability.start['nanoseconds']
+            unavailability = offer['unavailability']
+            start_time = unavailability['start']['nanoseconds']
             completion_time = int(
-                (start_time + offer.unavailability.duration['nanoseconds'])
+                (start_time + unavailability['duration']['nanoseconds'])
                 / 1000000000
             )
             now = int(time.time())
             duration = completion_time - now
             if duration > 0:
                 self.blacklist_slave(
-                    agent_id=offer.agent_id.value,
+                    agent_id=offer['agent_id']['value'],
                     timeout=duration,
                 )
 
         without_maintenance_window = [
             offer for offer in offers if offer not in with_maintenance_window
         ]
+        eligible_offers = []
         for offer in without_maintenance_window:
-            with self._lock:
-                if offer.agent_id.value in self.blacklisted_slaves:
-                    declined['blacklisted'].append(
-                        f'offer {offer.id.value} agent {offer.agent_id.value}'
-                    )
-                    declined_offer_ids.append(offer.id)
-                    continue
+            if self.is_slave_blacklisted(offer['agent_id']['value']):
+                declined['blacklisted'].append(
+                    f'offer {offer["id"]["value"]} agent {offer["agent_id"]["value"]}'
+                )
+                declined_offer_ids.append(offer['id'])
+                continue
 
             offer_pool_match, offer_pool = self.offer_matches_pool(offer)
             if not offer_pool_match:
                 log.info(
-                    f"Declining offer {offer.id.value}, required pool "
+                    f"Declining offer {offer['id']['value']}, required pool "
                     f"{self.pool} doesn't match offered pool {offer_pool}"
                 )
-                declined['bad pool'].append(offer.id.value)
-                declined_offer_ids.append(offer.id)
+                declined['bad pool'].append(offer['id']['value'])
+                declined_offer_ids.append(offer['id'])
                 continue
 
-            # Need to lock here even though we are only reading the task_queue, since
-            # we are predicating on the queue's emptiness. If not locked, other
-            # threads can continue enqueueing, and we never terminate the loop.
-            task_configs = []
-            with self._lock:
-                while not self.task_queue.empty():
-                    task_configs.append(self.task_queue.get())
-
-                offer_resources = get_offer_resources(offer, self.role)
-                offer_attributes = {
-                    attribute.name: attribute.text.value
-                    for attribute in offer.attributes
-                }
-                log.info(
-                    f'Received offer {offer.id.value} for role {self.role}: {offer_resources}')
-                tasks_to_launch, tasks_to_defer = self.callbacks.get_tasks_for_offer(
-                    task_configs,
-                    offer_resources,
-                    offer_attributes,
-                    self.role,
-                )
-
-                for task in tasks_to_defer:
-                    self.task_queue.put(task)
-                get_metric(metrics.TASK_INSUFFICIENT_OFFER_COUNT).count(len(tasks_to_defer))
-
-                if len(tasks_to_launch) == 0:
-                    declined['bad resources'].append(offer.id.value)
-                    declined_offer_ids.append(offer.id)
-                    continue
-
-                ignored_tasks = ','.join(
-                    task_config.task_id
-                    for task_config in tasks_to_launch
-                    if task_config.task_id not in self.task_metadata
-                )
-                if ignored_tasks:
-                    log.warning(
-                        f'ignoring tasks not in metadata: {ignored_tasks}')
-
-                tasks_to_launch = [
-                    task_config
-                    for task_config in tasks_to_launch
-                    if task_config.task_id in self.task_metadata
-                ]
-
-                if len(tasks_to_launch) == 0:
-                    declined['nothing to launch'].append(offer.id.value)
-                    declined_offer_ids.append(offer.id)
-                elif not self.launch_tasks_for_offer(offer, tasks_to_launch):
-                    declined['launch failed'].append(offer.id.value)
-                    declined_offer_ids.append(offer.id)
-                else:
-                    accepted.append(
-                        f'offer: {offer.id.value} '
-                        f'agent: {offer.agent_id.value} '
-                        f'tasks: {len(tasks_to_launch)}'
-                    )
+            eligible_offers.append((
+                offer,
+                get_offer_resources(offer, self.role, self.use_unreserved_resources),
+                {
+                    attribute['name']: attribute['text']['value']
+                    for attribute in offer.get('attributes', ())
+                },
+            ))
 
-        if len(declined_offer_ids) > 0:
-            self.call_driver(
-                'declineOffer', declined_offer_ids, self.offer_decline_filter
+        with self._lock:
+            held_until: dict = {}
+            if self._gangs and self._held_offers:
+                # a gang may only fit the held offers and these together
+                held_offers, held_until = self._take_held_offers(
+                    declined, declined_offer_ids)
+                eligible_offers = held_offers + eligible_offers
+            launched_tasks, unused_offers = self._match_and_launch(
+                eligible_offers,
+                declined,
+                declined_offer_ids,
+                accepted,
             )
-        for reason, items in declined.items():
-            log.info(f"Offers declined because {reason}: {', '.join(items)}")
-        if accepted:
-            log.info(f"Offers accepted: {', '.join(accepted)}")
+            if self._gangs:
+                hold_until = max(hold_until, current_offer_time + self.gang_hold_s)
+            for reason, eligible_offer in unused_offers:
+                offer = eligible_offer[0]
+                if not self._hold_offer(
+                    eligible_offer,
+                    held_until.get(offer['id']['value'], hold_until),
+                ):
+                    declined[reason].append(offer['id']['value'])
+                    declined_offer_ids.append(offer['id'])
+
+        self._record_offer_cycle_metrics(eligible_offers, launched_tasks)
+        self._decline_offers(declined, declined_offer_ids, accepted)
 
     def statusUpdate(self, driver, update) -> None:
         self._driver = driver
 
-        task_id = update.task_id.value
-        task_state = str(update.state)
+        task_id = update['task_id']['value']
+        task_state = str(update['state'])
         log.info(f"Task update {task_state} received for task {task_id}")
 
-        if task_id not in self.task_metadata:
+        md = self.task_metadata.get(task_id)
+        if md is None:
             # We assume that a terminal status update has been
             # received for this task already.
             log.info('Ignoring this status update because a terminal status '
                      'update has been received for this task already.')
-            self.call_driver('acknowledgeStatusUpdate', update)
+            self._acknowledge(update)
             return
 
-        md = self.task_metadata[task_id]
-
         # If we attempt to accept an offer that has been invalidated by
         # master for some reason such as offer has been rescinded or we
         # have exceeded offer_timeout, then we will get TASK_LOST status
         # update back from mesos master.
-        if task_state == 'TASK_LOST' and str(update.reason) == \
+        if task_state == 'TASK_LOST' and str(update.get('reason')) == \
                 'REASON_INVALID_OFFERS':
             # This task has not been launched. Therefore, we are going to
             # reenqueue it. We are not propogating any event up to the
@@ -652,31 +1458,28 @@ class ExecutionFramework(Scheduler):
             # Re-enqueue task
             self.enqueue_task(md.task_config)
             get_metric(metrics.TASK_LOST_DUE_TO_INVALID_OFFER_COUNT).count(1)
-            self.call_driver('acknowledgeStatusUpdate', update)
+            self._acknowledge(update)
             return
 
+        terminal = task_state in self._terminal_task_counts
+        if not terminal:
+            self._heard_from(task_id, time.time())
+
         # Record state changes, send a new event and emit metrics only if the
         # task state has actually changed.
         if md.task_state != task_state:
-            with self._lock:
-                self.task_metadata = self.task_metadata.set(
-                    task_id,
-                    md.set(
-                        task_state=task_state,
-                        task_state_history=md.task_state_history.set(
-                            task_state, time.time()),
-                    )
-                )
+            if terminal:
+                self.task_metadata.pop(task_id)
+            else:
+                self._transition_task(task_id, task_state)
 
             self.event_queue.put(
                 self.callbacks.handle_status_update(update, md.task_config),
             )
 
-            if task_state in self._terminal_task_counts:
-                with self._lock:
-                    self.task_metadata = self.task_metadata.discard(task_id)
+            if terminal:
                 get_metric(self._terminal_task_counts[task_state]).count(1)
 
         # We have to do this because we are not using implicit
         # acknowledgements.
-        self.call_driver('acknowledgeStatusUpdate', update)
+        self._acknowledge(update)
@@ -15,6 +15,8 @@ from pyrsistent import PRecord
 from pyrsistent import v
 
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.plugins.mesos.event_pipeline import pump_events
+from task_processing.plugins.mesos.event_pipeline import wake_pump
 
 
 log = logging.getLogger(__name__)
@@ -166,52 +168,54 @@ class MesosLoggingExecutor(TaskExecutor):
 
     # process downstream events
     def event_loop(self):
-        while True:
-            while not self.src_queue.empty():
-                e = self.src_queue.get()
-                self.dest_queue.put(e)
-                self.src_queue.task_done()
-
-                # Record the base log url
-                if e.kind == 'task' and e.platform_type == 'staging':
-                    if e.task_id in self.staging_tasks:
-                        continue
-                    url = extract_url_from_offer(e.raw.offer)
-                    self.staging_tasks = self.staging_tasks.set(e.task_id, url)
-
-                if e.kind == 'task' and e.platform_type == 'running':
-                    if e.task_id not in self.staging_tasks:
-                        log.info(
-                            f"Task {e.task_id} already running, not fetching logs")
-                        continue
-
-                    url = self.staging_tasks[e.task_id]
-                    self.staging_tasks = self.staging_tasks.discard(e.task_id)
-
-                    # Simply pass the needed fields and let the logging thread
-                    # to take care of the slow path discovery.
-                    container_id = e.raw.container_status.container_id.value
-                    executor_id = e.raw.executor_id.value
-                    with self.task_lock:
-                        self.running_tasks = self.running_tasks.set(
-                            e.task_id,
-                            LogMetadata(
-                                log_url=url,
-                                container_id=container_id,
-                                executor_id=executor_id
-                            )
-                        )
+        pump_events(self.src_queue, self.handle_event, lambda: self.stopping)
 
-                # Fetch the last log and remove the entry if the task is active
-                if e.kind == 'task' and e.terminal:
-                    with self.task_lock:
-                        if e.task_id in self.running_tasks:
-                            self.done_tasks = self.done_tasks.append(e.task_id)
+    def handle_event(self, e):
+        self.dest_queue.put(e)
+        self.src_queue.task_done()
 
-            if self.stopping:
+        # Record the base log url
+        if e.kind == 'task' and e.platform_type == 'staging':
+            if e.task_id in self.staging_tasks:
+                return
+            url = extract_url_from_offer(e.raw.get('offer', {}))
+            self.staging_tasks = self.staging_tasks.set(e.task_id, url)
+
+        if e.kind == 'task' and e.platform_type == 'running':
+            if e.task_id not in self.staging_tasks:
+                log.info(
+                    f"Task {e.task_id} already running, not fetching logs")
+                return
+
+            url = self.staging_tasks[e.task_id]
+            self.staging_tasks = self.staging_tasks.discard(e.task_id)
+
+            # Simply pass the needed fields and let the logging thread
+            # to take care of the slow path discovery. Not every status
+            # update has these fields, and a KeyError here would stop the
+            # event loop.
+            container_id = e.raw.get('container_status', {}) \
+                .get('container_id', {}).get('value')
+            executor_id = e.raw.get('executor_id', {}).get('value')
+            if not container_id or not executor_id:
+                log.info(
+                    f"No container for task {e.task_id}, not fetching logs")
                 return
+            with self.task_lock:
+                self.running_tasks = self.running_tasks.set(
+                    e.task_id,
+                    LogMetadata(
+                        log_url=url,
+                        container_id=container_id,
+                        executor_id=executor_id
+                    )
+                )
 
-            time.sleep(1)
+        # Fetch the last log and remove the entry if the task is active
+        if e.kind == 'task' and e.terminal:
+            with self.task_lock:
+                if e.task_id in self.running_tasks:
+                    self.done_tasks = self.done_tasks.append(e.task_id)
 
     def logging_loop(self):
         while True:
@@ -237,6 +241,7 @@ class MesosLoggingExecutor(TaskExecutor):
     def stop(self):
         self.downstream_executor.stop()
         self.stopping = True
+        wake_pump(self.src_queue)
         self.event_thread.join()
         self.logging_thread.join()
 
@@ -252,12 +257,12 @@ class MesosLoggingExecutor(TaskExecutor):
 
 def extract_url_from_offer(offer):
     try:
-        url = offer.url.scheme + '://' + \
-            offer.url.address.ip + ':' + \
-            str(offer.url.address.port)
+        url = offer['url']['scheme'] + '://' + \
+            offer['url']['address']['ip'] + ':' + \
+            str(offer['url']['address']['port'])
     except Exception as exc:
         log.error(
-            f"Error decoding the url for this offer: {offer.url}. "
+            f"Error decoding the url for this offer: {offer.get('url')}. "
             f"Setting to None. Exception: {exc}"
         )
         url = None
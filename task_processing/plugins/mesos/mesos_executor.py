@@ -1,8 +1,10 @@
 import logging
 import threading
 from typing import Callable
+from typing import Iterable
 from typing import List
 from typing import NamedTuple
+from typing import Optional
 from typing import Tuple
 
 import addict
@@ -16,9 +18,12 @@ from task_processing.plugins.mesos.task_config import MesosTaskConfig
 
 
 class MesosExecutorCallbacks(NamedTuple):
+    # Returns the tasks to launch on the offer; the others stay pending.
+    # Returning a pair of (tasks to launch, tasks to defer), as callbacks
+    # used to, is deprecated.
     get_tasks_for_offer: Callable[
-        [List[MesosTaskConfig], ResourceSet, dict, str],
-        Tuple[List[addict.Dict], List[MesosTaskConfig]]
+        [Iterable[MesosTaskConfig], ResourceSet, dict, str],
+        List[MesosTaskConfig]
     ]
     handle_status_update: Callable[
         [addict.Dict, MesosTaskConfig],
@@ -28,6 +33,13 @@ class MesosExecutorCallbacks(NamedTuple):
         [MesosTaskConfig, str, str],
         addict.Dict,
     ]
+    # Matches a whole batch of (offer resources, offer attributes) at once,
+    # used when the executor is created with global_offer_matching=True.
+    # Returns the tasks to launch on each offer.
+    get_tasks_for_offers: Optional[Callable[
+        [Iterable[MesosTaskConfig], List[Tuple[ResourceSet, dict]], str],
+        List[List[MesosTaskConfig]]
+    ]] = None
 
 
 class MesosExecutor(TaskExecutor):
@@ -44,11 +56,26 @@ class MesosExecutor(TaskExecutor):
         framework_staging_timeout=240,
         framework_id=None,
         failover=False,
+        global_offer_matching=False,
+        offer_hold_s=0,
+        max_held_offers=10,
+        async_driver_calls=False,
+        use_unreserved_resources=False,
+        task_queue=None,
+        gang_hold_s=30,
+        use_addict=True,
     ) -> None:
         """
         Constructs the instance of a task execution, encapsulating all state
         required to run, monitor and stop the job.
 
+        :param async_driver_calls: make every driver call from a thread of
+            its own, in the order the calls were made; `kill` then only
+            queues the kill and returns True
+        :param use_addict: have the driver pass messages as addict.Dicts;
+            False passes plain dicts, which are much cheaper to build and
+            read, and the callbacks must then build plain dicts too
+
         TODO param docstrings
         """
 
@@ -64,13 +91,21 @@ class MesosExecutor(TaskExecutor):
             task_staging_timeout_s=framework_staging_timeout,
             initial_decline_delay=initial_decline_delay,
             framework_id=framework_id,
+            global_offer_matching=global_offer_matching,
+            offer_hold_s=offer_hold_s,
+            max_held_offers=max_held_offers,
+            async_driver_calls=async_driver_calls,
+            use_unreserved_resources=use_unreserved_resources,
+            task_queue=task_queue,
+            gang_hold_s=gang_hold_s,
+            use_addict=use_addict,
         )
 
         # TODO: Get mesos master ips from smartstack
         self.driver = MesosSchedulerDriver(
             sched=self.execution_framework,
             framework=self.execution_framework.framework_info,
-            use_addict=True,
+            use_addict=use_addict,
             master_uri=mesos_address,
             implicit_acknowledgements=False,
             principal=principal,
@@ -93,6 +128,12 @@ class MesosExecutor(TaskExecutor):
     def run(self, task_config):
         self.execution_framework.enqueue_task(task_config)
 
+    def run_gang(self, task_configs):
+        """ Run tasks that have to run together: they are launched all at
+        once, when there are offers for all of them
+        """
+        self.execution_framework.enqueue_gang(task_configs)
+
     def reconcile(self, task_config):
         self.execution_framework.reconcile_task(task_config)
 
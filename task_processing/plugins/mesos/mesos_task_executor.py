@@ -1,50 +1,161 @@
+import functools
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Set
 from typing import Tuple
 
-from task_processing.plugins.mesos.constraints import attributes_match_constraints
+from task_processing.plugins.mesos.constraints import constraints_checker
 from task_processing.plugins.mesos.mesos_executor import MesosExecutor
 from task_processing.plugins.mesos.mesos_executor import MesosExecutorCallbacks
+from task_processing.plugins.mesos.packing import PACKING_STRATEGIES
+from task_processing.plugins.mesos.packing import PackingStrategy
+from task_processing.plugins.mesos.pending_tasks import resource_shape
+from task_processing.plugins.mesos.pending_tasks import ResourceShape
 from task_processing.plugins.mesos.resource_helpers import allocate_task_resources
+from task_processing.plugins.mesos.resource_helpers import dominant_share
 from task_processing.plugins.mesos.resource_helpers import ResourceSet
 from task_processing.plugins.mesos.resource_helpers import task_fits
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
 from task_processing.plugins.mesos.translator import make_mesos_task_info
 from task_processing.plugins.mesos.translator import mesos_update_to_event
+from task_processing.plugins.mesos.vectorized import NUMPY_ENABLED
+from task_processing.plugins.mesos.vectorized import VectorizedOfferMatcher
 
 
 def get_tasks_for_offer(
-    task_configs: List[MesosTaskConfig],
+    task_configs: Iterable[MesosTaskConfig],
     offer_resources: ResourceSet,
     offer_attributes: dict,
     role: str,
-) -> Tuple[List[MesosTaskConfig], List[MesosTaskConfig]]:
+) -> List[MesosTaskConfig]:
+    """ First fit in queue order
 
-    tasks_to_launch, tasks_to_defer = [], []
+    :returns: the tasks to launch on the offer; the others stay pending
+    """
+    tasks_to_launch = []
+    constraints_match = constraints_checker(offer_attributes)
+    # The offer only shrinks as tasks are allocated, so once a task doesn't
+    # fit, no other task of the same shape will: they are skipped without
+    # being checked. Constraints are only evaluated once per distinct set
+    # by `constraints_match`.
+    unfit_shapes: Set[Tuple[ResourceShape, int]] = set()
 
     for task_config in task_configs:
-        if (task_fits(task_config, offer_resources) and
-                attributes_match_constraints(offer_attributes, task_config.constraints)):
+        shape = (resource_shape(task_config), task_config.num_ports)
+        if shape in unfit_shapes:
+            continue
+        elif not task_fits(task_config, offer_resources):
+            unfit_shapes.add(shape)
+        elif constraints_match(task_config.constraints):
             prepared_task_config, offer_resources = allocate_task_resources(
                 task_config,
                 offer_resources,
             )
             tasks_to_launch.append(prepared_task_config)
-        else:
-            tasks_to_defer.append(task_config)
 
-    return tasks_to_launch, tasks_to_defer
+    return tasks_to_launch
+
+
+def get_tasks_for_offers(
+    task_configs: Iterable[MesosTaskConfig],
+    offers: List[Tuple[ResourceSet, dict]],
+    role: str,
+) -> List[List[MesosTaskConfig]]:
+    """ Best-fit decreasing across a whole batch of offers
+
+    Tasks are placed largest first, by their dominant share of the resources
+    of the whole batch, so that large tasks aren't starved by small ones
+    fragmenting the offers. Each task goes to the offer it leaves the least
+    room in, keeping the other offers whole for the tasks that need them.
+
+    :param offers: (resources, attributes) of each offer
+    :returns: the tasks to launch on each offer, in order; the others stay
+        pending
+    """
+    total_resources = ResourceSet(**{
+        rname: sum(offer_resources[rname] for offer_resources, _ in offers)
+        for rname in ('cpus', 'mem', 'disk', 'gpus')
+    })
+    remaining = [offer_resources for offer_resources, _ in offers]
+    tasks_per_offer: List[List[MesosTaskConfig]] = [[] for _ in offers]
+    constraints_match = [
+        constraints_checker(offer_attributes) for _, offer_attributes in offers
+    ]
+
+    # sorted() is stable, so tasks of the same size stay in queue order
+    for task_config in sorted(
+        task_configs,
+        key=lambda t: dominant_share(t, total_resources),
+        reverse=True,
+    ):
+        best_offer: Optional[int] = None
+        best_slack = 0.0
+        for idx in range(len(offers)):
+            if not (task_fits(task_config, remaining[idx]) and
+                    constraints_match[idx](task_config.constraints)):
+                continue
+            slack = remaining[idx].slack(total_resources, *resource_shape(task_config))
+            if best_offer is None or slack < best_slack:
+                best_offer, best_slack = idx, slack
+
+        if best_offer is None:
+            continue
+
+        prepared_task_config, remaining[best_offer] = allocate_task_resources(
+            task_config,
+            remaining[best_offer],
+        )
+        tasks_per_offer[best_offer].append(prepared_task_config)
+
+    return tasks_per_offer
 
 
 class MesosTaskExecutor(MesosExecutor):
     TASK_CONFIG_INTERFACE = MesosTaskConfig
 
-    def __init__(self, role, *args, **kwargs) -> None:
+    def __init__(
+        self,
+        role,
+        *args,
+        packing_strategy='first_fit',
+        vectorized_matching=False,
+        **kwargs,
+    ) -> None:
+        """
+        :param packing_strategy: how tasks are packed into each offer, either
+            'first_fit' (in queue order) or one of
+            `packing.PACKING_STRATEGIES`
+        :param vectorized_matching: match tasks to offers with NumPy, which is
+            faster for large queues and makes the same decisions as
+            'first_fit' (needs the `vectorized` extra)
+
+        With `use_addict=False` (see `MesosExecutor`), TaskInfos are built as
+        plain dicts too.
+        """
+        if vectorized_matching and not NUMPY_ENABLED:
+            raise ValueError('vectorized_matching requires numpy')
+
+        get_tasks: PackingStrategy
+        if packing_strategy == 'first_fit':
+            get_tasks = VectorizedOfferMatcher() if vectorized_matching else get_tasks_for_offer
+        elif packing_strategy not in PACKING_STRATEGIES:
+            raise ValueError(f'Unknown packing strategy {packing_strategy}')
+        elif vectorized_matching:
+            raise ValueError('vectorized_matching only supports first_fit')
+        else:
+            get_tasks = PACKING_STRATEGIES[packing_strategy]
+
         super().__init__(
             role,
             MesosExecutorCallbacks(
-                get_tasks_for_offer,
+                get_tasks,
                 mesos_update_to_event,
-                make_mesos_task_info,
+                (
+                    make_mesos_task_info if kwargs.get('use_addict', True)
+                    else functools.partial(make_mesos_task_info, dict_cls=dict)
+                ),
+                get_tasks_for_offers,
             ),
             *args,
             **kwargs,
@@ -18,3 +18,7 @@ OFFER_DELAY_TIMER = 'taskproc.mesos.offer_delay'
 BLACKLISTED_AGENTS_COUNT = 'taskproc.mesos.blacklisted_agents_count'
 
 BGCHECK_TIME_TIMER = 'taskproc.mesos.bgcheck_time'
+
+OFFER_CYCLE_TASKS_LAUNCHED = 'taskproc.mesos.offer_cycle_tasks_launched'
+OFFER_CYCLE_CPUS_UTILIZATION = 'taskproc.mesos.offer_cycle_cpus_utilization'
+OFFER_CYCLE_MEM_UTILIZATION = 'taskproc.mesos.offer_cycle_mem_utilization'
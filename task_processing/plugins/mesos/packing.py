@@ -0,0 +1,236 @@
+import heapq
+from collections import OrderedDict
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from task_processing.plugins.mesos.constraints import Constraint
+from task_processing.plugins.mesos.constraints import constraints_checker
+from task_processing.plugins.mesos.pending_tasks import resource_shape
+from task_processing.plugins.mesos.pending_tasks import ResourceShape
+from task_processing.plugins.mesos.pending_tasks import shape_fits
+from task_processing.plugins.mesos.resource_helpers import allocate_task_resources
+from task_processing.plugins.mesos.resource_helpers import dominant_share
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.resource_helpers import task_fits
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+# Alternatives to first-fit in queue order (`get_tasks_for_offer`) for
+# `MesosExecutorCallbacks.get_tasks_for_offer`. They return the tasks to
+# launch in the order they were allocated; the others stay pending.
+PackingStrategy = Callable[
+    [Iterable[MesosTaskConfig], ResourceSet, dict, str],
+    List[MesosTaskConfig]
+]
+
+
+def _can_launch(
+    task_config: MesosTaskConfig,
+    offer_resources: ResourceSet,
+    constraints_match: Callable[[Sequence[Constraint]], bool],
+) -> bool:
+    return (
+        task_fits(task_config, offer_resources) and
+        constraints_match(task_config.constraints)
+    )
+
+
+def _allocate_in_order(
+    ordered_task_configs: Iterable[MesosTaskConfig],
+    offer_resources: ResourceSet,
+    offer_attributes: dict,
+    max_tasks_per_name: Optional[int] = None,
+) -> List[MesosTaskConfig]:
+    """ Launch every task that still fits, in the given order
+
+    :param ordered_task_configs: the tasks, in the order to try them
+    :param max_tasks_per_name: launch at most this many tasks with the same
+        name on the offer
+    """
+    tasks_to_launch = []
+    launched_per_name: Dict[str, int] = {}
+    constraints_match = constraints_checker(offer_attributes)
+    for task_config in ordered_task_configs:
+        if (
+            max_tasks_per_name is not None and
+            launched_per_name.get(task_config.name, 0) >= max_tasks_per_name
+        ):
+            continue
+        if not _can_launch(task_config, offer_resources, constraints_match):
+            continue
+
+        prepared_task_config, offer_resources = allocate_task_resources(
+            task_config,
+            offer_resources,
+        )
+        tasks_to_launch.append(prepared_task_config)
+        launched_per_name[task_config.name] = launched_per_name.get(task_config.name, 0) + 1
+
+    return tasks_to_launch
+
+
+def first_fit_decreasing(
+    task_configs: Iterable[MesosTaskConfig],
+    offer_resources: ResourceSet,
+    offer_attributes: dict,
+    role: str,
+) -> List[MesosTaskConfig]:
+    """ Launch the largest tasks first, by their dominant share of the offer,
+    so that small tasks fill the gaps the large ones leave
+    """
+    # sorted() is stable, so tasks of the same size stay in queue order
+    return _allocate_in_order(
+        sorted(
+            task_configs,
+            key=lambda t: dominant_share(t, offer_resources),
+            reverse=True,
+        ),
+        offer_resources,
+        offer_attributes,
+    )
+
+
+def best_fit(
+    task_configs: Iterable[MesosTaskConfig],
+    offer_resources: ResourceSet,
+    offer_attributes: dict,
+    role: str,
+) -> List[MesosTaskConfig]:
+    """ Repeatedly launch the task that leaves the least room in what is left
+    of the offer
+
+    Tasks are grouped by resource shape, so each step only compares the
+    shapes that still have tasks, not every task.
+    """
+    total_resources = offer_resources
+    # shape -> tasks of that shape in queue order
+    by_shape: Dict[ResourceShape, List[MesosTaskConfig]] = OrderedDict()
+    for task_config in task_configs:
+        by_shape.setdefault(resource_shape(task_config), []).append(task_config)
+
+    def slack(shape: ResourceShape) -> float:
+        return offer_resources.slack(total_resources, *shape)
+
+    tasks_to_launch = []
+    constraints_match = constraints_checker(offer_attributes)
+    while by_shape:
+        fitting_shapes = [
+            shape for shape in by_shape if shape_fits(shape, offer_resources)
+        ]
+        if not fitting_shapes:
+            break
+
+        # min() returns the first of equally good shapes, i.e. the one that
+        # is first in the queue
+        shape = min(fitting_shapes, key=slack)
+        available_ports = offer_resources.num_ports
+        for idx, task_config in enumerate(by_shape[shape]):
+            if (
+                task_config.num_ports <= available_ports and
+                constraints_match(task_config.constraints)
+            ):
+                break
+        else:
+            # no task of this shape can run on this agent, or there aren't
+            # enough ports left for them
+            del by_shape[shape]
+            continue
+
+        prepared_task_config, offer_resources = allocate_task_resources(
+            task_config,
+            offer_resources,
+        )
+        tasks_to_launch.append(prepared_task_config)
+        # tasks of this shape before idx can't run on this offer any more
+        by_shape[shape] = by_shape[shape][idx + 1:]
+        if not by_shape[shape]:
+            del by_shape[shape]
+
+    return tasks_to_launch
+
+
+def spread(
+    task_configs: Iterable[MesosTaskConfig],
+    offer_resources: ResourceSet,
+    offer_attributes: dict,
+    role: str,
+) -> List[MesosTaskConfig]:
+    """ Launch at most one task with a given name on each offer, in queue
+    order, so that copies of the same task end up on different agents
+    """
+    return _allocate_in_order(
+        task_configs,
+        offer_resources,
+        offer_attributes,
+        max_tasks_per_name=1,
+    )
+
+
+def dominant_resource_fairness(
+    task_configs: Iterable[MesosTaskConfig],
+    offer_resources: ResourceSet,
+    offer_attributes: dict,
+    role: str,
+) -> List[MesosTaskConfig]:
+    """ Share the offer between task names with Dominant Resource Fairness
+
+    Each step launches the next task, in queue order, of the name with the
+    smallest dominant share of the offer allocated so far, so one name
+    with many queued tasks can't take the whole offer.
+    """
+    total_resources = offer_resources
+    # name -> tasks with that name in queue order
+    by_name: Dict[str, List[MesosTaskConfig]] = OrderedDict()
+    for task_config in task_configs:
+        by_name.setdefault(task_config.name, []).append(task_config)
+
+    # heap of (allocated dominant share, first position in queue, name)
+    shares = [(0.0, position, name) for position, name in enumerate(by_name)]
+    allocated: Dict[str, ResourceSet] = {name: ResourceSet() for name in by_name}
+    next_task: Dict[str, int] = {name: 0 for name in by_name}
+
+    tasks_to_launch = []
+    constraints_match = constraints_checker(offer_attributes)
+    while shares:
+        _, position, name = heapq.heappop(shares)
+        name_tasks = by_name[name]
+        idx = next_task[name]
+        while idx < len(name_tasks) and not _can_launch(
+            name_tasks[idx], offer_resources, constraints_match,
+        ):
+            idx += 1
+        if idx == len(name_tasks):
+            # nothing left with this name fits the offer
+            continue
+
+        task_config = name_tasks[idx]
+        prepared_task_config, offer_resources = allocate_task_resources(
+            task_config,
+            offer_resources,
+        )
+        tasks_to_launch.append(prepared_task_config)
+        next_task[name] = idx + 1
+        allocated[name] = ResourceSet(
+            cpus=allocated[name].cpus + task_config.cpus,
+            mem=allocated[name].mem + task_config.mem,
+            disk=allocated[name].disk + task_config.disk,
+            gpus=allocated[name].gpus + task_config.gpus,
+        )
+        heapq.heappush(shares, (
+            allocated[name].dominant_share(total_resources),
+            position,
+            name,
+        ))
+
+    return tasks_to_launch
+
+
+PACKING_STRATEGIES: Dict[str, PackingStrategy] = {
+    'first_fit_decreasing': first_fit_decreasing,
+    'best_fit': best_fit,
+    'spread': spread,
+    'dominant_resource_fairness': dominant_resource_fairness,
+}
@@ -0,0 +1,241 @@
+import heapq
+import itertools
+from collections import OrderedDict
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+# (cpus, mem, disk, gpus)
+ResourceShape = Tuple[float, float, float, float]
+
+
+def resource_shape(task_config: MesosTaskConfig) -> ResourceShape:
+    return (
+        task_config.cpus,
+        task_config.mem,
+        task_config.disk,
+        task_config.gpus,
+    )
+
+
+def shape_fits(shape: ResourceShape, resources: ResourceSet) -> bool:
+    cpus, mem, disk, gpus = shape
+    return (
+        cpus <= resources.cpus and
+        mem <= resources.mem and
+        disk <= resources.disk and
+        gpus <= resources.gpus
+    )
+
+
+class PendingTaskQueue:
+    """ Tasks waiting for an offer, in FIFO order
+
+    Tasks are indexed by task_id, so removing a task is O(1), and grouped by
+    resource shape, so offer matching only has to look at the tasks whose
+    shape can possibly fit an offer. Enqueueing a task_id that is already
+    pending replaces the old entry and moves it to the back of the queue.
+
+    This class is not thread-safe; callers are expected to hold a lock.
+    """
+
+    def __init__(self) -> None:
+        self._seq = itertools.count()
+        # task_id -> (sequence number, task_config), in FIFO order
+        self._tasks: Dict[str, Tuple[int, MesosTaskConfig]] = OrderedDict()
+        # shape -> task_ids with that shape, in FIFO order
+        self._shapes: Dict[ResourceShape, Dict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def __iter__(self) -> Iterator[MesosTaskConfig]:
+        return (task_config for _, task_config in self._tasks.values())
+
+    def qsize(self) -> int:
+        return len(self._tasks)
+
+    def empty(self) -> bool:
+        return not self._tasks
+
+    def put(self, task_config: MesosTaskConfig) -> None:
+        task_id = task_config.task_id
+        self.remove(task_id)
+        self._tasks[task_id] = (next(self._seq), task_config)
+        self._shapes.setdefault(resource_shape(task_config), {})[task_id] = None
+
+    def get(self) -> MesosTaskConfig:
+        """ Remove and return the oldest pending task
+
+        :raises KeyError: if the queue is empty
+        """
+        if not self._tasks:
+            raise KeyError('get from an empty PendingTaskQueue')
+        task_id = next(iter(self._tasks))
+        return self.remove(task_id)  # type: ignore
+
+    def remove(self, task_id: str) -> Optional[MesosTaskConfig]:
+        """ Remove a task from the queue
+
+        :returns: the removed task_config, or None if it was not pending
+        """
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return None
+
+        task_config = entry[1]
+        shape = resource_shape(task_config)
+        task_ids = self._shapes[shape]
+        del task_ids[task_id]
+        if not task_ids:
+            del self._shapes[shape]
+        return task_config
+
+    def candidates(self, resources: ResourceSet) -> Iterator[MesosTaskConfig]:
+        """ Iterate over the pending tasks whose resource shape fits, in FIFO
+        order
+
+        Only the numeric resources are checked here; ports, constraints and
+        the depletion of the offer as tasks get allocated are left to the
+        `get_tasks_for_offer` callback. The tasks are produced lazily, so
+        the iterator has to be consumed before the queue is changed.
+        """
+        fitting = [
+            task_ids for shape, task_ids in self._shapes.items()
+            if shape_fits(shape, resources)
+        ]
+        if len(fitting) == len(self._shapes):
+            return iter(self)
+
+        return (
+            self._tasks[task_id][1]
+            for _, task_id in heapq.merge(*(
+                ((self._tasks[task_id][0], task_id) for task_id in task_ids)
+                for task_ids in fitting
+            ))
+        )
+
+
+class FairTaskQueue(PendingTaskQueue):
+    """ A PendingTaskQueue that shares offers fairly between groups of tasks
+
+    Tasks are grouped by `key` (their name by default) and offer matching
+    sees the pending tasks in weighted fair order instead of FIFO: as with
+    deficit round robin, a group with weight w gets w tasks in line for
+    every task of a group with weight 1, and FIFO order is kept within a
+    group. A group that enqueues a large burst therefore only delays the
+    other groups by its share, rather than by the whole burst.
+
+    The order is kept with virtual start tags rather than explicit rounds,
+    so that it carries over from one offer to the next. Each task is
+    tagged when it is enqueued, one 1/weight step after the previous task
+    of its group, but never earlier than the oldest pending task; pending
+    tasks are served by tag. A group whose tasks have all left the queue
+    starts again from the oldest pending task.
+
+    :param key: task_config -> the group it belongs to
+    :param weights: group -> weight; groups that aren't listed get
+        `default_weight`
+    """
+
+    def __init__(
+        self,
+        key: Callable[[MesosTaskConfig], str] = lambda task_config: task_config.name,
+        weights: Optional[Mapping[str, float]] = None,
+        default_weight: float = 1.0,
+    ) -> None:
+        super().__init__()
+        self.key = key
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        if any(weight <= 0 for weight in self.weights.values()) or default_weight <= 0:
+            raise ValueError('weights must be > 0')
+        # group -> {task_id: (tag, sequence number, shape)}, in tag order
+        self._groups: Dict[str, Dict[str, Tuple[float, int, ResourceShape]]] = {}
+        # group -> the tag the next task of the group gets
+        self._next_tags: Dict[str, float] = {}
+        # task_id -> group
+        self._task_groups: Dict[str, str] = {}
+        # (tag, sequence number, task_id) of every pending task; entries of
+        # tasks that have left the queue are dropped once they reach the top
+        self._heads: List[Tuple[float, int, str]] = []
+        self._virtual_time = 0.0
+
+    def _head(self) -> Optional[Tuple[float, int, str]]:
+        while self._heads:
+            tag, seq, task_id = self._heads[0]
+            group = self._task_groups.get(task_id)
+            if group is not None and self._groups[group][task_id][:2] == (tag, seq):
+                return self._heads[0]
+            heapq.heappop(self._heads)
+        return None
+
+    def put(self, task_config: MesosTaskConfig) -> None:
+        task_id = task_config.task_id
+        group = self.key(task_config)
+        self.remove(task_id)
+
+        head = self._head()
+        if head is not None:
+            self._virtual_time = max(self._virtual_time, head[0])
+        tag = max(self._virtual_time, self._next_tags.get(group, 0.0))
+        self._next_tags[group] = tag + 1 / self.weights.get(group, self.default_weight)
+
+        super().put(task_config)
+        seq = self._tasks[task_id][0]
+        self._task_groups[task_id] = group
+        self._groups.setdefault(group, {})[task_id] = (tag, seq, resource_shape(task_config))
+        heapq.heappush(self._heads, (tag, seq, task_id))
+
+    def get(self) -> MesosTaskConfig:
+        """ Remove and return the first task in fair order
+
+        :raises KeyError: if the queue is empty
+        """
+        head = self._head()
+        if head is None:
+            raise KeyError('get from an empty FairTaskQueue')
+        return self.remove(head[2])  # type: ignore
+
+    def remove(self, task_id: str) -> Optional[MesosTaskConfig]:
+        task_config = super().remove(task_id)
+        if task_config is not None:
+            group = self._task_groups.pop(task_id)
+            del self._groups[group][task_id]
+            if not self._groups[group]:
+                del self._groups[group]
+                del self._next_tags[group]
+        return task_config
+
+    def candidates(self, resources: ResourceSet) -> Iterator[MesosTaskConfig]:
+        """ Iterate over the pending tasks whose resource shape fits, in fair
+        order
+
+        As in `PendingTaskQueue.candidates`, only the numeric resources are
+        checked here, and the iterator has to be consumed before the queue
+        is changed.
+        """
+        fitting_shapes = {
+            shape for shape in self._shapes if shape_fits(shape, resources)
+        }
+        return (
+            self._tasks[task_id][1]
+            for _, _, task_id in heapq.merge(*(
+                (
+                    (tag, seq, task_id)
+                    for task_id, (tag, seq, shape) in task_ids.items()
+                    if shape in fitting_shapes
+                )
+                for task_ids in self._groups.values()
+            ))
+        )
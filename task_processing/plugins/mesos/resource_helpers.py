@@ -1,54 +1,280 @@
+from collections.abc import Mapping
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
 from typing import Tuple
-from typing import TYPE_CHECKING
+from typing import Union
 
-import addict
-from pyrsistent import field
 from pyrsistent import m
 from pyrsistent import PMap
 from pyrsistent import pmap
-from pyrsistent import PRecord
 from pyrsistent import PVector
 from pyrsistent import pvector
 from pyrsistent import v
 
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
 
-NUMERIC_RESOURCE = field(
-    type=float,
-    initial=0.0,
-    factory=float,
-    invariant=lambda x: (x >= 0, 'resource < 0'),
-)
 _NUMERIC_RESOURCES = frozenset(['cpus', 'mem', 'disk', 'gpus'])
+# The role of resources that aren't reserved for any role
+UNRESERVED_ROLE = '*'
 
 
-class ResourceSet(PRecord):
-    cpus = NUMERIC_RESOURCE
-    mem = NUMERIC_RESOURCE
-    disk = NUMERIC_RESOURCE
-    gpus = NUMERIC_RESOURCE
-    ports = field(type=(PVector[PMap] if TYPE_CHECKING else PVector),
-                  initial=v(),
-                  factory=pvector)
+def _resource_value(rname: str, value: float) -> float:
+    value = float(value)
+    if not value >= 0:
+        raise ValueError(f'{rname} < 0: {value}')
+    return value
 
 
-def get_offer_resources(offer: addict.Dict, role: str) -> ResourceSet:
+class ResourceSet(Mapping):
+    """ The resources available in an offer, or in what is left of one
+
+    The allocation loop creates a new ResourceSet for every task it
+    launches, so this is a plain slotted object rather than a PRecord:
+    values are validated when a ResourceSet is created with the
+    constructor or `set`, and the arithmetic below trusts them instead of
+    checking every field again. ResourceSets are never changed in place.
+
+    Like the PRecord it replaced, it is a read-only mapping of resource
+    name (cpus, mem, disk, gpus, ports) -> value.
+
+    When the resources come from more than one role, `by_role` holds the
+    resources of each role, in the order they are allocated from, and the
+    other fields hold their totals. It is empty otherwise.
+
+    Since the ports never change, the number of ports is counted once, the
+    first time `num_ports` is needed, and kept.
+    """
+    __slots__ = ('cpus', 'mem', 'disk', 'gpus', 'ports', 'by_role', '_num_ports')
+    _FIELDS = ('cpus', 'mem', 'disk', 'gpus', 'ports')
+    _ALL_FIELDS = _FIELDS + ('by_role',)
+
+    cpus: float
+    mem: float
+    disk: float
+    gpus: float
+    ports: 'PVector[PMap]'
+    by_role: Tuple[Tuple[str, 'ResourceSet'], ...]
+    _num_ports: Optional[int]
+
+    def __init__(
+        self,
+        cpus: float = 0.0,
+        mem: float = 0.0,
+        disk: float = 0.0,
+        gpus: float = 0.0,
+        ports: Iterable[PMap] = v(),
+        by_role: Iterable[Tuple[str, 'ResourceSet']] = (),
+    ) -> None:
+        self.cpus = _resource_value('cpus', cpus)
+        self.mem = _resource_value('mem', mem)
+        self.disk = _resource_value('disk', disk)
+        self.gpus = _resource_value('gpus', gpus)
+        self.ports = pvector(ports)
+        self.by_role = tuple(by_role)
+        self._num_ports = None
+
+    @classmethod
+    def _trusted(
+        cls,
+        cpus: float,
+        mem: float,
+        disk: float,
+        gpus: float,
+        ports: 'PVector[PMap]',
+        by_role: Tuple[Tuple[str, 'ResourceSet'], ...] = (),
+        num_ports: Optional[int] = None,
+    ) -> 'ResourceSet':
+        res = cls.__new__(cls)
+        res.cpus = cpus
+        res.mem = mem
+        res.disk = disk
+        res.gpus = gpus
+        res.ports = ports
+        res.by_role = by_role
+        res._num_ports = num_ports
+        return res
+
+    @property
+    def num_ports(self) -> int:
+        """ The number of ports in `ports` """
+        if self._num_ports is None:
+            self._num_ports = count_ports(self.ports)
+        return self._num_ports
+
+    def __getitem__(self, rname: str):
+        if rname not in self._FIELDS:
+            raise KeyError(rname)
+        return getattr(self, rname)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._FIELDS)
+
+    def __len__(self) -> int:
+        return len(self._FIELDS)
+
+    def set(self, rname: str, value: Any) -> 'ResourceSet':
+        """ A copy with one resource replaced """
+        if rname not in self._FIELDS:
+            raise KeyError(rname)
+        return ResourceSet(**dict(self.items(), **{rname: value}), by_role=self.by_role)
+
+    def fits(
+        self,
+        cpus: float,
+        mem: float,
+        disk: float,
+        gpus: float,
+        num_ports: int = 0,
+    ) -> bool:
+        """ Check whether the given amounts of resources are available """
+        return (
+            cpus <= self.cpus and
+            mem <= self.mem and
+            disk <= self.disk and
+            gpus <= self.gpus and
+            (num_ports == 0 or self.num_ports >= num_ports)
+        )
+
+    def subtract(
+        self,
+        cpus: float,
+        mem: float,
+        disk: float,
+        gpus: float,
+        ports: Optional['PVector[PMap]'] = None,
+        num_ports: int = 0,
+    ) -> 'ResourceSet':
+        """ What is left after taking the given amounts of resources, which
+        should fit (see `fits`)
+
+        Only the totals are updated: `by_role` is carried over as is (see
+        `allocate_task_resources`).
+
+        :param ports: the port ranges left, if ports were taken as well
+        :param num_ports: the number of ports taken
+        """
+        if ports is None:
+            ports, num_ports_left = self.ports, self._num_ports
+        elif self._num_ports is None:
+            num_ports_left = None
+        else:
+            num_ports_left = self._num_ports - num_ports
+        return ResourceSet._trusted(
+            self.cpus - cpus,
+            self.mem - mem,
+            self.disk - disk,
+            self.gpus - gpus,
+            ports,
+            self.by_role,
+            num_ports_left,
+        )
+
+    def slack(
+        self,
+        total_resources: 'ResourceSet',
+        cpus: float,
+        mem: float,
+        disk: float,
+        gpus: float,
+    ) -> float:
+        """ How much room would be left after taking the given amounts of
+        resources, for best-fit packing: what is left of each numeric
+        resource, as a fraction of it in `total_resources`, summed up
+
+        Summing rather than taking the largest fraction means a resource
+        that no task needs much of doesn't make every placement look the
+        same.
+        """
+        slack = 0.0
+        for available, requested, total in (
+            (self.cpus, cpus, total_resources.cpus),
+            (self.mem, mem, total_resources.mem),
+            (self.disk, disk, total_resources.disk),
+            (self.gpus, gpus, total_resources.gpus),
+        ):
+            if total > 0:
+                slack += (available - requested) / total
+        return slack
+
+    def dominant_share(self, total_resources: 'ResourceSet') -> float:
+        """ The largest fraction of any numeric resource in `total_resources`
+        that these resources make up (see Dominant Resource Fairness)
+        """
+        return _dominant_share(self, total_resources)
+
+    def __eq__(self, other):
+        if isinstance(other, ResourceSet):
+            return all(
+                getattr(self, rname) == getattr(other, rname)
+                for rname in self._ALL_FIELDS
+            )
+        # ResourceSets used to be PRecords, which compare equal to dicts
+        if isinstance(other, Mapping):
+            return not self.by_role and dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, rname) for rname in self._ALL_FIELDS))
+
+    def __repr__(self):
+        return 'ResourceSet({})'.format(', '.join(
+            f'{rname}={getattr(self, rname)!r}'
+            for rname in (self._ALL_FIELDS if self.by_role else self._FIELDS)
+        ))
+
+
+def get_offer_resources(
+    offer: dict,
+    role: str,
+    include_unreserved: bool = False,
+) -> ResourceSet:
     """ Get the resources from a Mesos offer
 
     :param offer: the payload from a Mesos resourceOffer call
     :param role: the Mesos role we want to get resources for
-    :returns: a mapping from resource name -> available resources for the offer
+    :param include_unreserved: also count the unreserved resources in the
+        offer; tasks are allocated the resources reserved for `role` first
+        (see `ResourceSet.by_role`)
+    :returns: a ResourceSet, i.e. a read-only mapping from resource name ->
+        available resources for the offer
     """
-    res = ResourceSet()
-    for resource in offer.resources:
-        if resource.role != role:
+    roles = [role]
+    if include_unreserved and role != UNRESERVED_ROLE:
+        roles.append(UNRESERVED_ROLE)
+
+    res: Dict[str, Dict[str, Any]] = {r: {} for r in roles}
+    # subscripts rather than attributes, so that offers can be addict.Dicts
+    # or plain dicts (see MesosExecutor's use_addict)
+    for resource in offer['resources']:
+        resource_role = resource.get('role')
+        if resource_role not in res:
             continue
 
-        if resource.name in _NUMERIC_RESOURCES:
-            res = res.set(resource.name, resource.scalar.value)
-        elif resource.name == 'ports':
-            res = res.set('ports', [pmap(r) for r in resource.ranges.range])
-    return res
+        rname = resource['name']
+        if rname in _NUMERIC_RESOURCES:
+            res[resource_role][rname] = resource['scalar']['value']
+        elif rname == 'ports':
+            res[resource_role]['ports'] = [pmap(r) for r in resource['ranges']['range']]
+
+    if len(roles) == 1:
+        return ResourceSet(**res[role])
+
+    by_role = tuple((r, ResourceSet(**res[r])) for r in roles)
+    return ResourceSet(
+        cpus=sum(role_resources.cpus for _, role_resources in by_role),
+        mem=sum(role_resources.mem for _, role_resources in by_role),
+        disk=sum(role_resources.disk for _, role_resources in by_role),
+        gpus=sum(role_resources.gpus for _, role_resources in by_role),
+        ports=[
+            port_range
+            for _, role_resources in by_role
+            for port_range in role_resources.ports
+        ],
+        by_role=by_role,
+    )
 
 
 def allocate_task_resources(
@@ -64,22 +290,134 @@ def allocate_task_resources(
         `prepared_task_config` is the task_config object modified with the
         actual resources consumed
     """
-    for res, val in offer_resources.items():
-        if res not in _NUMERIC_RESOURCES:
-            continue
-        offer_resources = offer_resources.set(res, val - task_config[res])
-
-    port = offer_resources.ports[0]['begin']
-    if offer_resources.ports[0]['begin'] == offer_resources.ports[0]['end']:
-        avail_ports = offer_resources.ports[1:]
-    else:
-        new_port_range = offer_resources.ports[0].set('begin', port + 1)
-        avail_ports = offer_resources.ports.set(0, new_port_range)
-    offer_resources = offer_resources.set('ports', avail_ports)
-    task_config = task_config.set('ports', v(m(begin=port, end=port)))
+    if offer_resources.by_role:
+        return _allocate_task_resources_by_role(task_config, offer_resources)
+
+    task_ports, avail_ports = allocate_ports(offer_resources.ports, task_config.num_ports)
+    offer_resources = offer_resources.subtract(
+        task_config.cpus,
+        task_config.mem,
+        task_config.disk,
+        task_config.gpus,
+        avail_ports,
+        task_config.num_ports,
+    )
+    task_config = task_config.set('ports', task_ports)
     return task_config, offer_resources
 
 
+def _allocate_task_resources_by_role(
+    task_config: MesosTaskConfig,
+    offer_resources: ResourceSet,
+) -> Tuple[MesosTaskConfig, ResourceSet]:
+    """ Allocate a task's resources from each role of the offer in turn,
+    recording what was taken from each role in `resources_by_role`, as
+    plain pmaps so that the task config can still be serialized
+    """
+    # what is still to be allocated
+    cpus: float = task_config.cpus
+    mem: float = task_config.mem
+    disk: float = task_config.disk
+    gpus: float = task_config.gpus
+    num_ports = task_config.num_ports
+    taken: Dict[str, PMap] = {}
+    by_role = []
+    for role, role_resources in offer_resources.by_role:
+        role_cpus = min(cpus, role_resources.cpus)
+        role_mem = min(mem, role_resources.mem)
+        role_disk = min(disk, role_resources.disk)
+        role_gpus = min(gpus, role_resources.gpus)
+        role_num_ports = min(num_ports, role_resources.num_ports)
+        role_ports, avail_ports = allocate_ports(role_resources.ports, role_num_ports)
+        cpus -= role_cpus
+        mem -= role_mem
+        disk -= role_disk
+        gpus -= role_gpus
+        num_ports -= role_num_ports
+
+        if role_cpus or role_mem or role_disk or role_gpus or role_ports:
+            taken[role] = m(
+                cpus=role_cpus,
+                mem=role_mem,
+                disk=role_disk,
+                gpus=role_gpus,
+                ports=role_ports,
+            )
+        by_role.append((role, role_resources.subtract(
+            role_cpus, role_mem, role_disk, role_gpus, avail_ports, role_num_ports)))
+
+    if num_ports > 0:
+        raise ValueError(f'{num_ports} more ports needed than available')
+
+    remaining = ResourceSet._trusted(
+        offer_resources.cpus - task_config.cpus,
+        offer_resources.mem - task_config.mem,
+        offer_resources.disk - task_config.disk,
+        offer_resources.gpus - task_config.gpus,
+        pvector(
+            port_range
+            for _, role_resources in by_role
+            for port_range in role_resources.ports
+        ),
+        tuple(by_role),
+        None if offer_resources._num_ports is None
+        else offer_resources._num_ports - task_config.num_ports,
+    )
+    task_config = task_config.set(
+        ports=pvector(
+            port_range
+            for role_resources in taken.values()
+            for port_range in role_resources['ports']
+        ),
+        resources_by_role=m(**taken),
+    )
+    return task_config, remaining
+
+
+def count_ports(port_ranges: PVector) -> int:
+    """ The number of ports in a set of port ranges """
+    return sum(
+        port_range['end'] - port_range['begin'] + 1
+        for port_range in port_ranges
+    )
+
+
+def allocate_ports(
+    port_ranges: PVector,
+    num_ports: int,
+) -> Tuple[PVector, PVector]:
+    """ Take the lowest `num_ports` ports out of a set of port ranges
+
+    Only the ranges the ports are taken from are looked at: they are
+    dropped from the front of `port_ranges`, and at most one of them is
+    split.
+
+    :param port_ranges: sorted, non-overlapping ranges of the available ports
+        (as in `ResourceSet.ports`)
+    :returns: a pair of (`allocated`, `remaining`) port ranges
+    :raises ValueError: if there are fewer than `num_ports` ports available
+    """
+    allocated = []
+    idx = 0
+    while num_ports > 0:
+        if idx == len(port_ranges):
+            raise ValueError(f'{num_ports} more ports needed than available')
+
+        port_range = port_ranges[idx]
+        range_size = port_range['end'] - port_range['begin'] + 1
+        if range_size > num_ports:
+            split_at = port_range['begin'] + num_ports
+            allocated.append(m(begin=port_range['begin'], end=split_at - 1))
+            return pvector(allocated), port_ranges[idx:].set(
+                0, port_range.set('begin', split_at))
+
+        allocated.append(port_range)
+        num_ports -= range_size
+        idx += 1
+
+    return pvector(allocated), port_ranges[idx:]
+
+
 def task_fits(task: MesosTaskConfig, offer_resources: ResourceSet) -> bool:
     """ Check to see if a task fits a given offer's resources
 
@@ -88,10 +426,53 @@ def task_fits(task: MesosTaskConfig, offer_resources: ResourceSet) -> bool:
         (should come from :func:`get_offer_resources`)
     :returns: True if the offer has enough resources for the task, False otherwise
     """
-    for rname, value in offer_resources.items():
-        if rname in _NUMERIC_RESOURCES and task[rname] > value:
-            return False
-        elif rname == 'ports' and len(value) == 0:  # TODO validate port ranges
-            return False
+    return offer_resources.fits(
+        task.cpus,
+        task.mem,
+        task.disk,
+        task.gpus,
+        task.num_ports,
+    )
+
+
+def largest_resources(resource_sets: Iterable[ResourceSet]) -> ResourceSet:
+    """ The most of each numeric resource available in any of the given sets
+
+    :returns: a ResourceSet that any task fitting one of `resource_sets`
+        also fits, ignoring ports
+    """
+    resource_sets = list(resource_sets)
+    return ResourceSet._trusted(
+        max((res.cpus for res in resource_sets), default=0.0),
+        max((res.mem for res in resource_sets), default=0.0),
+        max((res.disk for res in resource_sets), default=0.0),
+        max((res.gpus for res in resource_sets), default=0.0),
+        v(),
+    )
+
+
+def dominant_share(
+    task: Union[MesosTaskConfig, ResourceSet],
+    total_resources: ResourceSet,
+) -> float:
+    """ The largest fraction of any numeric resource in `total_resources`
+    that a task, or a set of resources, needs (see Dominant Resource
+    Fairness)
+    """
+    return _dominant_share(task, total_resources)
+
 
-    return True
+def _dominant_share(
+    task: Union[MesosTaskConfig, ResourceSet],
+    total_resources: ResourceSet,
+) -> float:
+    share = 0.0
+    for requested, total in (
+        (task.cpus, total_resources.cpus),
+        (task.mem, total_resources.mem),
+        (task.disk, total_resources.disk),
+        (task.gpus, total_resources.gpus),
+    ):
+        if total > 0 and requested / total > share:
+            share = requested / total
+    return share
@@ -0,0 +1,106 @@
+import random
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+DEFAULT_RETRY_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 300.0
+
+
+class FixedBackoff:
+    """ Wait the same time before every retry, up to max_delay if given """
+
+    def __init__(
+        self,
+        delay: float = DEFAULT_RETRY_DELAY,
+        max_delay: Optional[float] = None,
+    ) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+
+    def __call__(self, attempt: int, previous_delay: Optional[float]) -> float:
+        if self.max_delay is None:
+            return self.delay
+        return min(self.delay, self.max_delay)
+
+
+class ExponentialBackoff:
+    """ Double the wait with every retry: delay, 2 * delay, 4 * delay, ...
+    up to max_delay
+    """
+
+    def __init__(
+        self,
+        delay: float = DEFAULT_RETRY_DELAY,
+        max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        factor: float = 2.0,
+    ) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+        self.factor = factor
+
+    def __call__(self, attempt: int, previous_delay: Optional[float]) -> float:
+        return min(self.max_delay, self.delay * self.factor ** (attempt - 1))
+
+
+class DecorrelatedJitterBackoff:
+    """ Wait a random time between delay and three times the previous wait,
+    up to max_delay, so that tasks failing together don't all come back
+    together
+    """
+
+    def __init__(
+        self,
+        delay: float = DEFAULT_RETRY_DELAY,
+        max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        uniform: Callable[[float, float], float] = random.uniform,
+    ) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+        self.uniform = uniform
+
+    def __call__(self, attempt: int, previous_delay: Optional[float]) -> float:
+        previous_delay = previous_delay or self.delay
+        return min(
+            self.max_delay,
+            self.uniform(self.delay, previous_delay * 3),
+        )
+
+
+# Given the attempt number of a retry (starting at 1) and the time waited
+# before the previous one, if any, returns the seconds to wait before
+# running the task again
+BackoffPolicy = Callable[[int, Optional[float]], float]
+
+# Backoff policies that can be named in task configs; 'none' retries right
+# away
+BACKOFF_POLICIES: Dict[str, Optional[Callable[..., BackoffPolicy]]] = {
+    'none': None,
+    'fixed': FixedBackoff,
+    'exponential': ExponentialBackoff,
+    'decorrelated_jitter': DecorrelatedJitterBackoff,
+}
+
+
+def make_backoff(
+    name: str,
+    delay: float = DEFAULT_RETRY_DELAY,
+    max_delay: Optional[float] = None,
+) -> Optional[BackoffPolicy]:
+    """ Build the backoff policy a task config names
+
+    :param name: one of BACKOFF_POLICIES
+    :param delay: the base wait, in seconds
+    :param max_delay: the longest wait, in seconds; None for the policy's
+        default
+    :raises ValueError: if there's no backoff policy with that name
+    """
+    try:
+        make = BACKOFF_POLICIES[name]
+    except KeyError:
+        raise ValueError(f'Unknown retry backoff policy: {name}')
+    if make is None:
+        return None
+    if max_delay is None:
+        return make(delay)
+    return make(delay, max_delay)
@@ -1,3 +1,5 @@
+import collections
+import heapq
 import logging
 import time
 from queue import Queue
@@ -6,23 +8,48 @@ from threading import Thread
 
 from pyrsistent import m
 
+from task_processing.interfaces.event import trusted_set
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.plugins.mesos.event_pipeline import pump_events
+from task_processing.plugins.mesos.event_pipeline import wake_pump
+from task_processing.plugins.mesos.retry_backoff import DEFAULT_RETRY_DELAY
+from task_processing.plugins.mesos.retry_backoff import make_backoff
 
 log = logging.getLogger(__name__)
 
+# A retry waiting for its backoff: when it's due, and the failure event of
+# the attempt it retries
+PendingRetry = collections.namedtuple('PendingRetry', ['due', 'event'])
+
 
 class RetryingExecutor(TaskExecutor):
     def __init__(self,
                  downstream_executor,
                  retry_pred=lambda e: not e.success,
-                 retries=3):
+                 retries=3,
+                 backoff=None):
         self.executor = downstream_executor
         self.retries = retries
         self.retry_pred = retry_pred
+        # How long to wait before retrying a task whose config doesn't name
+        # a backoff policy; None retries right away
+        self.backoff = backoff
 
         self.task_retries = m()
         self.task_retries_lock = Lock()
 
+        self.retry_timers_lock = Lock()
+        # Retries waiting for their backoff, by task_id
+        self.pending_retries = {}
+        # Heap of (due, task_id) for pending_retries. Entries of cancelled
+        # retries are left in place and skipped when they reach the top.
+        self._retry_timers = []
+        # How long the last retry of each task waited
+        self._retry_delays = {}
+        # Retries that are due and being run downstream, by task_id: whether
+        # the task was killed meanwhile
+        self._retries_in_flight = {}
+
         self.src_queue = downstream_executor.get_event_queue()
         self.dest_queue = Queue()
         self.stopping = False
@@ -32,13 +59,13 @@ class RetryingExecutor(TaskExecutor):
         self.retry_thread.start()
 
     def event_with_retries(self, event):
-        return event.transform(
-            ('extensions', 'RetryingExecutor/tries'),
+        return trusted_set(event, extensions=event.extensions.set(
+            'RetryingExecutor/tries',
             "{}/{}".format(
                 self.task_retries[event.task_id],
                 self.retries
             )
-        )
+        ))
 
     def retry(self, event):
         retries_remaining = self.task_retries[event.task_id]
@@ -58,48 +85,108 @@ class RetryingExecutor(TaskExecutor):
                 event.task_id,
                 retries_remaining - 1
             )
-        self.run(event.task_config)
 
-        return True
-
-    def retry_loop(self):
-        while True:
-            while not self.src_queue.empty():
-                e = self.src_queue.get()
-
-                if e.kind != 'task':
-                    self.dest_queue.put(e)
-                    continue
-
-                # This is to remove trailing '-retry*'
-                original_task_id = '-'.join([item for item in
-                                             e.task_id.split('-')[:-1]])
-
-                # Check if the update is for current attempt. Discard if
-                # it is not.
-                if not self._is_current_attempt(e, original_task_id):
-                    continue
+        backoff = self._task_or_executor_backoff(event.task_config)
+        if backoff is None:
+            self.run(event.task_config)
+            return True
 
-                # Set the task id back to original task_id
-                e = self._restore_task_id(e, original_task_id)
+        delay = backoff(
+            total_retries - retries_remaining + 1,
+            self._retry_delays.get(event.task_id),
+        )
+        due = time.time() + delay
+        with self.retry_timers_lock:
+            self._retry_delays[event.task_id] = delay
+            self.pending_retries[event.task_id] = PendingRetry(due, event)
+            heapq.heappush(self._retry_timers, (due, event.task_id))
 
-                e = self.event_with_retries(e)
+        return True
 
-                if e.terminal:
-                    if self.retry_pred(e):
-                        if self.retry(e):
-                            continue
+    def retry_loop(self):
+        pump_events(
+            self.src_queue,
+            self.handle_event,
+            lambda: self.stopping,
+            next_deadline=self._next_retry_due,
+            on_deadline=self._run_due_retries,
+        )
 
-                    with self.task_retries_lock:
-                        self.task_retries = \
-                            self.task_retries.remove(e.task_id)
+    def handle_event(self, e):
+        if e.kind != 'task':
+            self.dest_queue.put(e)
+            return
 
-                self.dest_queue.put(e)
+        # This is to remove trailing '-retry*'
+        original_task_id = '-'.join([item for item in
+                                     e.task_id.split('-')[:-1]])
 
-            if self.stopping:
-                return
+        # Check if the update is for current attempt. Discard if
+        # it is not.
+        if not self._is_current_attempt(e, original_task_id):
+            return
 
-            time.sleep(1)
+        # Set the task id back to original task_id
+        e = self._restore_task_id(e, original_task_id)
+
+        e = self.event_with_retries(e)
+
+        if e.terminal:
+            if self.retry_pred(e):
+                if self.retry(e):
+                    return
+
+            self._forget_task(e.task_id)
+
+        self.dest_queue.put(e)
+
+    def _next_retry_due(self):
+        with self.retry_timers_lock:
+            while self._retry_timers:
+                due, task_id = self._retry_timers[0]
+                pending = self.pending_retries.get(task_id)
+                if pending is not None and pending.due == due:
+                    return due
+                heapq.heappop(self._retry_timers)
+            return None
+
+    def _run_due_retries(self, current_time):
+        # Downstream calls are made without the lock, so that a slow one
+        # doesn't hold up kills and other retries
+        for event in self._take_due_retries(current_time):
+            self._run_retry(event)
+
+    def _take_due_retries(self, current_time):
+        due_retries = []
+        with self.retry_timers_lock:
+            while self._retry_timers and self._retry_timers[0][0] <= current_time:
+                due, task_id = heapq.heappop(self._retry_timers)
+                pending = self.pending_retries.get(task_id)
+                if pending is None or pending.due != due:
+                    continue
+                del self.pending_retries[task_id]
+                self._retries_in_flight[task_id] = False
+                due_retries.append(pending.event)
+        return due_retries
+
+    def _run_retry(self, event):
+        task_id = event.task_id
+        with self.retry_timers_lock:
+            killed = self._retries_in_flight[task_id]
+            if killed:
+                del self._retries_in_flight[task_id]
+            else:
+                task_config = self._task_config_with_retry(event.task_config)
+        if killed:
+            log.info('Cancelling retry of task {}: killed'.format(task_id))
+            self._give_up_retry(event)
+            return
+
+        self.executor.run(task_config)
+        with self.retry_timers_lock:
+            killed = self._retries_in_flight.pop(task_id)
+        if killed:
+            self.executor.kill(task_id)
 
     def run(self, task_config):
         if task_config.task_id not in self.task_retries:
@@ -114,19 +201,47 @@ class RetryingExecutor(TaskExecutor):
         self.executor.reconcile(task_config)
 
     def kill(self, task_id):
-        # retries = -1 so that manually killed tasks can be distinguished
-        with self.task_retries_lock:
-            self.task_retries = self.task_retries.set(
-                task_id,
-                -1
-            )
+        with self.retry_timers_lock:
+            # retries = -1 so that manually killed tasks can be distinguished
+            with self.task_retries_lock:
+                self.task_retries = self.task_retries.set(
+                    task_id,
+                    -1
+                )
+            pending = self.pending_retries.pop(task_id, None)
+            in_flight = task_id in self._retries_in_flight
+            if in_flight:
+                # the retry loop cancels the retry or kills it once it's
+                # running downstream
+                self._retries_in_flight[task_id] = True
+
+        if pending is not None:
+            # Nothing is running downstream, so the failure the task was
+            # going to be retried for is its last event
+            log.info('Cancelling retry of task {}: killed'.format(task_id))
+            self._give_up_retry(pending.event)
+            return True
+        if in_flight:
+            return True
         return self.executor.kill(task_id)
 
     def stop(self):
         self.executor.stop()
         self.stopping = True
+        wake_pump(self.src_queue)
         self.retry_thread.join()
 
+        # Retries that were still waiting won't happen, so the failures
+        # they were for are the tasks' last events
+        with self.retry_timers_lock:
+            pending_retries = list(self.pending_retries.values())
+            self.pending_retries.clear()
+            self._retry_timers = []
+        for pending in pending_retries:
+            log.info('Dropping retry of task {}: stopping'.format(
+                pending.event.task_id))
+            self._give_up_retry(pending.event)
+
     def get_event_queue(self):
         return self.dest_queue
 
@@ -142,7 +257,8 @@ class RetryingExecutor(TaskExecutor):
         ))
 
         # Set the task id back to original task_id
-        return e.set(
+        return trusted_set(
+            e,
             task_id=original_task_id,
             task_config=task_config,
         )
@@ -173,3 +289,22 @@ class RetryingExecutor(TaskExecutor):
     def _task_or_executor_retries(self, task_config):
         return task_config.retries \
             if 'retries' in task_config else self.retries
+
+    def _task_or_executor_backoff(self, task_config):
+        if 'retry_backoff' not in task_config:
+            return self.backoff
+        return make_backoff(
+            task_config.retry_backoff,
+            task_config.get('retry_delay', DEFAULT_RETRY_DELAY),
+            task_config.get('retry_max_delay'),
+        )
+
+    def _give_up_retry(self, event):
+        self.dest_queue.put(self.event_with_retries(event))
+        self._forget_task(event.task_id)
+
+    def _forget_task(self, task_id):
+        with self.task_retries_lock:
+            self.task_retries = self.task_retries.discard(task_id)
+        with self.retry_timers_lock:
+            self._retry_delays.pop(task_id, None)
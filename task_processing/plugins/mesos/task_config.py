@@ -14,6 +14,7 @@ from task_processing.interfaces.task_executor import DefaultTaskConfigInterface
 from task_processing.plugins.mesos.constraints import Constraint
 from task_processing.plugins.mesos.constraints import \
     valid_constraint_operator_name
+from task_processing.plugins.mesos.retry_backoff import BACKOFF_POLICIES
 
 VOLUME_KEYS = set(['mode', 'container_path', 'host_path'])
 
@@ -90,6 +91,22 @@ class MesosTaskConfig(DefaultTaskConfigInterface):
                     factory=int,
                     mandatory=False,
                     invariant=lambda r: (r >= 0, 'retries >= 0'))
+    # How long the retrying executor waits before retrying the task; these
+    # override the executor's backoff policy. retry_backoff is one of
+    # BACKOFF_POLICIES, and the delays are in seconds.
+    retry_backoff = field(type=str,
+                          mandatory=False,
+                          invariant=lambda b: (b in BACKOFF_POLICIES,
+                                               'unknown retry_backoff'))
+    retry_delay = field(type=float,
+                        factory=float,
+                        mandatory=False,
+                        invariant=lambda d: (d >= 0, 'retry_delay >= 0'))
+    retry_max_delay = field(type=float,
+                            factory=float,
+                            mandatory=False,
+                            invariant=lambda d: (d >= 0,
+                                                 'retry_max_delay >= 0'))
     volumes = field(type=PVector,
                     initial=v(),
                     factory=pvector,
@@ -97,6 +114,15 @@ class MesosTaskConfig(DefaultTaskConfigInterface):
     ports = field(type=(PVector[PMap] if TYPE_CHECKING else PVector),
                   initial=v(),
                   factory=pvector)
+    # How many ports to allocate to the task; they end up in `ports`
+    num_ports = field(type=int,
+                      initial=1,
+                      factory=int,
+                      invariant=lambda n: (n >= 0, 'num_ports >= 0'))
+    # Filled in when the task is allocated resources from more than one
+    # role: role -> pmap of the cpus, mem, disk, gpus and ports allocated
+    # from that role
+    resources_by_role = field(type=PMap, initial=m(), factory=pmap)
     cap_add = field(type=PVector, initial=v(), factory=pvector)
     ulimit = field(type=PVector, initial=v(), factory=pvector)
     uris = field(type=PVector, initial=v(), factory=pvector)
@@ -0,0 +1,150 @@
+import threading
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+DEFAULT_SHARDS = 16
+
+
+class TaskMetadata:
+    """ What the ExecutionFramework knows about a task
+
+    A mutable record with a fixed set of slots, so that a state transition
+    is a couple of attribute writes instead of a new persistent record and
+    map. Records owned by a `TaskMetadataStore` should only be changed
+    through the store.
+    """
+    __slots__ = ('agent_id', 'task_config', 'task_state', 'task_state_history')
+
+    def __init__(
+        self,
+        task_config: MesosTaskConfig,
+        task_state: str,
+        task_state_history: Dict[str, float],
+        agent_id: str = '',
+    ) -> None:
+        self.agent_id = agent_id
+        self.task_config = task_config
+        self.task_state = task_state
+        self.task_state_history = dict(task_state_history)
+
+    def copy(self) -> 'TaskMetadata':
+        return TaskMetadata(
+            task_config=self.task_config,
+            task_state=self.task_state,
+            task_state_history=self.task_state_history,
+            agent_id=self.agent_id,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, TaskMetadata):
+            return NotImplemented
+        return all(
+            getattr(self, attr) == getattr(other, attr)
+            for attr in self.__slots__
+        )
+
+    def __repr__(self):
+        return 'TaskMetadata({})'.format(', '.join(
+            f'{attr}={getattr(self, attr)!r}' for attr in self.__slots__
+        ))
+
+
+class TaskMetadataStore:
+    """ task_id -> TaskMetadata, sharded by task_id
+
+    Every shard has its own lock, so transitions of different tasks rarely
+    contend with each other. Single reads are lock-free; iteration is
+    consistent within a shard, and `snapshot` gives readers that need it a
+    copy of every record.
+    """
+
+    def __init__(self, shards: int = DEFAULT_SHARDS) -> None:
+        self._shards: List[Tuple[Dict[str, TaskMetadata], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(shards)
+        ]
+
+    def _shard(self, task_id: str) -> Tuple[Dict[str, TaskMetadata], threading.Lock]:
+        return self._shards[hash(task_id) % len(self._shards)]
+
+    def __len__(self) -> int:
+        return sum(len(records) for records, _ in self._shards)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._shard(task_id)[0]
+
+    def __getitem__(self, task_id: str) -> TaskMetadata:
+        return self._shard(task_id)[0][task_id]
+
+    def __setitem__(self, task_id: str, md: TaskMetadata) -> None:
+        records, lock = self._shard(task_id)
+        with lock:
+            records[task_id] = md
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def get(self, task_id: str) -> Optional[TaskMetadata]:
+        return self._shard(task_id)[0].get(task_id)
+
+    def pop(self, task_id: str) -> Optional[TaskMetadata]:
+        records, lock = self._shard(task_id)
+        with lock:
+            return records.pop(task_id, None)
+
+    def keys(self) -> List[str]:
+        keys: List[str] = []
+        for records, lock in self._shards:
+            with lock:
+                keys.extend(records)
+        return keys
+
+    def items(self) -> List[Tuple[str, TaskMetadata]]:
+        items: List[Tuple[str, TaskMetadata]] = []
+        for records, lock in self._shards:
+            with lock:
+                items.extend(records.items())
+        return items
+
+    def transition(
+        self,
+        task_id: str,
+        task_state: str,
+        at: float,
+        expected_state: Optional[str] = None,
+        agent_id: Optional[str] = None,
+    ) -> Optional[TaskMetadata]:
+        """ Move a task to a new state
+
+        :param expected_state: only transition if the task is in this state
+        :param agent_id: also record the agent the task was launched on
+        :returns: the updated record, or None if the task is unknown or was
+            not in `expected_state`
+        """
+        records, lock = self._shard(task_id)
+        with lock:
+            md = records.get(task_id)
+            if md is None or (
+                expected_state is not None and md.task_state != expected_state
+            ):
+                return None
+
+            md.task_state = task_state
+            md.task_state_history[task_state] = at
+            if agent_id is not None:
+                md.agent_id = agent_id
+            return md
+
+    def snapshot(self) -> Dict[str, TaskMetadata]:
+        """ A copy of every record, consistent within each shard """
+        snapshot: Dict[str, TaskMetadata] = {}
+        for records, lock in self._shards:
+            with lock:
+                snapshot.update(
+                    (task_id, md.copy()) for task_id, md in records.items()
+                )
+        return snapshot
@@ -1,4 +1,5 @@
 import collections
+import heapq
 import logging
 import time
 from queue import Queue
@@ -6,6 +7,8 @@ from threading import Lock
 from threading import Thread
 
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.plugins.mesos.event_pipeline import pump_events
+from task_processing.plugins.mesos.event_pipeline import wake_pump
 
 log = logging.getLogger(__name__)
 
@@ -18,9 +21,13 @@ class TimeoutExecutor(TaskExecutor):
 
         self.tasks_lock = Lock()
         # Tasks that are pending termination
-        self.killed_tasks = []
-        # Tasks that are currently running
-        self.running_tasks = []
+        self.killed_tasks = set()
+        # Deadlines of the tasks that are currently running, by task_id
+        self.running_tasks = {}
+        # Heap of (deadline, task_id) for running_tasks. Entries of tasks that
+        # have since finished, been killed or been given another deadline are
+        # left in place and skipped when they reach the top.
+        self._deadlines = []
 
         self.src_queue = downstream_executor.get_event_queue()
         self.dest_queue = Queue()
@@ -31,61 +38,52 @@ class TimeoutExecutor(TaskExecutor):
         self.timeout_thread.start()
 
     def timeout_loop(self):
-        while True:
-            # process downstream events
-            while not self.src_queue.empty():
-                e = self.src_queue.get()
-                self.dest_queue.put(e)
+        pump_events(
+            self.src_queue,
+            self.handle_event,
+            lambda: self.stopping,
+            next_deadline=self._next_deadline,
+            on_deadline=self._kill_timed_out_tasks,
+        )
 
-                if not e.kind == 'task':
-                    continue
-                elif not e.terminal:
-                    with self.tasks_lock:
-                        if e.task_id not in [entry.task_id for entry in self.running_tasks]:
-                            # No record of e's task_id in self.running_tasks,
-                            # so we need to add it back in. We lack access to
-                            # the original time the task was started, so to set
-                            # a deadline, we use e's timestamp as a baseline.
-                            new_entry = TaskEntry(
-                                task_id=e.task_id,
-                                deadline=e.task_config.timeout + e.timestamp,
-                            )
-                            self._insert_new_running_task_entry(new_entry)
-                else:
-                    # Update running and killed tasks
-                    with self.tasks_lock:
-                        for idx, entry in enumerate(self.running_tasks):
-                            if e.task_id == entry.task_id:
-                                self.running_tasks.pop(idx)
-                                break
-                        if e.task_id in self.killed_tasks:
-                            self.killed_tasks.remove(e.task_id)
-
-            # Check timeouts
-            current_time = time.time()
+    def handle_event(self, e):
+        self.dest_queue.put(e)
+
+        if not e.kind == 'task':
+            return
+        elif not e.terminal:
             with self.tasks_lock:
-                delete_idx = None
-                for idx, entry in enumerate(self.running_tasks):
-                    if entry.deadline < current_time:
-                        log.info(
-                            'Killing task {}: timed out'.format(entry.task_id))
-                        self.downstream_executor.kill(entry.task_id)
-                        self.killed_tasks.append(entry.task_id)
-                        delete_idx = idx
-                    # Skip the rest of tasks in the list because they are
-                    # appended to the list later.
-                    else:
-                        break
-                if delete_idx is not None:
-                    self.running_tasks = self.running_tasks[delete_idx + 1:]
-
-            if self.stopping:
-                return
+                if e.task_id not in self.running_tasks:
+                    # No record of e's task_id in self.running_tasks,
+                    # so we need to add it back in. We lack access to
+                    # the original time the task was started, so to set
+                    # a deadline, we use e's timestamp as a baseline.
+                    new_entry = TaskEntry(
+                        task_id=e.task_id,
+                        deadline=e.task_config.timeout + e.timestamp,
+                    )
+                    self._insert_new_running_task_entry(new_entry)
+        else:
+            # Update running and killed tasks
+            with self.tasks_lock:
+                self._remove_running_task(e.task_id)
+                self.killed_tasks.discard(e.task_id)
 
-            # Since src_queue has to be polled continuously, sleep(1) is used.
-            # Otherwise, a notify() from run() plus wait(delta between now and
-            # the earliest deadline) is more efficient.
-            time.sleep(1)
+    def _next_deadline(self):
+        with self.tasks_lock:
+            self._drop_stale_deadlines()
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def _kill_timed_out_tasks(self, current_time):
+        with self.tasks_lock:
+            while self._deadlines and self._deadlines[0][0] < current_time:
+                deadline, task_id = heapq.heappop(self._deadlines)
+                if self.running_tasks.get(task_id) != deadline:
+                    continue
+                log.info('Killing task {}: timed out'.format(task_id))
+                self.downstream_executor.kill(task_id)
+                del self.running_tasks[task_id]
+                self.killed_tasks.add(task_id)
 
     def run(self, task_config):
         # Tasks are dynamically added and removed from running_tasks and
@@ -97,7 +95,14 @@ class TimeoutExecutor(TaskExecutor):
             deadline=task_config.timeout + time.time()
         )
         with self.tasks_lock:
+            self._drop_stale_deadlines()
+            # the timeout loop is already waiting for a deadline that is no
+            # later than this one
+            is_next_deadline = not self._deadlines or \
+                new_entry.deadline < self._deadlines[0][0]
             self._insert_new_running_task_entry(new_entry)
+        if is_next_deadline:
+            wake_pump(self.src_queue)
 
         self.downstream_executor.run(task_config)
 
@@ -106,27 +111,42 @@ class TimeoutExecutor(TaskExecutor):
 
     def kill(self, task_id):
         with self.tasks_lock:
-            for idx, entry in enumerate(self.running_tasks):
-                if task_id == entry.task_id:
-                    log.info('Killing task {}: requested'.format(task_id))
-                    result = self.downstream_executor.kill(task_id)
-                    if result is not False:
-                        self.running_tasks.pop(idx)
-                        self.killed_tasks.append(task_id)
-                    return result
+            if task_id in self.running_tasks:
+                log.info('Killing task {}: requested'.format(task_id))
+                result = self.downstream_executor.kill(task_id)
+                if result is not False:
+                    self._remove_running_task(task_id)
+                    self.killed_tasks.add(task_id)
+                return result
 
     def stop(self):
         self.downstream_executor.stop()
         self.stopping = True
+        wake_pump(self.src_queue)
         self.timeout_thread.join()
 
     def get_event_queue(self):
         return self.dest_queue
 
     def _insert_new_running_task_entry(self, new_entry):
-        # Insertion sort for task entries in self.running_tasks
-        for idx, entry in enumerate(self.running_tasks):
-            if new_entry.deadline <= entry.deadline:
-                self.running_tasks.insert(idx, new_entry)
+        self.running_tasks[new_entry.task_id] = new_entry.deadline
+        heapq.heappush(self._deadlines, (new_entry.deadline, new_entry.task_id))
+
+    def _remove_running_task(self, task_id):
+        if self.running_tasks.pop(task_id, None) is None:
+            return
+        # Rebuild the heap once it's mostly stale entries, so that tasks
+        # finishing long before their deadline don't make it grow unbounded
+        if len(self._deadlines) > 2 * len(self.running_tasks) + 64:
+            self._deadlines = [
+                (deadline, task_id)
+                for task_id, deadline in self.running_tasks.items()
+            ]
+            heapq.heapify(self._deadlines)
+
+    def _drop_stale_deadlines(self):
+        while self._deadlines:
+            deadline, task_id = self._deadlines[0]
+            if self.running_tasks.get(task_id) == deadline:
                 return
-        self.running_tasks.append(new_entry)
+            heapq.heappop(self._deadlines)
@@ -1,111 +1,329 @@
+import threading
 import time
+from collections import OrderedDict
+from typing import Any
 from typing import List
+from typing import Tuple
+from typing import Type
 
 import addict
+from pyrsistent import PMap
+from pyrsistent import PVector
 from pyrsistent import thaw
 
 from task_processing.interfaces.event import Event
-from task_processing.interfaces.event import task_event
+from task_processing.interfaces.event import trusted_task_event
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
 
 # https://github.com/apache/mesos/blob/master/include/mesos/mesos.proto
 
+TASK_INFO_TEMPLATES_SIZE = 1024
 
-def make_mesos_container_info(task_config: MesosTaskConfig) -> addict.Dict:
-    container_info = addict.Dict(
+# addict.Dict, or dict to build plain dicts for a driver run with
+# use_addict=False
+DictClass = Type[dict]
+
+
+def make_mesos_container_info(
+    task_config: MesosTaskConfig,
+    dict_cls: DictClass = addict.Dict,
+) -> addict.Dict:
+    container_info = dict_cls(
         type=task_config.containerizer,
         volumes=thaw(task_config.volumes),
     )
-    port_mappings = [addict.Dict(
-        host_port=task_config.ports[0]['begin'], container_port=8888)]
-    if container_info.type == 'DOCKER':
-        container_info.docker = addict.Dict(
+    port_mappings = _make_port_mappings(task_config.ports, dict_cls)
+    if container_info['type'] == 'DOCKER':
+        container_info['docker'] = dict_cls(
             image=task_config.image,
             network='BRIDGE',
             port_mappings=port_mappings,
             parameters=thaw(task_config.docker_parameters),
             force_pull_image=(not task_config.use_cached_image),
         )
-    elif container_info.type == 'MESOS':
-        container_info.network_infos = addict.Dict(port_mappings=port_mappings)
+    elif container_info['type'] == 'MESOS':
+        container_info['network_infos'] = dict_cls(port_mappings=port_mappings)
         # For this to work, image_providers needs to be set to 'docker' on mesos agents (as opposed
         # to 'appc' or 'oci'; we're still running docker images, we're just
         # using the UCR to do it).
         if 'image' in task_config:
-            container_info.mesos.image = addict.Dict(
+            container_info['mesos'] = dict_cls(image=dict_cls(
                 type='DOCKER',  # not 'APPC' or 'OCI'
-                docker=addict.Dict(name=task_config.image),
+                docker=dict_cls(name=task_config.image),
                 cached=task_config.use_cached_image,
-            )
+            ))
     return container_info
 
 
+def _make_port_mappings(ports: PVector, dict_cls: DictClass) -> List[addict.Dict]:
+    # The first port is the task's main port, which always listens on 8888
+    # in the container. Any other ports are mapped to the same port in the
+    # container.
+    host_ports = [
+        port
+        for port_range in ports
+        for port in range(port_range['begin'], port_range['end'] + 1)
+    ]
+    return [
+        dict_cls(
+            host_port=host_port,
+            container_port=8888 if idx == 0 else host_port,
+        )
+        for idx, host_port in enumerate(host_ports)
+    ]
+
+
 def make_mesos_resources(
     task_config: MesosTaskConfig,
     role: str,
+    dict_cls: DictClass = addict.Dict,
 ) -> List[addict.Dict]:
+    if task_config.resources_by_role:
+        return [
+            resource
+            for resource_role, resources in sorted(task_config.resources_by_role.items())
+            for resource in _make_role_resources(resources, resource_role, dict_cls)
+        ]
+
     return [
-        addict.Dict(
+        dict_cls(
             name='cpus',
             type='SCALAR',
             role=role,
-            scalar=addict.Dict(value=task_config.cpus),
+            scalar=dict_cls(value=task_config.cpus),
         ),
-        addict.Dict(
+        dict_cls(
             name='mem',
             type='SCALAR',
             role=role,
-            scalar=addict.Dict(value=task_config.mem)
+            scalar=dict_cls(value=task_config.mem)
         ),
-        addict.Dict(
+        dict_cls(
             name='disk',
             type='SCALAR',
             role=role,
-            scalar=addict.Dict(value=task_config.disk)
+            scalar=dict_cls(value=task_config.disk)
         ),
-        addict.Dict(
+        dict_cls(
             name='gpus',
             type='SCALAR',
             role=role,
-            scalar=addict.Dict(value=task_config.gpus)
+            scalar=dict_cls(value=task_config.gpus)
         ),
-        addict.Dict(
+        dict_cls(
             name='ports',
             type='RANGES',
             role=role,
-            ranges=addict.Dict(range=thaw(task_config.ports)),
+            ranges=dict_cls(range=thaw(task_config.ports)),
         ),
     ]
 
 
-def make_mesos_command_info(task_config: MesosTaskConfig) -> addict.Dict:
-    return addict.Dict(
+def _make_role_resources(
+    resources: PMap,
+    role: str,
+    dict_cls: DictClass,
+) -> List[addict.Dict]:
+    """ The non-empty resources taken from one role (see
+    `MesosTaskConfig.resources_by_role`)
+    """
+    role_resources = [
+        dict_cls(
+            name=rname,
+            type='SCALAR',
+            role=role,
+            scalar=dict_cls(value=resources[rname]),
+        )
+        for rname in ('cpus', 'mem', 'disk', 'gpus')
+        if resources[rname] > 0
+    ]
+    if resources['ports']:
+        role_resources.append(dict_cls(
+            name='ports',
+            type='RANGES',
+            role=role,
+            ranges=dict_cls(range=thaw(resources['ports'])),
+        ))
+    return role_resources
+
+
+def make_mesos_command_info(
+    task_config: MesosTaskConfig,
+    dict_cls: DictClass = addict.Dict,
+) -> addict.Dict:
+    return dict_cls(
         value=task_config.cmd,
-        uris=[addict.Dict(value=uri, extract=False)
+        uris=[dict_cls(value=uri, extract=False)
               for uri in task_config.uris],
-        environment=make_task_environment_variables(task_config=task_config),
+        environment=make_task_environment_variables(
+            task_config=task_config,
+            dict_cls=dict_cls,
+        ),
     )
 
 
-def make_task_environment_variables(task_config: MesosTaskConfig) -> addict.Dict:
+def make_task_environment_variables(
+    task_config: MesosTaskConfig,
+    dict_cls: DictClass = addict.Dict,
+) -> addict.Dict:
     env = dict(task_config.environment.items())
     env['MESOS_TASK_ID'] = task_config.task_id  # type: ignore
-    return addict.Dict(variables=[addict.Dict(name=k, value=v) for k, v in env.items()])
+    return dict_cls(variables=[dict_cls(name=k, value=v) for k, v in env.items()])
+
+
+def _shallow_dict(dict_cls: DictClass, *args, **kwargs) -> addict.Dict:
+    # addict.Dict(...) would copy every nested dict and list as well
+    d = dict_cls()
+    dict.update(d, *args, **kwargs)
+    return d
+
+
+class _TaskInfoTemplate:
+    """ The parts of a TaskInfo that are the same for every task built from
+    the same config, whatever its task_id and ports
+    """
+    __slots__ = (
+        'sources', 'dict_cls', 'container', 'resources', 'ports_idx', 'command',
+        'task_id_idx',
+    )
+
+    def __init__(
+        self,
+        sources: Tuple[Any, ...],
+        dict_cls: DictClass,
+        task_info: addict.Dict,
+    ) -> None:
+        # the fields the template was keyed on by identity, so that they
+        # outlive it
+        self.sources = sources
+        self.dict_cls = dict_cls
+        self.container = task_info['container']
+        self.resources = task_info['resources']
+        self.ports_idx = next(
+            idx for idx, resource in enumerate(self.resources)
+            if resource['name'] == 'ports'
+        )
+        self.command = task_info['command']
+        self.task_id_idx = next(
+            idx for idx, variable in enumerate(self.command['environment']['variables'])
+            if variable['name'] == 'MESOS_TASK_ID'
+        )
+
+    def make_task_info(self, task_config: MesosTaskConfig, agent_id: str) -> addict.Dict:
+        dict_cls = self.dict_cls
+        task_id = task_config.task_id
+
+        container = _shallow_dict(dict_cls, self.container)
+        port_mappings = _make_port_mappings(task_config.ports, dict_cls)
+        if container['type'] == 'DOCKER':
+            container['docker'] = _shallow_dict(
+                dict_cls, container['docker'], port_mappings=port_mappings,
+            )
+        elif container['type'] == 'MESOS':
+            container['network_infos'] = _shallow_dict(dict_cls, port_mappings=port_mappings)
+
+        resources = list(self.resources)
+        resources[self.ports_idx] = _shallow_dict(
+            dict_cls,
+            resources[self.ports_idx],
+            ranges=dict_cls(range=thaw(task_config.ports)),
+        )
+
+        command = _shallow_dict(dict_cls, self.command)
+        variables = list(command['environment']['variables'])
+        variables[self.task_id_idx] = dict_cls(name='MESOS_TASK_ID', value=task_id)
+        command['environment'] = _shallow_dict(dict_cls, variables=variables)
+
+        return _shallow_dict(
+            dict_cls,
+            task_id=dict_cls(value=task_id),
+            agent_id=dict_cls(value=agent_id),
+            name=f'executor-{task_id}',
+            resources=resources,
+            command=command,
+            container=container,
+        )
+
+
+# key -> _TaskInfoTemplate, least recently used first
+_task_info_templates: 'OrderedDict[Tuple[Any, ...], _TaskInfoTemplate]' = OrderedDict()
+_task_info_templates_lock = threading.Lock()
 
 
 def make_mesos_task_info(
     task_config: MesosTaskConfig,
     agent_id: str,
     role: str,
+    dict_cls: DictClass = addict.Dict,
 ) -> addict.Dict:
+    """ Build the TaskInfo protobuf to launch a task with
+
+    Most tasks in a batch share everything but their task_id and ports, so
+    the rest of the TaskInfo is built once per (config, role) and kept as a
+    template; each launch only fills in the task_id, agent_id and ports.
+    TaskInfos built from the same template share the parts that aren't
+    filled in, which must not be changed.
+
+    :param dict_cls: the type of the messages built, `dict` to build plain
+        dicts for a driver run with `use_addict=False`
+    """
+    if task_config.resources_by_role:
+        return _make_mesos_task_info(task_config, agent_id, role, dict_cls)
+
+    # The pyrsistent fields are compared by identity: tasks made from the
+    # same config share them, and their contents may not be hashable.
+    sources = (
+        task_config.volumes,
+        task_config.docker_parameters,
+        task_config.uris,
+        task_config.environment,
+    )
+    key = (
+        dict_cls,
+        role,
+        task_config.containerizer,
+        task_config.get('image'),
+        task_config.use_cached_image,
+        task_config.cmd,
+        task_config.cpus,
+        task_config.mem,
+        task_config.disk,
+        task_config.gpus,
+    ) + tuple(id(source) for source in sources)
+
+    with _task_info_templates_lock:
+        template = _task_info_templates.get(key)
+        if template is not None:
+            _task_info_templates.move_to_end(key)
+    if template is None or any(
+        cached is not source for cached, source in zip(template.sources, sources)
+    ):
+        template = _TaskInfoTemplate(
+            sources,
+            dict_cls,
+            _make_mesos_task_info(task_config, agent_id, role, dict_cls),
+        )
+        with _task_info_templates_lock:
+            _task_info_templates[key] = template
+            if len(_task_info_templates) > TASK_INFO_TEMPLATES_SIZE:
+                _task_info_templates.popitem(last=False)
+
+    return template.make_task_info(task_config, agent_id)
 
-    container_info = make_mesos_container_info(task_config)
-    resources = make_mesos_resources(task_config, role)
-    command_info = make_mesos_command_info(task_config)
 
-    return addict.Dict(
-        task_id=addict.Dict(value=task_config.task_id),
-        agent_id=addict.Dict(value=agent_id),
+def _make_mesos_task_info(
+    task_config: MesosTaskConfig,
+    agent_id: str,
+    role: str,
+    dict_cls: DictClass = addict.Dict,
+) -> addict.Dict:
+    container_info = make_mesos_container_info(task_config, dict_cls)
+    resources = make_mesos_resources(task_config, role, dict_cls)
+    command_info = make_mesos_command_info(task_config, dict_cls)
+
+    return dict_cls(
+        task_id=dict_cls(value=task_config.task_id),
+        agent_id=dict_cls(value=agent_id),
         name=f'executor-{task_config.task_id}',
         resources=resources,
         command=command_info,
@@ -155,5 +373,5 @@ def mesos_update_to_event(mesos_status: addict.Dict, task_config: MesosTaskConfi
         task_config=task_config,
         timestamp=time.time(),
     )
-    kwargs.update(MESOS_STATUS_MAP[mesos_status.state])
-    return task_event(**kwargs)
+    kwargs.update(MESOS_STATUS_MAP[mesos_status['state']])
+    return trusted_task_event(**kwargs)
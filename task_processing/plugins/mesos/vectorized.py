@@ -0,0 +1,117 @@
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from task_processing.plugins.mesos.constraints import constraints_checker
+from task_processing.plugins.mesos.resource_helpers import allocate_task_resources
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+try:
+    import numpy as np
+    NUMPY_ENABLED = True
+except ImportError:
+    NUMPY_ENABLED = False
+
+RESOURCE_NAMES = ('cpus', 'mem', 'disk', 'gpus')
+
+
+class VectorizedOfferMatcher:
+    """ A drop-in replacement for `get_tasks_for_offer` that evaluates
+    resource fit with NumPy
+
+    The requested resources of the tasks, and the number of ports they need,
+    are packed into one contiguous (tasks x resources) array, and the tasks
+    that fit what is left of the offer are found with a single comparison
+    against it. As in `get_tasks_for_offer`, tasks are considered in order
+    and each launched task uses up part of the offer; since the offer only
+    shrinks, a task that didn't fit earlier can never fit later, so the fit
+    mask only has to be recomputed for the tasks after the last one
+    launched. Constraints are still checked in Python, but only for the
+    tasks that fit.
+
+    Reading resources out of a task config is the expensive part, so the
+    array is reused as is when the same tasks are passed in again, and each
+    task's row is kept for as long as the task keeps being passed in. Not
+    thread-safe; the ExecutionFramework calls it with its lock held.
+    """
+
+    def __init__(self) -> None:
+        # id(task_config) -> (task_config, requested resources)
+        self._rows: Dict[int, Tuple[MesosTaskConfig, Tuple[float, ...]]] = {}
+        self._task_configs: List[MesosTaskConfig] = []
+        self._requested = np.zeros((0, len(RESOURCE_NAMES) + 1))
+
+    def _requested_resources(self, task_configs: List[MesosTaskConfig]) -> 'np.ndarray':
+        if len(task_configs) == len(self._task_configs) and all(
+            task_config is cached
+            for task_config, cached in zip(task_configs, self._task_configs)
+        ):
+            return self._requested
+
+        rows = {}
+        for task_config in task_configs:
+            row = self._rows.get(id(task_config))
+            # ids can be reused once a task config is gone
+            if row is None or row[0] is not task_config:
+                row = (
+                    task_config,
+                    tuple(task_config[rname] for rname in RESOURCE_NAMES) +
+                    (task_config.num_ports,),
+                )
+            rows[id(task_config)] = row
+        self._rows = rows
+
+        self._task_configs = list(task_configs)
+        self._requested = np.array(
+            [rows[id(task_config)][1] for task_config in task_configs],
+            dtype=np.float64,
+        ).reshape(len(task_configs), len(RESOURCE_NAMES) + 1)
+        return self._requested
+
+    def __call__(
+        self,
+        task_configs: Iterable[MesosTaskConfig],
+        offer_resources: ResourceSet,
+        offer_attributes: dict,
+        role: str,
+    ) -> List[MesosTaskConfig]:
+        """ :returns: the tasks to launch, exactly as `get_tasks_for_offer`
+            would
+        """
+        # the whole batch goes into one array
+        task_configs = list(task_configs)
+        requested = self._requested_resources(task_configs)
+        tasks_to_launch = []
+        constraints_match = constraints_checker(offer_attributes)
+
+        start = 0
+        while start < len(task_configs):
+            available = np.array(
+                [
+                    offer_resources.cpus,
+                    offer_resources.mem,
+                    offer_resources.disk,
+                    offer_resources.gpus,
+                    offer_resources.num_ports,
+                ],
+                dtype=np.float64,
+            )
+            fitting = start + np.flatnonzero(
+                (requested[start:] <= available).all(axis=1))
+            for idx in fitting:
+                task_config = task_configs[idx]
+                if constraints_match(task_config.constraints):
+                    break
+            else:
+                break
+
+            prepared_task_config, offer_resources = allocate_task_resources(
+                task_config,
+                offer_resources,
+            )
+            tasks_to_launch.append(prepared_task_config)
+            start = int(idx) + 1
+
+        return tasks_to_launch
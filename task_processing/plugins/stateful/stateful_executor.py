@@ -3,6 +3,7 @@ import threading
 import traceback
 from queue import Queue
 
+from task_processing.interfaces.event import compact_event
 from task_processing.interfaces.task_executor import TaskExecutor
 
 log = logging.getLogger(__name__)
@@ -12,8 +13,15 @@ class StatefulTaskExecutor(TaskExecutor):
     """
     """
 
-    def __init__(self, downstream_executor, persister):
+    def __init__(self, downstream_executor, persister, compact_events=None):
+        """
+        :param compact_events: once persisted, pass events on as
+            CompactEvents, with this raw policy (see `compact_event`),
+            instead of as Events. Only for consumers that just read events:
+            CompactEvents can't be updated by executors wrapping this one.
+        """
         self.downstream_executor = downstream_executor
+        self.compact_events = compact_events
         self.writer_queue = Queue()
         self.queue_for_processed_events = Queue()
         self.persister = persister
@@ -51,5 +59,7 @@ class StatefulTaskExecutor(TaskExecutor):
                 self.persister.write(event=result)
             except Exception:
                 log.error(traceback.format_exc())
+            if self.compact_events is not None:
+                result = compact_event(result, raw=self.compact_events)
             self.queue_for_processed_events.put(result)
             self.downstream_executor.get_event_queue().task_done()
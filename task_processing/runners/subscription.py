@@ -2,14 +2,20 @@ from queue import Empty
 from queue import Full
 from threading import Thread
 
+from task_processing.interfaces.event import compact_event
 from task_processing.interfaces.runner import Runner
 
 
 class Subscription(Runner):
-    def __init__(self, executor, queue):
+    def __init__(self, executor, queue, compact_events=None):
+        """
+        :param compact_events: put events on the queue as CompactEvents,
+            with this raw policy (see `compact_event`), instead of as Events
+        """
         self.executor = executor
         self.TASK_CONFIG_INTERFACE = executor.TASK_CONFIG_INTERFACE
         self.event_queue = queue
+        self.compact_events = compact_events
         self.stopping = False
         self.producer_t = Thread(target=self.event_producer)
         self.producer_t.daemon = True
@@ -22,6 +28,8 @@ class Subscription(Runner):
                 return
             try:
                 event = executor_queue.get(block=True, timeout=1)
+                if self.compact_events is not None:
+                    event = compact_event(event, raw=self.compact_events)
                 self.event_queue.put(event, False)
             except Empty:
                 pass
@@ -1,10 +1,19 @@
+import sys
+
+import mock
 import pytest
 from pyrsistent import InvariantException
 from pyrsistent import pmap
 from pyrsistent import PRecord
 from pyrsistent import PTypeError
 
+from task_processing.interfaces import event as event_module
+from task_processing.interfaces.event import compact_event
+from task_processing.interfaces.event import CompactEvent
 from task_processing.interfaces.event import Event
+from task_processing.interfaces.event import task_event
+from task_processing.interfaces.event import trusted_set
+from task_processing.interfaces.event import trusted_task_event
 
 
 @pytest.fixture
@@ -55,3 +64,121 @@ def test_event_optional_attributes(event):
     assert event.terminal is False
     assert event.timestamp == 0.0
     assert event.task_id == "123"
+
+
+def test_unvalidated_events_supported():
+    # If this fails, pyrsistent changed the PRecord internals that trusted
+    # events are built with, and they're validated like any other: update
+    # task_processing.interfaces.event._unvalidated_event for the new
+    # version.
+    assert event_module._UNVALIDATED_EVENTS_SUPPORTED, (
+        'pyrsistent internals changed: trusted events are no longer fast')
+
+
+def test_trusted_events_validated_without_pyrsistent_internals():
+    with mock.patch.object(event_module, '_UNVALIDATED_EVENTS_SUPPORTED', False):
+        trusted = trusted_task_event(task_id='123', task_config=pmap())
+        assert trusted == task_event(task_id='123', task_config=pmap())
+        assert trusted_set(trusted, task_id='456').task_id == '456'
+        with pytest.raises(PTypeError):
+            trusted_set(trusted, task_id=456)
+
+
+def test_trusted_task_event_matches_task_event():
+    # trusted events are built with pyrsistent internals, so check every
+    # field against a validated event
+    kwargs = dict(
+        kind='task',
+        task_id='123',
+        task_config=pmap({'name': 'foo'}),
+        timestamp=1.0,
+        raw=object(),
+        extensions=pmap({'a': 'b'}),
+        terminal=True,
+        success=False,
+        platform_type='failed',
+        message='stop',
+    )
+    assert set(kwargs) == set(Event._precord_fields)
+
+    trusted = trusted_task_event(**kwargs)
+    validated = task_event(**kwargs)
+
+    assert type(trusted) is Event
+    assert trusted == validated
+    assert hash(trusted) == hash(validated)
+    for name in kwargs:
+        assert getattr(trusted, name) == getattr(validated, name)
+        assert type(getattr(trusted, name)) is type(getattr(validated, name))
+
+
+def test_trusted_task_event_defaults_match_task_event():
+    trusted = trusted_task_event(task_id='123', task_config=pmap())
+    validated = task_event(task_id='123', task_config=pmap())
+
+    assert trusted == validated
+    for name in Event._precord_fields:
+        assert getattr(trusted, name) == getattr(validated, name)
+
+
+def test_trusted_set_matches_set(event):
+    trusted = trusted_set(event, task_id='foo', extensions=pmap({'a': 'b'}))
+    assert isinstance(trusted, Event)
+    assert trusted == event.set(task_id='foo', extensions=pmap({'a': 'b'}))
+    assert event.task_id == '123'
+
+
+def test_trusted_event_still_validated_afterwards(event):
+    trusted = trusted_task_event(task_id='123')
+    with pytest.raises(PTypeError):
+        trusted.set(task_id=123)
+
+
+@pytest.fixture
+def status_event():
+    return task_event(
+        task_id='123',
+        task_config=pmap({'name': 'foo'}),
+        timestamp=1.0,
+        raw={'state': 'TASK_RUNNING', 'offer': {'id': {'value': 'o1'}}},
+        platform_type=''.join(['run', 'ning']),
+    )
+
+
+@pytest.mark.parametrize('raw,expected', [
+    ('keep', {'state': 'TASK_RUNNING', 'offer': {'id': {'value': 'o1'}}}),
+    ('lazy', {'state': 'TASK_RUNNING', 'offer': {'id': {'value': 'o1'}}}),
+    ('strip', None),
+    ('summary', {'state': 'TASK_RUNNING'}),
+    (lambda raw: raw['state'], 'TASK_RUNNING'),
+])
+def test_compact_event(status_event, raw, expected):
+    compact = compact_event(status_event, raw=raw)
+    assert isinstance(compact, CompactEvent)
+    assert compact.raw == expected
+    assert compact.task_id == '123'
+    assert compact.platform_type is sys.intern('running')
+    assert compact.to_event() == status_event.set(raw=expected)
+
+
+def test_compact_event_lazy_raw(status_event):
+    compact = compact_event(status_event, raw='lazy')
+    assert compact._raw is None
+    assert compact._packed_raw is not None
+
+    raw = compact.raw
+    assert raw == status_event.raw
+    # unpickled once, then kept
+    assert compact._packed_raw is None
+    assert compact.raw is raw
+
+
+def test_compact_event_lazy_raw_unpicklable(status_event):
+    status_event = status_event.set(raw=lambda: None)
+    compact = compact_event(status_event, raw='lazy')
+    assert compact.raw is status_event.raw
+
+
+def test_compact_event_unknown_raw_policy(status_event):
+    with pytest.raises(ValueError):
+        compact_event(status_event, raw='everything')
@@ -1,9 +1,13 @@
+import mock
 import pytest
 from pyrsistent import m
+from pyrsistent import v
 
 from task_processing.plugins.mesos.constraints import \
     attributes_match_constraints
+from task_processing.plugins.mesos.constraints import compile_constraints
 from task_processing.plugins.mesos.constraints import Constraint
+from task_processing.plugins.mesos.constraints import constraints_checker
 
 
 @pytest.fixture
@@ -289,3 +293,41 @@ def test_constraints_all_not_match(fake_dict):
             ),
         ],
     )
+
+
+@pytest.mark.parametrize('operator,value,expected', [
+    ('==', 'fake_region_text', True),
+    ('!=', 'fake_region_text', False),
+    ('LIKE', 'fake_.*_text', True),
+    ('LIKE', 'fake_', False),
+    ('UNLIKE', 'fake_.*_text', False),
+    ('UNLIKE', 'fake_', True),
+])
+def test_compile_constraints(fake_dict, operator, value, expected):
+    constraints = [
+        Constraint(attribute='region', operator=operator, value=value),
+        Constraint(attribute='missing', operator='==', value='anything'),
+    ]
+
+    assert compile_constraints(constraints)(fake_dict) is expected
+    assert attributes_match_constraints(fake_dict, constraints) is expected
+
+
+def test_compile_constraints_is_shared(fake_dict):
+    constraints = [Constraint(attribute='region', operator='LIKE', value='fake.*')]
+
+    assert compile_constraints(constraints) is compile_constraints(list(constraints))
+
+
+def test_constraints_checker_evaluates_each_set_once(fake_dict):
+    constraints = v(Constraint(attribute='region', operator='==', value='fake_region_text'))
+    other_constraints = v(Constraint(attribute='pool', operator='==', value='other_pool'))
+    attributes = mock.Mock(wraps=fake_dict)
+    check = constraints_checker(attributes)
+
+    assert check(v())
+    assert check(constraints)
+    assert check(v(*constraints))
+    assert not check(other_constraints)
+    assert not check(other_constraints)
+    assert attributes.get.call_count == 2
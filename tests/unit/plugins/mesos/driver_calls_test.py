@@ -0,0 +1,77 @@
+import mock
+import pytest
+
+from task_processing.plugins.mesos.driver_calls import DriverCallSender
+
+
+@pytest.fixture
+def driver_error():
+    return object()
+
+
+@pytest.fixture
+def call_driver():
+    return mock.Mock(return_value=None)
+
+
+@pytest.fixture
+def sender(call_driver, driver_error):
+    return DriverCallSender(call_driver, driver_error)
+
+
+def test_flush_sends_calls_in_order(sender, call_driver):
+    sender.put('launchTasks', 'offer', ['task'])
+    sender.put('acknowledgeStatusUpdate', 'update')
+
+    assert call_driver.call_count == 0
+    assert len(sender) == 2
+
+    sender.flush()
+
+    assert call_driver.call_args_list == [
+        mock.call('launchTasks', 'offer', ['task']),
+        mock.call('acknowledgeStatusUpdate', 'update'),
+    ]
+    assert len(sender) == 0
+
+
+def test_flush_coalesces_adjacent_declines(sender, call_driver):
+    filters = {'refuse_seconds': 10}
+    other_filters = {'refuse_seconds': 1}
+    sender.decline(['offer1'], filters)
+    sender.decline(['offer2'], filters)
+    sender.put('acknowledgeStatusUpdate', 'update')
+    sender.decline(['offer3', 'offer4'], filters)
+    sender.decline(['offer5'], other_filters)
+    sender.decline(['offer6'], filters)
+
+    assert len(sender) == 5
+    sender.flush()
+
+    # declines stay where they were queued relative to the other calls
+    assert call_driver.call_args_list == [
+        mock.call('declineOffer', ['offer1', 'offer2'], filters),
+        mock.call('acknowledgeStatusUpdate', 'update'),
+        mock.call('declineOffer', ['offer3', 'offer4'], filters),
+        mock.call('declineOffer', ['offer5'], other_filters),
+        mock.call('declineOffer', ['offer6'], filters),
+    ]
+
+
+def test_flush_calls_on_error(sender, call_driver, driver_error):
+    call_driver.return_value = driver_error
+    on_error = mock.Mock()
+    sender.put('launchTasks', 'offer', ['task'], on_error=on_error)
+
+    sender.flush()
+
+    assert on_error.call_count == 1
+
+
+def test_run_sends_pending_calls_when_stopped(sender, call_driver):
+    sender.put('acknowledgeStatusUpdate', 'update')
+    sender.stop()
+
+    sender.run()
+
+    assert call_driver.call_args == mock.call('acknowledgeStatusUpdate', 'update')
@@ -0,0 +1,78 @@
+import threading
+import time
+from queue import Queue
+
+import mock
+
+from task_processing.plugins.mesos.event_pipeline import pump_events
+from task_processing.plugins.mesos.event_pipeline import wake_pump
+
+
+def test_pump_events_handles_queued_events_before_stopping():
+    src_queue = Queue()
+    for event in ('a', 'b', 'c'):
+        src_queue.put(event)
+    handled = []
+
+    pump_events(src_queue, handled.append, lambda: True)
+
+    assert handled == ['a', 'b', 'c']
+
+
+def test_pump_events_checks_timers_after_every_event():
+    src_queue = Queue()
+    src_queue.put('a')
+    src_queue.put('b')
+    on_deadline = mock.Mock()
+
+    pump_events(
+        src_queue,
+        mock.Mock(),
+        lambda: True,
+        next_deadline=lambda: None,
+        on_deadline=on_deadline,
+    )
+
+    assert on_deadline.call_count == 2
+
+
+def test_pump_events_wakes_up_for_timers():
+    src_queue = Queue()
+    deadlines = [time.time() + 0.01]
+    stopping = threading.Event()
+
+    def on_deadline(now):
+        if deadlines and deadlines[0] <= now:
+            deadlines.pop()
+            stopping.set()
+
+    thread = threading.Thread(target=pump_events, args=(
+        src_queue,
+        mock.Mock(),
+        stopping.is_set,
+        lambda: deadlines[0] if deadlines else None,
+        on_deadline,
+    ))
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert not deadlines
+
+
+def test_wake_pump_stops_a_waiting_pump():
+    src_queue = Queue()
+    stopping = threading.Event()
+    handle_event = mock.Mock()
+    thread = threading.Thread(
+        target=pump_events, args=(src_queue, handle_event, stopping.is_set),
+    )
+    thread.start()
+
+    stopping.set()
+    wake_pump(src_queue)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert handle_event.call_count == 0
+    src_queue.join()
@@ -1,6 +1,7 @@
+import functools
+import json
 import socket
 import time
-from queue import Queue
 
 import mock
 import pytest
@@ -12,12 +13,32 @@ from task_processing.plugins.mesos.constraints import attributes_match_constrain
 from task_processing.plugins.mesos.execution_framework import ExecutionFramework
 from task_processing.plugins.mesos.execution_framework import TaskMetadata
 from task_processing.plugins.mesos.mesos_executor import MesosExecutorCallbacks
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.pending_tasks import FairTaskQueue
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
+from task_processing.plugins.mesos.translator import make_mesos_task_info
+from task_processing.plugins.mesos.translator import mesos_update_to_event
+
+
+def mock_matcher(result):
+    """ A mock offer matching callback that remembers the candidates it was
+    given; they are iterated lazily, so they must be read during the call
+    """
+    def match(task_configs, *args):
+        matcher.candidates.append(list(task_configs))
+        return result
+
+    matcher = mock.Mock(side_effect=match)
+    matcher.candidates = []
+    return matcher
 
 
 @pytest.fixture
 def ef(mock_Thread):
-    return ExecutionFramework("fake_name", "fake_role", mock.Mock(), 240)
+    ef = ExecutionFramework("fake_name", "fake_role", mock.Mock(), 240)
+    # don't hold offers for the initial decline delay
+    ef.decline_after = 0
+    return ef
 
 
 @pytest.fixture
@@ -41,19 +62,9 @@ def mock_time():
         yield mock_time
 
 
-@pytest.fixture
-def mock_sleep(ef):
-    def stop_killing(task_id):
-        ef.stopping = True
-
-    with mock.patch.object(time, 'sleep', side_effect=stop_killing) as mock_sleep:
-        yield mock_sleep
-
-
 def test_ef_kills_stuck_tasks(
     ef,
     fake_task,
-    mock_sleep,
     mock_get_metric
 ):
     task_id = fake_task.task_id
@@ -66,11 +77,11 @@ def test_ef_kills_stuck_tasks(
     ef.task_staging_timeout_s = 0
     ef.kill_task = mock.Mock()
     ef.blacklist_slave = mock.Mock()
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef._update_task_metadata(task_id, task_metadata)
     ef.callbacks = MesosExecutorCallbacks(
         mock.Mock(), mock.Mock(), mock.Mock())
 
-    ef._background_check()
+    ef._run_background_check()
 
     assert ef.kill_task.call_count == 1
     assert ef.kill_task.call_args == mock.call(task_id)
@@ -91,7 +102,6 @@ def test_ef_kills_stuck_tasks(
 def test_reenqueue_tasks_stuck_in_unknown_state(
     ef,
     fake_task,
-    mock_sleep,
     mock_get_metric
 ):
     task_id = fake_task.task_id
@@ -105,9 +115,9 @@ def test_reenqueue_tasks_stuck_in_unknown_state(
     ef.kill_task = mock.Mock()
     ef.blacklist_slave = mock.Mock()
     ef.enqueue_task = mock.Mock()
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef._update_task_metadata(task_id, task_metadata)
 
-    ef._background_check()
+    ef._run_background_check()
 
     assert ef.enqueue_task.call_count == 1
     assert ef.enqueue_task.call_args == mock.call(
@@ -187,16 +197,41 @@ def test_kill_task(ef, mock_driver):
     )
 
 
-def test_kill_task_from_task_queue(ef, mock_driver):
+def test_kill_task_from_task_queue(ef, fake_task, mock_driver):
     ef.driver = mock_driver
-    ef.task_queue = Queue()
-    ef.task_queue.put(mock.Mock(task_id='fake_task_id'))
-    ef.task_queue.put(mock.Mock(task_id='fake_task_id1'))
+    fake_task_2 = fake_task.set(name='fake_name_2')
+    ef.task_queue.put(fake_task)
+    ef.task_queue.put(fake_task_2)
 
-    ef.kill_task('fake_task_id')
+    ef.kill_task(fake_task.task_id)
 
     assert mock_driver.killTask.call_count == 0
     assert ef.task_queue.qsize() == 1
+    assert fake_task_2.task_id in ef.task_queue
+
+
+def test_kill_tasks(ef, fake_task, mock_driver):
+    ef._driver = mock_driver
+    mock_driver.killTask.side_effect = [None, Exception('boom')]
+    queued_tasks = [fake_task.set(name=f'queued_{i}') for i in range(3)]
+    for task in queued_tasks:
+        ef.enqueue_task(task)
+
+    results = ef.kill_tasks(
+        [t.task_id for t in queued_tasks[:2]] + ['running', 'unreachable'])
+
+    assert results == {
+        queued_tasks[0].task_id: True,
+        queued_tasks[1].task_id: True,
+        'running': True,
+        'unreachable': False,
+    }
+    assert list(ef.task_queue) == [queued_tasks[2]]
+    assert list(ef.task_metadata.keys()) == [queued_tasks[2].task_id]
+    assert mock_driver.killTask.call_args_list == [
+        mock.call(Dict(value='running')),
+        mock.call(Dict(value='unreachable')),
+    ]
 
 
 def test_blacklist_slave(
@@ -207,10 +242,11 @@ def test_blacklist_slave(
     agent_id = 'fake_agent_id'
     mock_time.return_value = 2.0
 
-    ef.blacklisted_slaves = ef.blacklisted_slaves.append(agent_id)
     ef.blacklist_slave(agent_id, timeout=2.0)
+    ef.blacklist_slave(agent_id, timeout=1.0)
 
-    assert agent_id in ef.blacklisted_slaves
+    assert ef.is_slave_blacklisted(agent_id)
+    assert ef.get_blacklisted_slaves() == {agent_id: 4.0}
     assert mock_get_metric.call_count == 1
     assert mock_get_metric.call_args == mock.call(
         metrics.BLACKLISTED_AGENTS_COUNT)
@@ -218,17 +254,38 @@ def test_blacklist_slave(
     assert mock_get_metric.return_value.count.call_args == mock.call(1)
 
 
+def test_blacklist_slave_refresh(ef, mock_time):
+    agent_id = 'fake_agent_id'
+    mock_time.return_value = 2.0
+    ef.blacklist_slave(agent_id, timeout=2.0)
+
+    mock_time.return_value = 3.0
+    ef.blacklist_slave(agent_id, timeout=2.0)
+    assert ef.get_blacklisted_slaves() == {agent_id: 5.0}
+
+    mock_time.return_value = 4.0
+    assert ef._run_background_check() == 5.0
+    assert ef.is_slave_blacklisted(agent_id)
+
+    mock_time.return_value = 5.0
+    ef._run_background_check()
+    assert not ef.is_slave_blacklisted(agent_id)
+    assert ef.blacklisted_slaves == {}
+    assert ef._blacklist_expiries == []
+
+
 def test_unblacklist_slave(
     ef,
     mock_time,
-    mock_sleep
 ):
     agent_id = 'fake_agent_id'
+    mock_time.return_value = 2.0
 
-    ef.blacklisted_slaves = ef.blacklisted_slaves.append(agent_id)
-    ef.unblacklist_slave(agent_id, timeout=0.0)
+    ef.blacklist_slave(agent_id, timeout=10.0)
+    ef.unblacklist_slave(agent_id)
 
-    assert agent_id not in ef.blacklisted_slaves
+    assert not ef.is_slave_blacklisted(agent_id)
+    assert ef.get_blacklisted_slaves() == {}
 
 
 def test_enqueue_task(
@@ -267,7 +324,9 @@ def test_initialize_metrics(ef):
         'task_processing.plugins.mesos.execution_framework.create_counter',
     ) as mock_create_counter, mock.patch(
         'task_processing.plugins.mesos.execution_framework.create_timer',
-    ) as mock_create_timer:
+    ) as mock_create_timer, mock.patch(
+        'task_processing.plugins.mesos.execution_framework.create_gauge',
+    ) as mock_create_gauge:
         ef._initialize_metrics()
 
         counters = [
@@ -299,6 +358,15 @@ def test_initialize_metrics(ef):
         for tmr in timers:
             mock_create_timer.assert_any_call(tmr, default_dimensions)
 
+        gauges = [
+            metrics.OFFER_CYCLE_TASKS_LAUNCHED,
+            metrics.OFFER_CYCLE_CPUS_UTILIZATION,
+            metrics.OFFER_CYCLE_MEM_UTILIZATION,
+        ]
+        assert mock_create_gauge.call_count == len(gauges)
+        for gauge in gauges:
+            mock_create_gauge.assert_any_call(gauge, default_dimensions)
+
 
 def test_slave_lost(ef, mock_driver):
     ef.slaveLost(mock_driver, 'fake_slave_id')
@@ -341,13 +409,12 @@ def test_resource_offers_launch(
         task_state='fake_state',
         task_state_history=m(fake_state=time.time(), TASK_INITED=time.time())
     )
-    fake_task_2 = mock.Mock()
-    ef.callbacks.get_tasks_for_offer = mock.Mock(
-        return_value=([fake_task], [fake_task_2]))
+    fake_task_2 = fake_task.set(name='fake_name_2')
+    ef.callbacks.get_tasks_for_offer = mock_matcher([fake_task])
 
     ef.task_queue.put(fake_task)
     ef.task_queue.put(fake_task_2)
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef.task_metadata[task_id] = task_metadata
     ef.resourceOffers(ef.driver, [fake_offer])
 
     assert ef.task_metadata[task_id].agent_id == 'fake_agent_id'
@@ -355,13 +422,72 @@ def test_resource_offers_launch(
     assert not ef.are_offers_suppressed
     assert mock_driver.declineOffer.call_count == 0
     assert mock_driver.launchTasks.call_count == 1
-    assert mock_get_metric.call_count == 4
+    assert ef.callbacks.get_tasks_for_offer.candidates == [[fake_task, fake_task_2]]
+    assert list(ef.task_queue) == [fake_task_2]
+    assert mock_get_metric.call_count == 7
     mock_get_metric.assert_any_call(metrics.OFFER_DELAY_TIMER)
     mock_get_metric.assert_any_call(metrics.TASK_LAUNCHED_COUNT)
     mock_get_metric.assert_any_call(metrics.TASK_QUEUED_TIME_TIMER)
     mock_get_metric.assert_any_call(metrics.TASK_INSUFFICIENT_OFFER_COUNT)
+    mock_get_metric.assert_any_call(metrics.OFFER_CYCLE_TASKS_LAUNCHED)
     assert mock_get_metric.return_value.record.call_count == 2
     assert mock_get_metric.return_value.count.call_count == 2
+    assert mock_get_metric.return_value.set.call_args_list == [
+        mock.call(1), mock.call(1.0), mock.call(1.0),
+    ]
+
+
+def test_resource_offers_fair_task_queue(mock_Thread, fake_task, fake_offer, mock_driver):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, task_queue=FairTaskQueue())
+    ef.decline_after = 0
+    burst = [fake_task.set(name='burst', uuid=f'burst{i}') for i in range(3)]
+    other_task = fake_task.set(name='other')
+    ef.callbacks.get_tasks_for_offer = mock_matcher([])
+    for task in burst + [other_task]:
+        ef.enqueue_task(task)
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    assert ef.callbacks.get_tasks_for_offer.candidates == [[
+        burst[0], other_task, burst[1], burst[2],
+    ]]
+
+
+def test_resource_offers_plain_dicts(mock_Thread, fake_task, fake_offer, mock_driver):
+    ef = ExecutionFramework(
+        'fake_name',
+        'fake_role',
+        MesosExecutorCallbacks(
+            get_tasks_for_offer,
+            mesos_update_to_event,
+            functools.partial(make_mesos_task_info, dict_cls=dict),
+        ),
+        240,
+        use_addict=False,
+    )
+    ef.decline_after = 0
+    plain_offer = json.loads(json.dumps(fake_offer))
+    ef.enqueue_task(fake_task)
+
+    ef.resourceOffers(mock_driver, [plain_offer])
+
+    assert mock_driver.launchTasks.call_count == 1
+    offer_id, task_infos = mock_driver.launchTasks.call_args[0]
+    assert offer_id == {'value': 'fake_offer_id'}
+    assert [type(task_info) for task_info in task_infos] == [dict]
+    assert task_infos[0]['agent_id'] == {'value': 'fake_agent_id'}
+    staging_event = ef.event_queue.get_nowait()
+    assert staging_event.platform_type == 'staging'
+    assert type(staging_event.raw) is dict
+
+    ef.statusUpdate(mock_driver, {
+        'task_id': {'value': fake_task.task_id},
+        'state': 'TASK_RUNNING',
+    })
+
+    assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_RUNNING'
+    assert ef.event_queue.get_nowait().platform_type == 'running'
 
 
 def test_resource_offers_launch_tasks_failed(
@@ -384,17 +510,19 @@ def test_resource_offers_launch_tasks_failed(
         task_state='fake_state',
         task_state_history=m(fake_state=time.time(), TASK_INITED=time.time())
     )
-    ef.callbacks.get_tasks_for_offer = mock.Mock(
-        return_value=([fake_task], []))
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[fake_task])
     ef.task_queue.put(fake_task)
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef.task_metadata[task_id] = task_metadata
     ef.resourceOffers(ef.driver, [fake_offer])
 
     assert mock_driver.suppressOffers.call_count == 0
     assert not ef.are_offers_suppressed
     assert mock_driver.declineOffer.call_count == 1
     assert mock_driver.launchTasks.call_count == 1
-    assert mock_get_metric.call_count == 3
+    assert mock_get_metric.call_count == 6
+    assert mock_get_metric.return_value.set.call_args_list == [
+        mock.call(0), mock.call(0.0), mock.call(0.0),
+    ]
     assert ef.task_metadata[task_id].task_state == 'UNKNOWN'
 
 
@@ -419,6 +547,23 @@ def test_resource_offers_no_tasks_to_launch(
     assert mock_get_metric.return_value.count.call_count == 0
 
 
+def test_resource_offers_holds_offers_before_decline_after(
+    ef,
+    fake_offer,
+    mock_driver,
+    mock_time,
+):
+    mock_time.return_value = 1000.0
+    ef.decline_after = 1001.0
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    assert mock_driver.declineOffer.call_count == 0
+    assert mock_driver.suppressOffers.call_count == 0
+    assert list(ef._held_offers) == [fake_offer.id.value]
+    assert ef._run_background_check() == 1001.0
+
+
 def test_resource_offers_blacklisted_offer(
     ef,
     fake_task,
@@ -426,9 +571,7 @@ def test_resource_offers_blacklisted_offer(
     mock_driver,
     mock_get_metric
 ):
-    ef.blacklisted_slaves = ef.blacklisted_slaves.append(
-        fake_offer.agent_id.value,
-    )
+    ef.blacklisted_slaves[fake_offer.agent_id.value] = time.time() + 60
     ef.task_queue.put(fake_task)
     ef.resourceOffers(mock_driver, [fake_offer])
 
@@ -473,8 +616,7 @@ def test_resource_offers_unmet_reqs(
     mock_driver,
     mock_get_metric
 ):
-    ef.callbacks.get_tasks_for_offer = mock.Mock(
-        return_value=([], [fake_task]))
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[])
 
     ef.task_queue.put(fake_task)
     ef.resourceOffers(mock_driver, [fake_offer])
@@ -485,11 +627,447 @@ def test_resource_offers_unmet_reqs(
         ef.offer_decline_filter
     )
     assert mock_driver.launchTasks.call_count == 0
-    assert mock_get_metric.call_count == 1
+    assert mock_get_metric.call_count == 4
     mock_get_metric.assert_any_call(metrics.TASK_INSUFFICIENT_OFFER_COUNT)
     assert mock_get_metric.return_value.count.call_count == 1
 
 
+def test_resource_offers_deprecated_pair_callback(
+    ef,
+    fake_task,
+    fake_offer,
+    mock_driver,
+    caplog,
+):
+    ef._driver = mock_driver
+    fake_task_2 = fake_task.set(name='fake_name_2')
+    other_offer = Dict(fake_offer, id=Dict(value='other_offer_id'))
+    ef.enqueue_task(fake_task)
+    ef.enqueue_task(fake_task_2)
+    ef.callbacks.get_tasks_for_offer = mock.Mock(side_effect=[
+        ([fake_task], [fake_task_2]),
+        ([], [fake_task_2]),
+    ])
+
+    with mock.patch(
+        'task_processing.plugins.mesos.execution_framework._warned_pair_callbacks',
+        set(),
+    ):
+        ef.resourceOffers(mock_driver, [fake_offer, other_offer])
+
+    assert mock_driver.launchTasks.call_count == 1
+    assert mock_driver.launchTasks.call_args[0][0] == fake_offer.id
+    assert list(ef.task_queue) == [fake_task_2]
+    # warned once, not for every offer
+    assert len([
+        record for record in caplog.records if 'deprecated' in record.getMessage()
+    ]) == 1
+
+
+def test_resource_offers_global_matching(
+    ef,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef.global_offer_matching = True
+    ef._driver = mock_driver
+    other_offer = Dict(fake_offer, id=Dict(value='other_offer_id'))
+    fake_task_2 = fake_task.set(name='fake_name_2')
+    ef.enqueue_task(fake_task)
+    ef.enqueue_task(fake_task_2)
+    ef.callbacks.get_tasks_for_offers = mock_matcher([[], [fake_task]])
+
+    ef.resourceOffers(mock_driver, [fake_offer, other_offer])
+
+    assert ef.callbacks.get_tasks_for_offer.call_count == 0
+    _, offers, role = ef.callbacks.get_tasks_for_offers.call_args[0]
+    assert ef.callbacks.get_tasks_for_offers.candidates == [[fake_task, fake_task_2]]
+    assert len(offers) == 2
+    assert role == 'fake_role'
+    assert mock_driver.launchTasks.call_count == 1
+    assert mock_driver.launchTasks.call_args[0][0] == other_offer.id
+    assert mock_driver.declineOffer.call_args == mock.call(
+        [fake_offer.id],
+        ef.offer_decline_filter,
+    )
+    assert list(ef.task_queue) == [fake_task_2]
+
+
+def test_global_matching_requires_callback(mock_Thread):
+    with pytest.raises(ValueError):
+        ExecutionFramework(
+            'fake_name',
+            'fake_role',
+            MesosExecutorCallbacks(mock.Mock(), mock.Mock(), mock.Mock()),
+            240,
+            global_offer_matching=True,
+        )
+
+
+def test_resource_offers_holds_unused_offers(
+    ef,
+    fake_offer,
+    mock_driver,
+):
+    ef.offer_hold_s = 5
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    assert mock_driver.suppressOffers.call_count == 1
+    assert mock_driver.declineOffer.call_count == 0
+    assert list(ef._held_offers) == [fake_offer.id.value]
+
+
+def test_resource_offers_declines_offers_over_hold_limit(
+    ef,
+    fake_offer,
+    mock_driver,
+):
+    ef.offer_hold_s = 5
+    ef.max_held_offers = 1
+    other_offer = Dict(fake_offer, id=Dict(value='other_offer_id'))
+
+    ef.resourceOffers(mock_driver, [fake_offer, other_offer])
+
+    assert list(ef._held_offers) == [fake_offer.id.value]
+    assert mock_driver.declineOffer.call_args == mock.call(
+        [other_offer.id],
+        ef.offer_decline_filter,
+    )
+
+
+def test_enqueue_task_launches_on_held_offer(
+    ef,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef.offer_hold_s = 5
+    ef.resourceOffers(mock_driver, [fake_offer])
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[fake_task])
+
+    ef.enqueue_task(fake_task)
+    # the match happens on the background thread
+    assert mock_driver.launchTasks.call_count == 0
+    ef._run_background_check()
+
+    assert mock_driver.launchTasks.call_count == 1
+    assert mock_driver.launchTasks.call_args[0][0] == fake_offer.id
+    assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_STAGING'
+    assert ef.task_queue.empty()
+    assert not ef._held_offers
+    # offers are still suppressed, nothing is left to run
+    assert mock_driver.reviveOffers.call_count == 0
+
+
+def test_enqueue_task_keeps_unused_held_offer(
+    ef,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef.offer_hold_s = 5
+    ef.resourceOffers(mock_driver, [fake_offer])
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[])
+
+    ef.enqueue_task(fake_task)
+    ef._run_background_check()
+
+    assert mock_driver.launchTasks.call_count == 0
+    assert mock_driver.declineOffer.call_count == 0
+    assert list(ef._held_offers) == [fake_offer.id.value]
+    assert list(ef.task_queue) == [fake_task]
+    assert mock_driver.reviveOffers.call_count == 1
+
+
+def test_held_offers_are_declined_after_hold(
+    ef,
+    fake_offer,
+    mock_driver,
+    mock_time,
+):
+    mock_time.return_value = 1000.0
+    ef.offer_hold_s = 5
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    assert ef._run_background_check() == 1005.0
+    assert mock_driver.declineOffer.call_count == 0
+
+    mock_time.return_value = 1005.0
+    ef._run_background_check()
+
+    assert mock_driver.declineOffer.call_args == mock.call(
+        [fake_offer.id],
+        ef.offer_decline_filter,
+    )
+    assert not ef._held_offers
+
+
+def test_offer_rescinded_releases_held_offer(
+    ef,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef.offer_hold_s = 5
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    ef.offerRescinded(mock_driver, fake_offer.id)
+    ef.enqueue_task(fake_task)
+
+    assert not ef._held_offers
+    assert mock_driver.launchTasks.call_count == 0
+    assert mock_driver.declineOffer.call_count == 0
+
+
+def test_async_driver_calls(
+    mock_Thread,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, async_driver_calls=True)
+    ef.decline_after = 0
+    other_offer = Dict(fake_offer, id=Dict(value='other_offer_id'))
+    ef.callbacks.get_tasks_for_offer = mock.Mock(
+        side_effect=[[fake_task], []])
+    ef.enqueue_task(fake_task)
+
+    ef.resourceOffers(mock_driver, [fake_offer, other_offer])
+    update = Dict(task_id=Dict(value=fake_task.task_id), state='TASK_RUNNING')
+    ef.statusUpdate(mock_driver, update)
+
+    assert mock_driver.launchTasks.call_count == 0
+    assert mock_driver.declineOffer.call_count == 0
+    assert mock_driver.acknowledgeStatusUpdate.call_count == 0
+    assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_RUNNING'
+
+    ef._driver_calls.flush()
+
+    assert mock_driver.launchTasks.call_args[0][0] == fake_offer.id
+    assert mock_driver.acknowledgeStatusUpdate.call_args == mock.call(update)
+    assert mock_driver.declineOffer.call_args == mock.call(
+        [other_offer.id],
+        ef.offer_decline_filter,
+    )
+
+
+def test_async_driver_calls_launch_failed(
+    mock_Thread,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, async_driver_calls=True)
+    ef.decline_after = 0
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[fake_task])
+    mock_driver.launchTasks.side_effect = socket.timeout
+    ef.enqueue_task(fake_task)
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+    assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_STAGING'
+
+    ef._driver_calls.flush()
+    assert ef.task_metadata[fake_task.task_id].task_state == 'UNKNOWN'
+
+
+def test_async_driver_calls_launch_failed_takes_back_staging(
+    mock_Thread,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, async_driver_calls=True)
+    ef.decline_after = 0
+    ef.callbacks.get_tasks_for_offer = mock.Mock(return_value=[fake_task])
+    ef.callbacks.handle_status_update = lambda update, task_config: update['state']
+    mock_driver.launchTasks.side_effect = socket.timeout
+    ef.enqueue_task(fake_task)
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+    assert fake_task.task_id in ef._last_heard
+
+    ef._driver_calls.flush()
+    events = [ef.event_queue.get_nowait() for _ in range(ef.event_queue.qsize())]
+    assert events == ['TASK_STAGING', 'TASK_UNKNOWN']
+    assert fake_task.task_id not in ef._last_heard
+    ef._reconcile_silent_tasks(float('inf'))
+    assert fake_task.task_id not in ef._tasks_to_reconcile
+
+
+def test_async_driver_calls_keep_their_order(
+    mock_Thread,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, async_driver_calls=True)
+    ef.decline_after = 0
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+    assert ef.are_offers_suppressed
+    ef.enqueue_task(fake_task)
+    assert not ef.are_offers_suppressed
+    assert ef.kill_task('other_task_id')
+    ef.reconcile_task(fake_task)
+
+    assert mock_driver.mock_calls == []
+    ef._driver_calls.flush()
+    assert [name for name, _, _ in mock_driver.mock_calls] == [
+        'suppressOffers',
+        'declineOffer',
+        'reviveOffers',
+        'killTask',
+        'reconcileTasks',
+    ]
+
+
+def test_async_driver_calls_suppress_and_revive_failed(
+    mock_Thread,
+    fake_task,
+    fake_offer,
+    mock_driver,
+):
+    ef = ExecutionFramework(
+        'fake_name', 'fake_role', mock.Mock(), 240, async_driver_calls=True)
+    ef.decline_after = 0
+    mock_driver.suppressOffers.side_effect = socket.timeout
+    mock_driver.reviveOffers.side_effect = socket.timeout
+
+    ef.resourceOffers(mock_driver, [fake_offer])
+    assert ef.are_offers_suppressed
+    ef._driver_calls.flush()
+    assert not ef.are_offers_suppressed
+
+    ef.are_offers_suppressed = True
+    ef.enqueue_task(fake_task)
+    assert not ef.are_offers_suppressed
+    ef._driver_calls.flush()
+    # revived again the next time it's needed
+    assert ef.are_offers_suppressed
+
+
+@pytest.fixture
+def gang(fake_task):
+    return [fake_task.set(uuid=f'member{i}') for i in range(2)]
+
+
+def test_enqueue_gang_waits_for_offers_that_fit_all_tasks(
+    ef,
+    gang,
+    fake_offer,
+    mock_driver,
+):
+    ef.callbacks.get_tasks_for_offer = get_tasks_for_offer
+    other_offer = Dict(fake_offer, id=Dict(value='other_offer_id'))
+    ef.enqueue_gang(gang)
+
+    # one offer only fits one of the tasks: it is held, not used
+    ef.resourceOffers(mock_driver, [fake_offer])
+    assert mock_driver.launchTasks.call_count == 0
+    assert mock_driver.declineOffer.call_count == 0
+    assert list(ef._held_offers) == [fake_offer.id.value]
+
+    ef.resourceOffers(mock_driver, [other_offer])
+    assert [c[0][0] for c in mock_driver.launchTasks.call_args_list] == [
+        fake_offer.id, other_offer.id,
+    ]
+    assert all(
+        ef.task_metadata[task.task_id].task_state == 'TASK_STAGING'
+        for task in gang
+    )
+    assert not ef._gangs
+    assert not ef._held_offers
+
+
+def test_enqueue_gang_uses_held_offers(ef, gang, fake_offer, mock_driver):
+    ef.callbacks.get_tasks_for_offer = get_tasks_for_offer
+    ef.offer_hold_s = 5
+    ef._driver = mock_driver
+    ef.resourceOffers(mock_driver, [
+        fake_offer, Dict(fake_offer, id=Dict(value='other_offer_id')),
+    ])
+
+    ef.enqueue_gang(gang)
+    ef._run_background_check()
+
+    assert mock_driver.launchTasks.call_count == 2
+
+
+def test_enqueue_gang_releases_held_offers_after_gang_hold_s(
+    ef,
+    gang,
+    fake_offer,
+    mock_driver,
+    mock_time,
+):
+    ef.callbacks.get_tasks_for_offer = get_tasks_for_offer
+    ef.gang_hold_s = 10
+    mock_time.return_value = 1000.0
+    ef.enqueue_gang(gang)
+    ef.resourceOffers(mock_driver, [fake_offer])
+
+    assert ef._run_background_check() == 1010.0
+    mock_time.return_value = 1010.0
+    ef._run_background_check()
+
+    assert mock_driver.declineOffer.call_args[0][0] == [fake_offer.id]
+    assert not ef._held_offers
+    assert list(ef._gangs) == [gang[0].task_id]
+
+
+def test_enqueue_gang_already_pending(ef, gang):
+    ef.enqueue_task(gang[1])
+
+    with pytest.raises(ValueError):
+        ef.enqueue_gang(gang)
+    with pytest.raises(ValueError):
+        ef.enqueue_gang([gang[0], gang[0]])
+
+
+def test_kill_task_removes_its_gang(ef, gang, mock_driver):
+    ef._driver = mock_driver
+    ef.enqueue_gang(gang)
+
+    assert ef.kill_task(gang[1].task_id)
+    assert not ef._gangs
+    assert all(task.task_id not in ef.task_metadata for task in gang)
+    assert mock_driver.killTask.call_count == 0
+
+
+def test_kill_task_emits_events_for_the_rest_of_its_gang(ef, fake_task, mock_driver):
+    ef._driver = mock_driver
+    gang = [fake_task.set(uuid=f'member{i}') for i in range(3)]
+    ef.enqueue_gang(gang)
+
+    assert ef.kill_task(gang[1].task_id)
+
+    events = [ef.event_queue.get_nowait() for _ in range(ef.event_queue.qsize())]
+    assert [event.task_id for event in events] == \
+        [gang[0].task_id, gang[2].task_id]
+    assert all(event.terminal and not event.success for event in events)
+    assert all(gang[1].task_id in event.raw for event in events)
+
+
+def test_gang_offer_timeout_expires_every_task(ef, gang, mock_driver, mock_time):
+    ef._driver = mock_driver
+    mock_time.return_value = 1000.0
+    ef.enqueue_gang([gang[0], gang[1].set(offer_timeout=120)])
+
+    mock_time.return_value = 1060.0
+    ef._run_background_check()
+
+    events = [ef.event_queue.get_nowait() for _ in range(ef.event_queue.qsize())]
+    assert [event.task_id for event in events] == [task.task_id for task in gang]
+    assert not ef._gangs
+    assert mock_driver.killTask.call_count == 0
+
+
 def status_update_test_prep(state, reason=''):
     task = MesosTaskConfig(
         cmd='/bin/true', name='fake_name', image='fake_image')
@@ -516,7 +1094,7 @@ def test_status_update_record_only(
     ef.translator = mock.Mock()
     ef._driver = mock_driver
 
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef.task_metadata[task_id] = task_metadata
     ef.statusUpdate(mock_driver, update)
 
     assert ef.task_metadata[task_id].task_state == 'fake_state1'
@@ -535,7 +1113,7 @@ def test_status_update_finished(
     ef.translator = mock.Mock()
     ef._driver = mock_driver
 
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef.task_metadata[task_id] = task_metadata
     ef.statusUpdate(mock_driver, update)
 
     assert task_id not in ef.task_metadata
@@ -573,10 +1151,7 @@ def test_task_lost_due_to_invalid_offers(
         state='TASK_LOST',
         reason='REASON_INVALID_OFFERS'
     )
-    ef.task_metadata = ef.task_metadata.set(
-        task_id,
-        task_metadata
-    )
+    ef.task_metadata[task_id] = task_metadata
     ef._driver = mock_driver
 
     ef.statusUpdate(mock_driver, update)
@@ -593,7 +1168,6 @@ def test_background_thread_removes_offer_timeout(
     mock_driver,
     fake_task,
     mock_time,
-    mock_sleep,
 ):
     mock_time.return_value = 2.0
     task_id = fake_task.task_id
@@ -607,8 +1181,8 @@ def test_background_thread_removes_offer_timeout(
         task_state_history=m(TASK_INITED=0.0),
     )
     ef.driver = mock_driver
-    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
-    ef._background_check()
+    ef._update_task_metadata(task_id, task_metadata)
+    ef._run_background_check()
     assert ef.task_queue.empty()
     assert task_id not in ef.task_metadata.keys()
     assert not ef.event_queue.empty()
@@ -618,6 +1192,34 @@ def test_background_thread_removes_offer_timeout(
     assert event.task_id == task_id
 
 
+def test_background_check_only_handles_current_deadlines(
+    ef,
+    fake_task,
+    mock_time,
+    mock_get_metric,
+):
+    mock_time.return_value = 0.0
+    fake_task = fake_task.set(offer_timeout=10)
+    other_task = fake_task.set(name='other_task', offer_timeout=20)
+    ef.enqueue_task(fake_task)
+    ef.enqueue_task(other_task)
+    ef.kill_tasks = mock.Mock()
+
+    # fake_task launched before its offer timeout, so its deadline is stale
+    mock_time.return_value = 5.0
+    ef._transition_task(fake_task.task_id, 'TASK_RUNNING', 5.0)
+
+    mock_time.return_value = 15.0
+    assert ef._run_background_check() == 20.0
+    assert ef.kill_tasks.call_count == 0
+    assert ef.event_queue.empty()
+
+    mock_time.return_value = 20.0
+    assert ef._run_background_check() == float('inf')
+    assert ef.kill_tasks.call_args == mock.call([other_task.task_id])
+    assert ef.event_queue.get(block=False).task_id == other_task.task_id
+
+
 def test_launch_tasks_for_offer_task_missing(
     ef,
     fake_task,
@@ -633,7 +1235,6 @@ def test_reconcile_task_unknown(
     fake_task,
 ):
     ef._driver = mock_driver
-    ef._reconcile_tasks_at = 0
     assert fake_task.task_id not in ef.task_metadata
 
     ef.reconcile_task(fake_task)
@@ -647,17 +1248,100 @@ def test_reconcile_task_existing(
     fake_task,
 ):
     ef._driver = mock_driver
-    ef._reconcile_tasks_at = 0
-    ef.task_metadata = ef.task_metadata.set(
-        fake_task.task_id,
-        TaskMetadata(
-            task_config=fake_task,
-            task_state='TASK_INITED',
-            task_state_history=m(TASK_INITED=time.time()),
-        ),
+    ef.task_metadata[fake_task.task_id] = TaskMetadata(
+        task_config=fake_task,
+        task_state='TASK_INITED',
+        task_state_history=m(TASK_INITED=time.time()),
     )
 
     ef.reconcile_task(fake_task)
     task_metadata = ef.task_metadata[fake_task.task_id]
     assert len(task_metadata.task_state_history) == 2
     assert mock_driver.reconcileTasks.call_count == 1
+
+
+def test_reconcile_task_is_not_rate_limited(
+    ef,
+    mock_driver,
+    fake_task,
+):
+    ef._driver = mock_driver
+    other_task = fake_task.set(name='other_task')
+
+    ef.reconcile_task(fake_task)
+    ef.reconcile_task(other_task)
+
+    assert mock_driver.reconcileTasks.call_args_list == [
+        mock.call([Dict(task_id=Dict(value=fake_task.task_id))]),
+        mock.call([Dict(task_id=Dict(value=other_task.task_id))]),
+    ]
+
+
+def launch_silent_tasks(ef, fake_task, count, at):
+    task_ids = []
+    for i in range(count):
+        task = fake_task.set(name=f'task{i}')
+        ef._update_task_metadata(task.task_id, TaskMetadata(
+            task_config=task,
+            task_state='TASK_RUNNING',
+            task_state_history={'TASK_RUNNING': at},
+        ))
+        ef._heard_from(task.task_id, at)
+        task_ids.append(task.task_id)
+    return task_ids
+
+
+def reconciled_task_ids(mock_driver):
+    return [
+        [task.task_id.value for task in call[0][0]]
+        for call in mock_driver.reconcileTasks.call_args_list
+    ]
+
+
+def test_background_check_reconciles_silent_tasks_in_batches(
+    ef,
+    fake_task,
+    mock_driver,
+    mock_time,
+    mock_get_metric,
+):
+    ef._driver = mock_driver
+    ef.reconciliation_batch_size = 2
+    ef.reconciliation_jitter = 0
+    mock_time.return_value = 0.0
+    task_ids = launch_silent_tasks(ef, fake_task, 3, at=0.0)
+
+    mock_time.return_value = 299.0
+    assert ef._run_background_check() == 300.0
+    assert mock_driver.reconcileTasks.call_count == 0
+
+    mock_time.return_value = 300.0
+    assert ef._run_background_check() == 301.0
+    assert reconciled_task_ids(mock_driver) == [task_ids[:2]]
+
+    mock_time.return_value = 301.0
+    assert ef._run_background_check() == 600.0
+    assert reconciled_task_ids(mock_driver) == [task_ids[:2], task_ids[2:]]
+
+
+def test_background_check_skips_tasks_heard_from(
+    ef,
+    fake_task,
+    mock_driver,
+    mock_time,
+    mock_get_metric,
+):
+    ef._driver = mock_driver
+    mock_time.return_value = 0.0
+    task_id, other_task_id = launch_silent_tasks(ef, fake_task, 2, at=0.0)
+    ef._heard_from(task_id, 100.0)
+    ef.task_metadata.pop(other_task_id)
+
+    mock_time.return_value = 300.0
+    assert ef._run_background_check() == 400.0
+    assert mock_driver.reconcileTasks.call_count == 0
+    assert other_task_id not in ef._last_heard
+
+    mock_time.return_value = 400.0
+    ef._run_background_check()
+    assert reconciled_task_ids(mock_driver) == [[task_id]]
@@ -54,8 +54,9 @@ def test_stop(mock_logging_executor, mock_downstream):
     assert mock_logging_executor.stopping
 
 
-def test_event_loop_stores_staging_event(mock_logging_executor, source_queue):
-    raw = Dict({
+@pytest.mark.parametrize('dict_cls', [Dict, dict])
+def test_event_loop_stores_staging_event(mock_logging_executor, source_queue, dict_cls):
+    raw = dict_cls({
         'offer': {
             'url': {
                 'scheme': 'http',
@@ -156,6 +157,33 @@ def test_event_loop_running_event(mock_logging_executor, source_queue):
     assert 'my_task' not in mock_logging_executor.staging_tasks
 
 
+def test_event_loop_running_event_without_container_status(
+    mock_logging_executor,
+    source_queue,
+):
+    mock_event = mock.Mock(
+        kind='task',
+        platform_type='running',
+        task_id='my_task',
+        raw={'state': 'TASK_RUNNING'},
+    )
+    other_event = mock.Mock(kind='task', platform_type='finished', task_id='other')
+
+    mock_logging_executor.stopping = True
+    source_queue.put(mock_event)
+    source_queue.put(other_event)
+    mock_logging_executor.staging_tasks = mock_logging_executor.staging_tasks.set(
+        'my_task', 'my_log_url')
+
+    mock_logging_executor.event_loop()
+
+    assert 'my_task' not in mock_logging_executor.running_tasks
+    assert 'my_task' not in mock_logging_executor.staging_tasks
+    dest_queue = mock_logging_executor.get_event_queue()
+    assert dest_queue.get() == mock_event
+    assert dest_queue.get() == other_event
+
+
 def test_event_loop_terminal_event(mock_logging_executor, source_queue):
     mock_event = mock.Mock(
         kind='task',
@@ -40,6 +40,14 @@ def test_creates_execution_framework_and_driver(
         role="role",
         callbacks=mock_callbacks,
         framework_id=None,
+        global_offer_matching=False,
+        offer_hold_s=0,
+        max_held_offers=10,
+        async_driver_calls=False,
+        use_unreserved_resources=False,
+        task_queue=None,
+        gang_hold_s=30,
+        use_addict=True,
     )
 
     assert mesos_executor.driver is mesos_driver.return_value
@@ -66,6 +74,12 @@ def test_run_passes_task_to_execution_framework(mesos_executor):
         mock.call("task")
 
 
+def test_run_gang_passes_tasks_to_execution_framework(mesos_executor):
+    mesos_executor.run_gang(["task1", "task2"])
+    assert mesos_executor.execution_framework.enqueue_gang.call_args ==\
+        mock.call(["task1", "task2"])
+
+
 def test_stop_shuts_down_properly(mesos_executor):
     mesos_executor.stop()
     assert mesos_executor.execution_framework.stop.call_count == 1
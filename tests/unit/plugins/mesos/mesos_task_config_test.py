@@ -1,3 +1,4 @@
+import pytest
 from pyrsistent import InvariantException
 
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
@@ -32,3 +33,14 @@ def test_mesos_task_config_set_task_id():
     new_task_id = 'new' + m.task_id
     result = m.set_task_id(new_task_id)
     assert result.task_id == new_task_id
+
+
+def test_mesos_task_config_retry_backoff():
+    m = MesosTaskConfig(
+        cmd='/bin/true', image='fake', retry_backoff='exponential',
+        retry_delay=2, retry_max_delay=60,
+    )
+    assert type(m.retry_delay) is float
+
+    with pytest.raises(InvariantException):
+        m.set(retry_backoff='linear')
@@ -1,7 +1,13 @@
 import mock
 import pytest
+from pyrsistent import m
+from pyrsistent import v
 
 from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offers
+from task_processing.plugins.mesos.mesos_task_executor import MesosTaskExecutor
+from task_processing.plugins.mesos.packing import best_fit
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
 
 
 @pytest.fixture
@@ -9,7 +15,7 @@ def resource_patches():
     with mock.patch(
         'task_processing.plugins.mesos.mesos_task_executor.task_fits',
     ) as mock_fits, mock.patch(
-        'task_processing.plugins.mesos.mesos_task_executor.attributes_match_constraints',
+        'task_processing.plugins.mesos.mesos_task_executor.constraints_checker',
     ) as mock_constraints, mock.patch(
         'task_processing.plugins.mesos.mesos_task_executor.allocate_task_resources',
     ) as mock_allocate:
@@ -20,8 +26,8 @@ def resource_patches():
 def test_get_tasks_for_offer_doesnt_fit(resource_patches, fits, constraints):
     mock_fits, mock_constraints, mock_allocate = resource_patches
     mock_fits.return_value = fits
-    mock_constraints.return_value = constraints
-    tasks_to_launch, tasks_to_defer = get_tasks_for_offer(
+    mock_constraints.return_value.return_value = constraints
+    tasks_to_launch = get_tasks_for_offer(
         [mock.Mock()],
         mock.Mock(),
         mock.Mock(),
@@ -30,13 +36,12 @@ def test_get_tasks_for_offer_doesnt_fit(resource_patches, fits, constraints):
 
     assert mock_allocate.call_count == 0
     assert len(tasks_to_launch) == 0
-    assert len(tasks_to_defer) == 1
 
 
 def test_get_tasks_for_offer(resource_patches):
     _, _, mock_allocate = resource_patches
     mock_allocate.return_value = mock.Mock(), []
-    tasks_to_launch, tasks_to_defer = get_tasks_for_offer(
+    tasks_to_launch = get_tasks_for_offer(
         [mock.Mock()],
         mock.Mock(),
         mock.Mock(),
@@ -45,4 +50,129 @@ def test_get_tasks_for_offer(resource_patches):
 
     assert mock_allocate.call_count == 1
     assert len(tasks_to_launch) == 1
-    assert len(tasks_to_defer) == 0
+
+
+def test_get_tasks_for_offer_skips_unfit_shapes(resource_patches, fake_task):
+    mock_fits, _, mock_allocate = resource_patches
+    mock_fits.return_value = False
+    small_tasks = [fake_task.set(cpus=1) for _ in range(3)]
+    large_tasks = [fake_task.set(cpus=2) for _ in range(3)]
+
+    tasks_to_launch = get_tasks_for_offer(
+        iter(small_tasks + large_tasks),
+        mock.Mock(),
+        mock.Mock(),
+        'role',
+    )
+
+    # one check per shape
+    assert mock_fits.call_count == 2
+    assert tasks_to_launch == []
+
+
+def make_offer_resources(cpus, mem):
+    return ResourceSet(
+        cpus=cpus,
+        mem=mem,
+        disk=1000,
+        gpus=0,
+        ports=v(m(begin=31000, end=31100)),
+    )
+
+
+def test_get_tasks_for_offers_places_large_tasks_first(fake_task):
+    fake_task = fake_task.set(gpus=0, disk=10)
+    small_tasks = [
+        fake_task.set(name=f'small{i}', cpus=1, mem=128) for i in range(4)
+    ]
+    large_task = fake_task.set(name='large', cpus=4, mem=512)
+    offers = [
+        (make_offer_resources(cpus=4, mem=512), {}),
+        (make_offer_resources(cpus=2, mem=256), {}),
+        (make_offer_resources(cpus=2, mem=256), {}),
+    ]
+
+    tasks_per_offer = get_tasks_for_offers(
+        iter(small_tasks + [large_task]),
+        offers,
+        'role',
+    )
+
+    # greedily, the small tasks would have fragmented the large offer
+    assert [t.name for t in tasks_per_offer[0]] == ['large']
+    assert [t.name for t in tasks_per_offer[1]] == ['small0', 'small1']
+    assert [t.name for t in tasks_per_offer[2]] == ['small2', 'small3']
+
+
+def test_get_tasks_for_offers_best_fit(fake_task):
+    fake_task = fake_task.set(gpus=0, disk=10)
+    task = fake_task.set(name='task', cpus=2, mem=256)
+    offers = [
+        (make_offer_resources(cpus=8, mem=1024), {}),
+        (make_offer_resources(cpus=2, mem=256), {}),
+    ]
+
+    tasks_per_offer = get_tasks_for_offers([task], offers, 'role')
+
+    assert tasks_per_offer[0] == []
+    assert [t.name for t in tasks_per_offer[1]] == ['task']
+
+
+def test_get_tasks_for_offers_slack_is_summed(fake_task):
+    fake_task = fake_task.set(gpus=0, disk=10)
+    task = fake_task.set(name='task', cpus=1, mem=100)
+    offers = [
+        # all cpus used, lots of mem left
+        (make_offer_resources(cpus=1, mem=1000), {}),
+        # some of both left
+        (make_offer_resources(cpus=4, mem=400), {}),
+    ]
+
+    tasks_per_offer = get_tasks_for_offers([task], offers, 'role')
+
+    # the same choice best_fit makes for a single offer
+    assert [t.name for t in tasks_per_offer[0]] == ['task']
+    assert tasks_per_offer[1] == []
+
+
+def test_get_tasks_for_offers_leaves_unplaced_tasks(fake_task):
+    fake_task = fake_task.set(gpus=0, disk=10)
+    task = fake_task.set(name='task', cpus=2, mem=256, constraints=[
+        ['region', '==', 'somewhere_else'],
+    ])
+    offers = [(make_offer_resources(cpus=8, mem=1024), {'region': 'here'})]
+
+    tasks_per_offer = get_tasks_for_offers([task], offers, 'role')
+
+    assert tasks_per_offer == [[]]
+
+
+@pytest.mark.parametrize('packing_strategy,expected', [
+    ('first_fit', get_tasks_for_offer),
+    ('best_fit', best_fit),
+])
+def test_packing_strategy(mock_Thread, mock_fw_and_driver, packing_strategy, expected):
+    execution_framework, _ = mock_fw_and_driver
+
+    MesosTaskExecutor('role', packing_strategy=packing_strategy)
+
+    callbacks = execution_framework.call_args[1]['callbacks']
+    assert callbacks.get_tasks_for_offer is expected
+
+
+def test_unknown_packing_strategy(mock_Thread, mock_fw_and_driver):
+    with pytest.raises(ValueError):
+        MesosTaskExecutor('role', packing_strategy='no_such_strategy')
+
+
+def test_use_addict_false_builds_plain_dicts(mock_Thread, mock_fw_and_driver, fake_task):
+    execution_framework, mesos_driver = mock_fw_and_driver
+
+    MesosTaskExecutor('role', use_addict=False)
+
+    callbacks = execution_framework.call_args[1]['callbacks']
+    task_info = callbacks.make_mesos_protobuf(fake_task, 'fake_agent_id', 'role')
+    assert type(task_info) is dict
+    assert type(task_info['container']) is dict
+    assert execution_framework.call_args[1]['use_addict'] is False
+    assert mesos_driver.call_args[1]['use_addict'] is False
@@ -0,0 +1,110 @@
+import uuid
+
+import pytest
+from pyrsistent import m
+from pyrsistent import v
+
+from task_processing.plugins.mesos.packing import best_fit
+from task_processing.plugins.mesos.packing import dominant_resource_fairness
+from task_processing.plugins.mesos.packing import first_fit_decreasing
+from task_processing.plugins.mesos.packing import PACKING_STRATEGIES
+from task_processing.plugins.mesos.packing import spread
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+
+
+@pytest.fixture
+def offer_resources():
+    return ResourceSet(
+        cpus=8,
+        mem=1024,
+        disk=1000,
+        gpus=0,
+        ports=v(m(begin=31000, end=31099)),
+    )
+
+
+@pytest.fixture
+def make_task(fake_task):
+    def make_task(name, cpus, mem=64, **kwargs):
+        return fake_task.set(
+            name=name,
+            uuid=uuid.uuid4(),
+            cpus=cpus,
+            mem=mem,
+            disk=10,
+            gpus=0,
+            **kwargs,
+        )
+    return make_task
+
+
+def names(tasks):
+    return [task.name for task in tasks]
+
+
+@pytest.mark.parametrize('strategy', PACKING_STRATEGIES.values())
+def test_strategies_respect_resources_and_constraints(strategy, make_task, offer_resources):
+    tasks = [
+        make_task('too_big', cpus=16),
+        make_task('elsewhere', cpus=1, constraints=[['region', '==', 'elsewhere']]),
+        make_task('fits', cpus=1),
+    ]
+
+    tasks_to_launch = strategy(
+        iter(tasks), offer_resources, {'region': 'here'}, 'role')
+
+    assert names(tasks_to_launch) == ['fits']
+    assert tasks_to_launch[0].ports == v(m(begin=31000, end=31000))
+
+
+def test_first_fit_decreasing(make_task, offer_resources):
+    tasks = [
+        make_task('small1', cpus=2),
+        make_task('small2', cpus=2),
+        make_task('large', cpus=6),
+    ]
+
+    tasks_to_launch = first_fit_decreasing(
+        tasks, offer_resources, {}, 'role')
+
+    assert names(tasks_to_launch) == ['large', 'small1']
+
+
+def test_best_fit(make_task, offer_resources):
+    tasks = [
+        make_task('small', cpus=1),
+        make_task('medium', cpus=5),
+        make_task('large', cpus=7),
+    ]
+
+    tasks_to_launch = best_fit(
+        tasks, offer_resources, {}, 'role')
+
+    # large leaves the least room, then only small still fits
+    assert names(tasks_to_launch) == ['large', 'small']
+
+
+def test_spread(make_task, offer_resources):
+    tasks = [
+        make_task('a', cpus=1),
+        make_task('a', cpus=1),
+        make_task('b', cpus=1),
+    ]
+
+    tasks_to_launch = spread(
+        tasks, offer_resources, {}, 'role')
+
+    assert names(tasks_to_launch) == ['a', 'b']
+
+
+def test_dominant_resource_fairness(make_task, offer_resources):
+    tasks = [make_task('greedy', cpus=2) for _ in range(4)] + [
+        make_task('modest', cpus=1, mem=256),
+        make_task('modest', cpus=1, mem=256),
+    ]
+
+    tasks_to_launch = dominant_resource_fairness(
+        tasks, offer_resources, {}, 'role')
+
+    # greedy can't take the whole offer just because it is first in line
+    assert names(tasks_to_launch) == ['greedy', 'modest', 'greedy', 'modest', 'greedy']
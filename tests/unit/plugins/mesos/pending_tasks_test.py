@@ -0,0 +1,153 @@
+import pytest
+
+from task_processing.plugins.mesos.pending_tasks import FairTaskQueue
+from task_processing.plugins.mesos.pending_tasks import PendingTaskQueue
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+from task_processing.plugins.mesos.task_config import MesosTaskConfig
+
+
+def make_task(name, cpus=1.0, mem=32.0):
+    return MesosTaskConfig(
+        name=name,
+        image='fake_image',
+        cmd='echo "fake"',
+        cpus=cpus,
+        mem=mem,
+    )
+
+
+@pytest.fixture
+def pending():
+    return PendingTaskQueue()
+
+
+def test_fifo_order(pending):
+    tasks = [make_task(f'task{i}', cpus=i + 1) for i in range(5)]
+    for task in tasks:
+        pending.put(task)
+
+    assert len(pending) == 5
+    assert [pending.get() for _ in range(5)] == tasks
+    assert pending.empty()
+
+
+def test_get_empty(pending):
+    with pytest.raises(KeyError):
+        pending.get()
+
+
+def test_put_existing_task_moves_it_to_the_back(pending):
+    task_a, task_b = make_task('a'), make_task('b')
+    pending.put(task_a)
+    pending.put(task_b)
+    pending.put(task_a)
+
+    assert list(pending) == [task_b, task_a]
+
+
+def test_remove(pending):
+    task_a, task_b = make_task('a'), make_task('b', cpus=2)
+    pending.put(task_a)
+    pending.put(task_b)
+
+    assert pending.remove(task_a.task_id) == task_a
+    assert pending.remove(task_a.task_id) is None
+    assert task_a.task_id not in pending
+    assert list(pending) == [task_b]
+    assert list(pending.candidates(ResourceSet(cpus=10, mem=1024, disk=100))) == [task_b]
+
+
+def test_candidates_filters_by_shape_and_keeps_order(pending):
+    small_1 = make_task('small_1', cpus=1)
+    big = make_task('big', cpus=8)
+    small_2 = make_task('small_2', cpus=1)
+    medium = make_task('medium', cpus=2, mem=64)
+    for task in (small_1, big, small_2, medium):
+        pending.put(task)
+
+    assert list(pending.candidates(ResourceSet(cpus=4, mem=64, disk=100))) == \
+        [small_1, small_2, medium]
+    assert list(pending.candidates(ResourceSet(cpus=4, mem=32, disk=100))) == \
+        [small_1, small_2]
+    assert list(pending.candidates(ResourceSet(cpus=10, mem=64, disk=100))) == \
+        [small_1, big, small_2, medium]
+    assert list(pending.candidates(ResourceSet())) == []
+
+
+def make_burst(name, count, cpus=1.0):
+    return [
+        make_task(name, cpus=cpus).set(uuid=f'{name}{i}') for i in range(count)
+    ]
+
+
+def test_fair_queue_interleaves_groups():
+    pending = FairTaskQueue()
+    burst = make_burst('big', 5)
+    small = make_burst('small', 2)
+    for task in burst + small:
+        pending.put(task)
+
+    assert list(pending.candidates(ResourceSet(cpus=10, mem=1024, disk=100))) == [
+        burst[0], small[0], burst[1], small[1], burst[2], burst[3], burst[4],
+    ]
+    # FIFO order is still available
+    assert list(pending) == burst + small
+
+
+def test_fair_queue_weights():
+    pending = FairTaskQueue(weights={'big': 2, 'small': 0.5})
+    burst = make_burst('big', 6)
+    small = make_burst('small', 2)
+    for task in burst + small:
+        pending.put(task)
+
+    assert [pending.get() for _ in range(8)] == [
+        burst[0], small[0], burst[1], burst[2], burst[3],
+        burst[4], small[1], burst[5],
+    ]
+    assert pending.empty()
+
+
+def test_fair_queue_custom_key():
+    pending = FairTaskQueue(key=lambda task_config: task_config.name.split('.')[0])
+    tasks = [
+        make_task('a.x'), make_task('a.y'), make_task('b.x'),
+    ]
+    for task in tasks:
+        pending.put(task)
+
+    assert [pending.get() for _ in range(3)] == [tasks[0], tasks[2], tasks[1]]
+
+
+def test_fair_queue_candidates_only_fitting_shapes():
+    pending = FairTaskQueue()
+    burst = make_burst('big', 3, cpus=4)
+    small = make_burst('small', 2)
+    for task in burst + small:
+        pending.put(task)
+    pending.remove(burst[0].task_id)
+
+    assert list(pending.candidates(ResourceSet(cpus=2, mem=1024, disk=100))) == small
+    assert list(pending.candidates(ResourceSet(cpus=4, mem=1024, disk=100))) == [
+        small[0], burst[1], small[1], burst[2],
+    ]
+
+
+def test_fair_queue_late_group_isnt_stuck_behind_burst():
+    pending = FairTaskQueue()
+    burst = make_burst('big', 10)
+    for task in burst:
+        pending.put(task)
+    for task in burst[:5]:
+        pending.remove(task.task_id)
+
+    late = make_burst('late', 2)
+    for task in late:
+        pending.put(task)
+
+    assert [pending.get() for _ in range(4)] == [burst[5], late[0], burst[6], late[1]]
+
+
+def test_fair_queue_invalid_weight():
+    with pytest.raises(ValueError):
+        FairTaskQueue(weights={'a': 0})
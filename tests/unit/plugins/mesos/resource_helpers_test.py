@@ -1,8 +1,18 @@
+import json
+from collections.abc import Mapping
+
+import addict
+import mock
 import pytest
 from pyrsistent import m
+from pyrsistent import pmap
+from pyrsistent import thaw
 from pyrsistent import v
 
+from task_processing.interfaces.event import json_serializer
+from task_processing.plugins.mesos.resource_helpers import allocate_ports
 from task_processing.plugins.mesos.resource_helpers import allocate_task_resources
+from task_processing.plugins.mesos.resource_helpers import count_ports
 from task_processing.plugins.mesos.resource_helpers import get_offer_resources
 from task_processing.plugins.mesos.resource_helpers import ResourceSet
 from task_processing.plugins.mesos.resource_helpers import task_fits
@@ -29,6 +39,13 @@ def test_get_offer_resources(fake_offer, role):
     )
 
 
+def test_get_offer_resources_plain_dicts(fake_offer):
+    plain_offer = json.loads(json.dumps(fake_offer))
+    assert get_offer_resources(plain_offer, 'fake_role') == get_offer_resources(
+        fake_offer, 'fake_role',
+    )
+
+
 @pytest.mark.parametrize('available_ports', [
     v(m(begin=5, end=10)),
     v(m(begin=3, end=3), m(begin=6, end=10)),
@@ -49,9 +66,9 @@ def test_allocate_task_resources(fake_task, offer_resources, available_ports):
 
 
 @pytest.mark.parametrize('cpus,available_ports', [
-    (5, v([m(begin=5, end=10)])),
+    (5, v(m(begin=5, end=10))),
     (10, v()),
-    (10, v([m(begin=5, end=10)])),
+    (10, v(m(begin=5, end=10))),
 ])
 def test_task_fits(fake_task, offer_resources, cpus, available_ports):
     offer_resources = offer_resources.set('cpus', cpus)
@@ -60,3 +77,161 @@ def test_task_fits(fake_task, offer_resources, cpus, available_ports):
         cpus == 10 and
         len(available_ports) > 0
     )
+
+
+@pytest.mark.parametrize('num_ports,allocated,remaining', [
+    (0, v(), v(m(begin=3, end=3), m(begin=6, end=10))),
+    (1, v(m(begin=3, end=3)), v(m(begin=6, end=10))),
+    (3, v(m(begin=3, end=3), m(begin=6, end=7)), v(m(begin=8, end=10))),
+    (6, v(m(begin=3, end=3), m(begin=6, end=10)), v()),
+])
+def test_allocate_ports(num_ports, allocated, remaining):
+    port_ranges = v(m(begin=3, end=3), m(begin=6, end=10))
+
+    assert allocate_ports(port_ranges, num_ports) == (allocated, remaining)
+
+
+def test_allocate_ports_not_enough_ports():
+    with pytest.raises(ValueError):
+        allocate_ports(v(m(begin=3, end=4)), 3)
+
+
+def test_allocate_task_resources_multiple_ports(fake_task, offer_resources):
+    offer_resources = offer_resources.set('ports', v(m(begin=5, end=10)))
+    consumed, remaining = allocate_task_resources(
+        fake_task.set(num_ports=3),
+        offer_resources,
+    )
+
+    assert consumed.ports == v(m(begin=5, end=7))
+    assert remaining.ports == v(m(begin=8, end=10))
+
+
+def test_resource_set_num_ports_counted_once(fake_task, offer_resources):
+    offer_resources = offer_resources.set('ports', v(m(begin=5, end=10)))
+    fake_task = fake_task.set(cpus=1, mem=64, disk=10, gpus=0)
+    with mock.patch(
+        'task_processing.plugins.mesos.resource_helpers.count_ports',
+        wraps=count_ports,
+    ) as mock_count_ports:
+        assert offer_resources.num_ports == 6
+        _, remaining = allocate_task_resources(fake_task.set(num_ports=2), offer_resources)
+        _, remaining = allocate_task_resources(fake_task.set(num_ports=0), remaining)
+
+        assert remaining.num_ports == 4
+        assert task_fits(fake_task.set(num_ports=4), remaining)
+        assert not task_fits(fake_task.set(num_ports=5), remaining)
+        assert mock_count_ports.call_count == 1
+
+
+@pytest.mark.parametrize('num_ports,fits', [(0, True), (2, True), (3, False)])
+def test_task_fits_num_ports(fake_task, offer_resources, num_ports, fits):
+    offer_resources = offer_resources.set('ports', v(m(begin=3, end=3), m(begin=6, end=6)))
+
+    assert task_fits(fake_task.set(num_ports=num_ports), offer_resources) == fits
+
+
+def test_resource_set_is_a_mapping(offer_resources):
+    assert isinstance(offer_resources, Mapping)
+    assert list(offer_resources) == ['cpus', 'mem', 'disk', 'gpus', 'ports']
+    assert dict(offer_resources) == {
+        'cpus': 10.0, 'mem': 1024.0, 'disk': 1000.0, 'gpus': 1.0, 'ports': v(),
+    }
+    assert 'cpus' in offer_resources
+    assert offer_resources.get('by_role') is None
+    assert offer_resources == pmap(dict(offer_resources))
+
+
+def test_resource_set_validates():
+    with pytest.raises(ValueError):
+        ResourceSet(cpus=-1)
+    with pytest.raises(ValueError):
+        ResourceSet().set('mem', -1)
+
+
+def test_resource_set_fits_and_subtract(offer_resources):
+    assert offer_resources.fits(10, 1024, 1000, 1)
+    assert not offer_resources.fits(10.5, 1024, 1000, 1)
+    assert not offer_resources.fits(1, 1, 1, 0, num_ports=1)
+
+    remaining = offer_resources.subtract(4, 24, 0, 1, v(m(begin=5, end=10)))
+    assert remaining == ResourceSet(
+        cpus=6,
+        mem=1000,
+        disk=1000,
+        gpus=0,
+        ports=v(m(begin=5, end=10)),
+    )
+    assert remaining.subtract(1, 1, 1, 0).ports == remaining.ports
+
+
+def test_resource_set_slack(offer_resources):
+    assert ResourceSet(cpus=5, mem=512).slack(offer_resources, 5, 256, 0, 0) == 0.25
+    assert offer_resources.slack(offer_resources, 10, 1024, 1000, 1) == 0.0
+    assert ResourceSet(cpus=1).slack(ResourceSet(), 1, 0, 0, 0) == 0.0
+
+
+def test_resource_set_dominant_share(offer_resources):
+    assert ResourceSet(cpus=1, mem=512).dominant_share(offer_resources) == 0.5
+    assert ResourceSet(gpus=1).dominant_share(ResourceSet()) == 0.0
+
+
+@pytest.fixture
+def unreserved_offer(fake_offer):
+    return addict.Dict(fake_offer, resources=fake_offer.resources + [
+        addict.Dict(
+            role='*',
+            name='cpus',
+            scalar=addict.Dict(value=4),
+            type='SCALAR',
+        ),
+        addict.Dict(
+            role='*',
+            name='ports',
+            ranges=addict.Dict(range=[addict.Dict(begin=32000, end=32001)]),
+            type='RANGES',
+        ),
+    ])
+
+
+def test_get_offer_resources_include_unreserved(unreserved_offer):
+    offer_resources = get_offer_resources(
+        unreserved_offer, 'fake_role', include_unreserved=True)
+
+    assert offer_resources.cpus == 14
+    assert offer_resources.mem == 1024
+    assert offer_resources.ports == v(m(begin=31200, end=31500), m(begin=32000, end=32001))
+    assert offer_resources.by_role == (
+        ('fake_role', get_offer_resources(unreserved_offer, 'fake_role')),
+        ('*', ResourceSet(cpus=4, ports=v(m(begin=32000, end=32001)))),
+    )
+    assert get_offer_resources(unreserved_offer, 'fake_role').cpus == 10
+
+
+def test_allocate_task_resources_by_role(fake_task, unreserved_offer):
+    offer_resources = get_offer_resources(
+        unreserved_offer, 'fake_role', include_unreserved=True)
+    task_config = fake_task.set(cpus=12, mem=512, gpus=0)
+
+    consumed, remaining = allocate_task_resources(task_config, offer_resources)
+
+    assert consumed.resources_by_role == m(**{
+        'fake_role': m(
+            cpus=10.0, mem=512.0, disk=1000.0, gpus=0.0,
+            ports=v(m(begin=31200, end=31200)),
+        ),
+        '*': m(cpus=2.0, mem=0.0, disk=0.0, gpus=0.0, ports=v()),
+    })
+    # the task config can still be serialized, e.g. by the persisters
+    assert json.loads(json.dumps(thaw(consumed), default=json_serializer))[
+        'resources_by_role']['*'] == {
+            'cpus': 2.0, 'mem': 0.0, 'disk': 0.0, 'gpus': 0.0, 'ports': [],
+    }
+    assert consumed.ports == v(m(begin=31200, end=31200))
+    assert remaining.cpus == 2
+    assert remaining.mem == 512
+    assert remaining.by_role == (
+        ('fake_role', ResourceSet(
+            mem=512, gpus=1, ports=v(m(begin=31201, end=31500)))),
+        ('*', ResourceSet(cpus=2, ports=v(m(begin=32000, end=32001)))),
+    )
@@ -0,0 +1,49 @@
+import pytest
+
+from task_processing.plugins.mesos.retry_backoff import \
+    DecorrelatedJitterBackoff
+from task_processing.plugins.mesos.retry_backoff import ExponentialBackoff
+from task_processing.plugins.mesos.retry_backoff import FixedBackoff
+from task_processing.plugins.mesos.retry_backoff import make_backoff
+
+
+def test_fixed_backoff():
+    backoff = FixedBackoff(5)
+
+    assert [backoff(attempt, 5) for attempt in (1, 2, 3)] == [5, 5, 5]
+    assert FixedBackoff(5, max_delay=3)(1, None) == 3
+
+
+def test_exponential_backoff():
+    backoff = ExponentialBackoff(delay=1, max_delay=6)
+
+    assert [backoff(attempt, None) for attempt in (1, 2, 3, 4)] == \
+        [1, 2, 4, 6]
+
+
+def test_decorrelated_jitter_backoff():
+    backoff = DecorrelatedJitterBackoff(
+        delay=1,
+        max_delay=20,
+        uniform=lambda low, high: high,
+    )
+
+    assert backoff(1, None) == 3
+    assert backoff(2, 3) == 9
+    assert backoff(3, 9) == 20
+
+
+def test_make_backoff():
+    backoff = make_backoff('exponential', 2, 30)
+
+    assert isinstance(backoff, ExponentialBackoff)
+    assert (backoff.delay, backoff.max_delay) == (2, 30)
+    assert make_backoff('fixed', 2, 30)(3, None) == 2
+    assert make_backoff('fixed', 60, 30)(3, None) == 30
+    assert make_backoff('fixed', 600)(3, None) == 600
+    assert make_backoff('none') is None
+
+
+def test_make_backoff_unknown():
+    with pytest.raises(ValueError):
+        make_backoff('linear')
@@ -1,9 +1,12 @@
+import threading
 from queue import Queue
 
 import mock
 import pytest
 
 from task_processing.interfaces.event import Event
+from task_processing.plugins.mesos.retry_backoff import FixedBackoff
+from task_processing.plugins.mesos.retrying_executor import PendingRetry
 from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
 from task_processing.plugins.mesos.task_config import MesosTaskConfig
 
@@ -84,6 +87,58 @@ def test_task_retry_retries_exhausted(mock_retrying_executor, mock_event):
     assert not retry_attempted
 
 
+def test_task_retry_with_backoff(
+    mock_retrying_executor,
+    mock_downstream,
+    mock_event,
+):
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.run = mock.Mock()
+
+    with mock.patch(
+        'task_processing.plugins.mesos.retrying_executor.time.time',
+        return_value=1000,
+    ):
+        assert mock_retrying_executor.retry(mock_event)
+
+    assert mock_retrying_executor.task_retries[mock_event.task_id] == 2
+    assert mock_retrying_executor.run.call_count == 0
+    assert mock_retrying_executor.pending_retries[mock_event.task_id] == \
+        PendingRetry(1030, mock_event)
+    assert mock_retrying_executor._next_retry_due() == 1030
+
+    mock_retrying_executor._run_due_retries(1029)
+    assert mock_downstream.run.call_count == 0
+
+    mock_retrying_executor._run_due_retries(1030)
+    assert mock_downstream.run.call_args[0][0].task_id == \
+        mock_event.task_id + '-retry2'
+    assert not mock_retrying_executor.pending_retries
+    assert mock_retrying_executor._next_retry_due() is None
+
+
+def test_task_retry_task_backoff(mock_retrying_executor, mock_event):
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_event = mock_event.set(task_config=mock_event.task_config.set(
+        retry_backoff='exponential',
+        retry_delay=2,
+    ))
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.run = mock.Mock()
+
+    with mock.patch(
+        'task_processing.plugins.mesos.retrying_executor.time.time',
+        return_value=1000,
+    ):
+        mock_retrying_executor.retry(mock_event)
+
+    # third retry of five
+    assert mock_retrying_executor._next_retry_due() == 1008
+
+
 # retry_loop #############################################################
 def test_retry_loop_retries_task(mock_retrying_executor, mock_event):
     mock_event = mock_event.set('terminal', True)
@@ -203,6 +258,69 @@ def test_kill(mock_retrying_executor, mock_downstream):
     assert mock_retrying_executor.task_retries["task"] == -1
 
 
+def test_kill_pending_retry(mock_retrying_executor, mock_downstream, mock_event):
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.run = mock.Mock()
+    mock_retrying_executor.retry(mock_event)
+
+    result = mock_retrying_executor.kill(mock_event.task_id)
+
+    assert result is True
+    assert mock_downstream.kill.call_count == 0
+    assert not mock_retrying_executor.pending_retries
+    assert mock_event.task_id not in mock_retrying_executor.task_retries
+    killed_event = mock_retrying_executor.dest_queue.get_nowait()
+    assert killed_event.task_id == mock_event.task_id
+    assert killed_event.extensions['RetryingExecutor/tries'] == '-1/2'
+
+    mock_retrying_executor._run_due_retries(float('inf'))
+    assert mock_retrying_executor.run.call_count == 0
+
+
+def test_kill_retry_in_flight(mock_retrying_executor, mock_downstream, mock_event):
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.retry(mock_event)
+
+    def run(task_config):
+        # the retry is being run downstream when the kill comes in
+        assert mock_retrying_executor.kill(mock_event.task_id) is True
+        assert mock_downstream.kill.call_count == 0
+    mock_downstream.run.side_effect = run
+
+    mock_retrying_executor._run_due_retries(float('inf'))
+
+    assert mock_downstream.run.call_count == 1
+    assert mock_downstream.kill.call_args == mock.call(mock_event.task_id)
+    assert not mock_retrying_executor._retries_in_flight
+    assert mock_retrying_executor.dest_queue.empty()
+
+
+def test_kill_retry_in_flight_before_run(
+    mock_retrying_executor,
+    mock_downstream,
+    mock_event,
+):
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.retry(mock_event)
+
+    due_retries = mock_retrying_executor._take_due_retries(float('inf'))
+    assert mock_retrying_executor.kill(mock_event.task_id) is True
+    mock_retrying_executor._run_retry(due_retries[0])
+
+    assert mock_downstream.run.call_count == 0
+    assert mock_downstream.kill.call_count == 0
+    assert not mock_retrying_executor._retries_in_flight
+    killed_event = mock_retrying_executor.dest_queue.get_nowait()
+    assert killed_event.task_id == mock_event.task_id
+    assert killed_event.extensions['RetryingExecutor/tries'] == '-1/2'
+
+
 # stop ###################################################################
 def test_stop(mock_retrying_executor, mock_downstream):
     mock_retrying_executor.stop()
@@ -211,6 +329,59 @@ def test_stop(mock_retrying_executor, mock_downstream):
     assert mock_retrying_executor.stopping is True
 
 
+def test_stop_while_retry_loop_is_blocked(mock_downstream):
+    executor = RetryingExecutor(downstream_executor=mock_downstream)
+
+    stopper = threading.Thread(target=executor.stop)
+    stopper.start()
+    stopper.join(timeout=5)
+
+    assert not stopper.is_alive()
+    assert not executor.retry_thread.is_alive()
+
+
+def test_retry_loop_wakes_up_for_a_retry(mock_downstream, mock_task_config):
+    rerun = threading.Event()
+    executor = RetryingExecutor(
+        downstream_executor=mock_downstream,
+        backoff=FixedBackoff(0.05),
+    )
+    executor.run(mock_task_config)
+    mock_downstream.run.side_effect = lambda task_config: rerun.set()
+
+    retry_task_id = mock_downstream.run.call_args[0][0].task_id
+    failed_event = Event(
+        kind='task',
+        terminal=True,
+        success=False,
+        task_id=retry_task_id,
+        task_config=mock_task_config.set_task_id(retry_task_id),
+        platform_type='failed',
+    )
+    mock_downstream.get_event_queue().put(failed_event)
+
+    assert rerun.wait(timeout=5)
+    assert mock_downstream.run.call_args[0][0].task_id == \
+        mock_task_config.task_id + '-retry4'
+    executor.stop()
+
+
+def test_stop_flushes_pending_retries(mock_retrying_executor, mock_event):
+    mock_event = mock_event.set(terminal=True)
+    mock_retrying_executor.backoff = FixedBackoff(30)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 3)
+    mock_retrying_executor.retry(mock_event)
+
+    mock_retrying_executor.stop()
+
+    assert not mock_retrying_executor.pending_retries
+    assert mock_event.task_id not in mock_retrying_executor.task_retries
+    last_event = mock_retrying_executor.dest_queue.get_nowait()
+    assert last_event.task_id == mock_event.task_id
+    assert last_event.terminal
+
+
 # _task_config_with_retry ################################################
 def test_task_config_with_retry(mock_retrying_executor, mock_task_config):
     mock_retrying_executor.task_retries = mock_retrying_executor.\
@@ -0,0 +1,72 @@
+import pytest
+
+from task_processing.plugins.mesos.task_metadata import TaskMetadata
+from task_processing.plugins.mesos.task_metadata import TaskMetadataStore
+
+
+@pytest.fixture
+def store():
+    return TaskMetadataStore(shards=4)
+
+
+def make_metadata(fake_task, state='TASK_INITED', at=1.0):
+    return TaskMetadata(
+        task_config=fake_task,
+        task_state=state,
+        task_state_history={state: at},
+    )
+
+
+def test_set_get_pop(store, fake_task):
+    md = make_metadata(fake_task)
+    store['a'] = md
+
+    assert 'a' in store
+    assert store['a'] is md
+    assert store.get('b') is None
+    assert len(store) == 1
+    assert store.pop('a') is md
+    assert store.pop('a') is None
+    assert len(store) == 0
+
+
+def test_keys_and_items_span_shards(store, fake_task):
+    task_ids = [f'task{i}' for i in range(20)]
+    for task_id in task_ids:
+        store[task_id] = make_metadata(fake_task)
+
+    assert sorted(store.keys()) == sorted(task_ids)
+    assert sorted(task_id for task_id, _ in store.items()) == sorted(task_ids)
+
+
+def test_transition(store, fake_task):
+    store['a'] = make_metadata(fake_task)
+
+    md = store.transition('a', 'TASK_STAGING', 2.0, agent_id='agent')
+
+    assert md is store['a']
+    assert md.task_state == 'TASK_STAGING'
+    assert md.agent_id == 'agent'
+    assert md.task_state_history == {'TASK_INITED': 1.0, 'TASK_STAGING': 2.0}
+
+
+def test_transition_unknown_task(store):
+    assert store.transition('a', 'TASK_STAGING', 2.0) is None
+
+
+def test_transition_expected_state(store, fake_task):
+    store['a'] = make_metadata(fake_task, state='TASK_RUNNING')
+
+    assert store.transition(
+        'a', 'TASK_STUCK', 2.0, expected_state='TASK_STAGING') is None
+    assert store['a'].task_state == 'TASK_RUNNING'
+
+
+def test_snapshot_is_a_copy(store, fake_task):
+    store['a'] = make_metadata(fake_task)
+
+    snapshot = store.snapshot()
+    store.transition('a', 'TASK_STAGING', 2.0)
+
+    assert snapshot == {'a': make_metadata(fake_task)}
+    assert snapshot['a'] is not store['a']
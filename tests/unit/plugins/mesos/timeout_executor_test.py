@@ -1,3 +1,4 @@
+import threading
 import time
 from queue import Queue
 
@@ -10,6 +11,14 @@ from task_processing.plugins.mesos.timeout_executor import TaskEntry
 from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
 
 
+@pytest.fixture(autouse=True)
+def restore_time():
+    # some tests replace time.time outright
+    real_time = time.time
+    yield
+    time.time = real_time
+
+
 @pytest.fixture
 def mock_Thread():
     with mock.patch('task_processing.plugins.mesos.timeout_executor.Thread'):
@@ -75,7 +84,7 @@ def test_timeout_loop_nontask(
     mock_entry = TaskEntry('different_id', deadline=1234)
     mock_timeout_executor.stopping = True
     mock_timeout_executor.src_queue.put(mock_event)
-    mock_timeout_executor.running_tasks.append(mock_entry)
+    mock_timeout_executor._insert_new_running_task_entry(mock_entry)
     time.time = mock.Mock(return_value=0)
 
     mock_timeout_executor.timeout_loop()
@@ -90,8 +99,8 @@ def test_timeout_loop_terminal_task_timed_out(
 ):
     mock_timeout_executor.stopping = True
     mock_timeout_executor.src_queue.put(mock_event)
-    mock_timeout_executor.running_tasks.append(mock_entry)
-    mock_timeout_executor.killed_tasks.append(mock_entry.task_id)
+    mock_timeout_executor._insert_new_running_task_entry(mock_entry)
+    mock_timeout_executor.killed_tasks.add(mock_entry.task_id)
     mock_timeout_executor.downstream_executor.kill = mock.Mock()
 
     mock_timeout_executor.timeout_loop()
@@ -109,7 +118,7 @@ def test_timeout_loop_existing_nonterminal_task(
     mock_event = mock_event.set('terminal', False)
     mock_timeout_executor.stopping = True
     mock_timeout_executor.src_queue.put(mock_event)
-    mock_timeout_executor.running_tasks.append(mock_entry)
+    mock_timeout_executor._insert_new_running_task_entry(mock_entry)
     mock_timeout_executor.downstream_executor.kill = mock.Mock()
     time.time = mock.Mock(return_value=10000)
 
@@ -149,6 +158,33 @@ def test_run(mock_timeout_executor, mock_downstream):
     assert len(mock_timeout_executor.running_tasks) == 1
 
 
+def test_run_wakes_timeout_loop_only_for_an_earlier_deadline(
+    mock_timeout_executor,
+    mock_task_config,
+    source_queue,
+):
+    for i, timeout in enumerate((100, 200, 50)):
+        mock_timeout_executor.run(
+            mock_task_config.set(uuid=f'task{i}', timeout=timeout))
+
+    # the second deadline is later than the one already waited for
+    assert source_queue.qsize() == 2
+
+
+def test_timeout_loop_wakes_up_for_a_new_deadline(mock_downstream, mock_task_config):
+    killed = threading.Event()
+    mock_downstream.kill.side_effect = lambda task_id: killed.set()
+    executor = TimeoutExecutor(downstream_executor=mock_downstream)
+    # let the loop block with no deadline to wait for
+    time.sleep(0.05)
+
+    executor.run(mock_task_config.set(timeout=0.05))
+
+    assert killed.wait(timeout=5)
+    assert mock_downstream.kill.call_args == mock.call(mock_task_config.task_id)
+    executor.stop()
+
+
 # reconcile ##############################################################
 def test_reconcile(mock_timeout_executor, mock_downstream):
     mock_timeout_executor.reconcile("task")
@@ -157,7 +193,7 @@ def test_reconcile(mock_timeout_executor, mock_downstream):
 
 # kill ###################################################################
 def test_kill_existing_task(mock_timeout_executor, mock_downstream):
-    mock_timeout_executor.running_tasks = [TaskEntry("task", 10)]
+    mock_timeout_executor._insert_new_running_task_entry(TaskEntry("task", 10))
     mock_timeout_executor.downstream_executor.kill = mock.Mock(
         return_value=True)
 
@@ -176,28 +212,66 @@ def test_stop(mock_timeout_executor, mock_downstream):
     assert mock_timeout_executor.stopping
 
 
-# _insert_new_running_task_entry #########################################
-def test_insert_new_running_task_entry_enumerate(mock_timeout_executor):
-    mock_entry_one = TaskEntry('fake_entry_one', 1)
-    mock_entry_two = TaskEntry('fake_entry_two', 2)
-    mock_entry_three = TaskEntry('fake_entry_three', 3)
-    mock_timeout_executor.running_tasks.append(mock_entry_one)
-    mock_timeout_executor.running_tasks.append(mock_entry_three)
+def test_stop_while_timeout_loop_is_blocked(mock_downstream):
+    executor = TimeoutExecutor(downstream_executor=mock_downstream)
+    # let the loop block with no deadline to wait for
+    time.sleep(0.05)
 
-    mock_timeout_executor._insert_new_running_task_entry(mock_entry_two)
+    stopper = threading.Thread(target=executor.stop)
+    stopper.start()
+    stopper.join(timeout=5)
 
-    assert [entry.deadline for entry in mock_timeout_executor.running_tasks] ==\
-        [1, 2, 3]
+    assert not stopper.is_alive()
+    assert not executor.timeout_thread.is_alive()
 
 
-def test_insert_new_running_task_entry_append(mock_timeout_executor):
-    mock_entry_one = TaskEntry('fake_entry_one', 1)
-    mock_entry_two = TaskEntry('fake_entry_two', 2)
-    mock_entry_three = TaskEntry('fake_entry_three', 3)
-    mock_timeout_executor.running_tasks.append(mock_entry_one)
-    mock_timeout_executor.running_tasks.append(mock_entry_two)
+# kill_timed_out_tasks ###################################################
+def test_kill_timed_out_tasks_by_deadline(mock_timeout_executor):
+    mock_timeout_executor._insert_new_running_task_entry(TaskEntry('three', 3))
+    mock_timeout_executor._insert_new_running_task_entry(TaskEntry('one', 1))
+    mock_timeout_executor._insert_new_running_task_entry(TaskEntry('four', 4))
+    mock_timeout_executor._insert_new_running_task_entry(TaskEntry('two', 2))
+    mock_timeout_executor.downstream_executor.kill = mock.Mock()
 
-    mock_timeout_executor._insert_new_running_task_entry(mock_entry_three)
+    mock_timeout_executor._kill_timed_out_tasks(3.5)
 
-    assert [entry.deadline for entry in mock_timeout_executor.running_tasks] ==\
-        [1, 2, 3]
+    assert mock_timeout_executor.downstream_executor.kill.call_args_list == [
+        mock.call('one'), mock.call('two'), mock.call('three'),
+    ]
+    assert mock_timeout_executor.running_tasks == {'four': 4}
+    assert mock_timeout_executor.killed_tasks == {'one', 'two', 'three'}
+    assert mock_timeout_executor._next_deadline() == 4
+
+
+def test_kill_timed_out_tasks_skips_finished_tasks(
+    mock_timeout_executor,
+    mock_event,
+    mock_entry,
+):
+    mock_timeout_executor._insert_new_running_task_entry(
+        TaskEntry('other', mock_entry.deadline + 1),
+    )
+    mock_timeout_executor._insert_new_running_task_entry(mock_entry)
+    mock_timeout_executor.handle_event(mock_event)
+    mock_timeout_executor.downstream_executor.kill = mock.Mock()
+
+    assert mock_timeout_executor._next_deadline() == mock_entry.deadline + 1
+    mock_timeout_executor._kill_timed_out_tasks(mock_entry.deadline + 0.5)
+
+    assert mock_timeout_executor.downstream_executor.kill.call_count == 0
+    assert mock_timeout_executor.running_tasks == {
+        'other': mock_entry.deadline + 1,
+    }
+
+
+def test_remove_running_task_compacts_deadlines(mock_timeout_executor):
+    for i in range(1000):
+        mock_timeout_executor._insert_new_running_task_entry(
+            TaskEntry(f'task{i}', i),
+        )
+    for i in range(999):
+        mock_timeout_executor._remove_running_task(f'task{i}')
+
+    assert mock_timeout_executor.running_tasks == {'task999': 999}
+    assert len(mock_timeout_executor._deadlines) < 100
+    assert mock_timeout_executor._next_deadline() == 999
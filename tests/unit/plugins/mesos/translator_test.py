@@ -1,9 +1,13 @@
 import addict
 import mock
 import pytest
+from pyrsistent import m
 from pyrsistent import v
 
 from task_processing.interfaces.event import Event
+from task_processing.plugins.mesos import translator
+from task_processing.plugins.mesos.translator import make_mesos_container_info
+from task_processing.plugins.mesos.translator import make_mesos_resources
 from task_processing.plugins.mesos.translator import make_mesos_task_info
 from task_processing.plugins.mesos.translator import MESOS_STATUS_MAP
 from task_processing.plugins.mesos.translator import mesos_update_to_event
@@ -117,12 +121,102 @@ def test_make_mesos_task_info(
     assert task_info == expected_task_info
 
 
+@pytest.mark.parametrize('ports,port_mappings', [
+    (v(), []),
+    (v(m(begin=31200, end=31201), m(begin=31300, end=31300)), [
+        addict.Dict(host_port=31200, container_port=8888),
+        addict.Dict(host_port=31201, container_port=31201),
+        addict.Dict(host_port=31300, container_port=31300),
+    ]),
+])
+def test_make_mesos_container_info_ports(fake_task, ports, port_mappings):
+    container_info = make_mesos_container_info(
+        fake_task.set(containerizer='DOCKER', ports=ports),
+    )
+
+    assert container_info.docker.port_mappings == port_mappings
+
+
+def test_make_mesos_resources_by_role(fake_task):
+    fake_task = fake_task.set(resources_by_role={
+        'fake_role': m(
+            cpus=1.0, mem=1024.0, disk=0.0, gpus=0.0,
+            ports=v(m(begin=31200, end=31200)),
+        ),
+        '*': m(cpus=9.0, mem=0.0, disk=0.0, gpus=0.0, ports=v()),
+    })
+
+    assert make_mesos_resources(fake_task, 'fake_role') == [
+        addict.Dict(name='cpus', type='SCALAR', role='*', scalar=addict.Dict(value=9.0)),
+        addict.Dict(name='cpus', type='SCALAR', role='fake_role', scalar=addict.Dict(value=1.0)),
+        addict.Dict(name='mem', type='SCALAR', role='fake_role', scalar=addict.Dict(value=1024.0)),
+        addict.Dict(
+            name='ports',
+            type='RANGES',
+            role='fake_role',
+            ranges=addict.Dict(range=[addict.Dict(begin=31200, end=31200)]),
+        ),
+    ]
+
+
+@pytest.mark.parametrize('containerizer', ['DOCKER', 'MESOS'])
+def test_make_mesos_task_info_from_template(fake_task, containerizer):
+    fake_task = fake_task.set(
+        containerizer=containerizer,
+        environment={'MESOS_TASK_ID': 'overridden', 'FOO': 'bar'},
+        docker_parameters=[{'key': 'label', 'value': 'x'}],
+    )
+    tasks = [
+        fake_task.set(uuid=f'task{i}', ports=v(m(begin=31200 + i, end=31200 + i)))
+        for i in range(3)
+    ]
+
+    with mock.patch.object(
+        translator,
+        'make_mesos_container_info',
+        wraps=translator.make_mesos_container_info,
+    ) as mock_container_info:
+        task_infos = [
+            make_mesos_task_info(task, 'fake_agent_id', 'fake_role')
+            for task in tasks
+        ]
+
+    assert mock_container_info.call_count == 1
+    assert task_infos == [
+        translator._make_mesos_task_info(task, 'fake_agent_id', 'fake_role')
+        for task in tasks
+    ]
+
+
+def _contains_addict(obj):
+    if isinstance(obj, addict.Dict):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_addict(value) for value in obj.values())
+    if isinstance(obj, list):
+        return any(_contains_addict(item) for item in obj)
+    return False
+
+
+@pytest.mark.parametrize('containerizer', ['DOCKER', 'MESOS'])
+def test_make_mesos_task_info_plain_dicts(fake_task, containerizer):
+    fake_task = fake_task.set(containerizer=containerizer)
+    expected = make_mesos_task_info(fake_task, 'fake_agent_id', 'fake_role')
+
+    for _ in range(2):  # built from scratch, then from the template
+        task_info = make_mesos_task_info(
+            fake_task, 'fake_agent_id', 'fake_role', dict_cls=dict,
+        )
+        assert task_info == expected
+        assert not _contains_addict(task_info)
+
+
 @mock.patch('task_processing.plugins.mesos.translator.time')
-def test_mesos_update_to_event(mock_time):
+@pytest.mark.parametrize('dict_cls', [addict.Dict, dict])
+def test_mesos_update_to_event(mock_time, dict_cls):
     mock_time.time.return_value = 12345678.0
     for key, val in MESOS_STATUS_MAP.items():
-        mesos_status = mock.MagicMock()
-        mesos_status.state = key
+        mesos_status = dict_cls(state=key)
         assert mesos_update_to_event(mesos_status, addict.Dict(task_id='123')) == Event(
             kind='task',
             raw=mesos_status,
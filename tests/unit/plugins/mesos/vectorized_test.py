@@ -0,0 +1,103 @@
+import random
+
+import pytest
+from pyrsistent import m
+from pyrsistent import v
+
+from task_processing.plugins.mesos.mesos_task_executor import get_tasks_for_offer
+from task_processing.plugins.mesos.resource_helpers import ResourceSet
+
+pytest.importorskip('numpy')
+
+from task_processing.plugins.mesos.vectorized import VectorizedOfferMatcher  # noqa: E402
+
+
+@pytest.fixture
+def offer_resources():
+    return ResourceSet(
+        cpus=16,
+        mem=4096,
+        disk=2000,
+        gpus=1,
+        ports=v(m(begin=31000, end=31009)),
+    )
+
+
+def test_vectorized_matcher_empty(offer_resources):
+    assert VectorizedOfferMatcher()([], offer_resources, {}, 'role') == []
+
+
+def test_vectorized_matcher_constraints(fake_task, offer_resources):
+    fake_task = fake_task.set(cpus=1, mem=64, disk=10, gpus=0)
+    task = fake_task.set(name='task', constraints=[['region', '==', 'elsewhere']])
+    other_task = fake_task.set(name='other_task')
+
+    tasks_to_launch = VectorizedOfferMatcher()(
+        [task, other_task],
+        offer_resources,
+        {'region': 'here'},
+        'role',
+    )
+
+    assert [t.task_id for t in tasks_to_launch] == [other_task.task_id]
+
+
+def test_vectorized_matcher_runs_out_of_ports(fake_task, offer_resources):
+    offer_resources = offer_resources.set('ports', v(m(begin=31000, end=31001)))
+    tasks = [
+        fake_task.set(name=f'task{i}', cpus=1, mem=64, disk=10, gpus=0)
+        for i in range(3)
+    ]
+
+    tasks_to_launch = VectorizedOfferMatcher()(
+        iter(tasks),
+        offer_resources,
+        {},
+        'role',
+    )
+
+    assert [t.ports for t in tasks_to_launch] == [
+        v(m(begin=31000, end=31000)),
+        v(m(begin=31001, end=31001)),
+    ]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_vectorized_matcher_same_decisions(fake_task, offer_resources, seed):
+    rand = random.Random(seed)
+    tasks = [
+        fake_task.set(
+            name=f'task{i}',
+            cpus=rand.choice([0.5, 1, 2, 4, 8]),
+            mem=rand.choice([64, 256, 1024, 2048]),
+            disk=rand.choice([10, 100, 500]),
+            gpus=rand.choice([0, 0, 0, 1]),
+            constraints=rand.choice([[], [['region', '==', 'elsewhere']]]),
+        )
+        for i in range(50)
+    ]
+
+    assert VectorizedOfferMatcher()(
+        tasks,
+        offer_resources,
+        {'region': 'here'},
+        'role',
+    ) == get_tasks_for_offer(
+        tasks,
+        offer_resources,
+        {'region': 'here'},
+        'role',
+    )
+
+
+def test_vectorized_matcher_only_keeps_current_tasks(fake_task, offer_resources):
+    matcher = VectorizedOfferMatcher()
+    task = fake_task.set(name='task', cpus=64)
+    other_task = fake_task.set(name='other_task', cpus=64)
+
+    matcher([task, other_task], offer_resources, {}, 'role')
+    rows = dict(matcher._rows)
+    matcher([task], offer_resources, {}, 'role')
+
+    assert list(matcher._rows) == [id(task)]
+    assert matcher._rows[id(task)] is rows[id(task)]
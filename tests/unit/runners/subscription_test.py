@@ -1,12 +1,19 @@
+from queue import Queue
+
 import mock
 import pytest
 
+from task_processing.interfaces.event import CompactEvent
+from task_processing.interfaces.event import Event
+from task_processing.interfaces.event import task_event
 from task_processing.runners.subscription import Subscription
 
 
 @pytest.fixture
 def fake_executor():
-    return mock.Mock()
+    executor = mock.Mock()
+    executor.get_event_queue.return_value = Queue()
+    return executor
 
 
 @pytest.fixture
@@ -38,3 +45,38 @@ def test_kill(fake_runner, fake_executor):
 def test_stop(fake_runner, fake_executor):
     fake_runner.stop()
     assert fake_executor.stop.call_count == 1
+
+
+def get_one_event(fake_executor, **kwargs):
+    fake_executor.get_event_queue.return_value.put(task_event(
+        task_id='123',
+        raw={'state': 'TASK_RUNNING', 'container_status': {'network_infos': []}},
+    ))
+    queue = Queue()
+    runner = Subscription(executor=fake_executor, queue=queue, **kwargs)
+
+    event = queue.get(timeout=5)
+    runner.stop()
+    return event
+
+
+def test_events_not_compacted_by_default(fake_executor):
+    event = get_one_event(fake_executor)
+
+    assert isinstance(event, Event)
+    assert event.raw['container_status'] == {'network_infos': []}
+
+
+def test_compact_events(fake_executor):
+    event = get_one_event(fake_executor, compact_events='strip')
+
+    assert isinstance(event, CompactEvent)
+    assert event.task_id == '123'
+    assert event.raw is None
+
+
+def test_compact_events_lazy_raw(fake_executor):
+    event = get_one_event(fake_executor, compact_events='lazy')
+
+    assert isinstance(event, CompactEvent)
+    assert event.raw['container_status'] == {'network_infos': []}